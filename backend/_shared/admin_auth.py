@@ -0,0 +1,56 @@
+'''
+Shared utility: Admin password check against ADMIN_PASSWORD_HASH
+Usage: from _shared.admin_auth import check_admin_token
+
+    denied = check_admin_token(event)
+    if denied is not None:
+        return denied           # 401, or 500 when no hash is configured
+
+ADMIN_PASSWORD_HASH is a bcrypt hash; PHP-style $2a$ hashes are read as
+$2b$, which the bcrypt package accepts. bcrypt is imported on first use,
+so preflights don't pay for it.
+'''
+
+import os
+from typing import Any, Dict, Optional
+
+from _shared.responses import error_response
+
+
+def admin_password_hash() -> Optional[str]:
+    '''ADMIN_PASSWORD_HASH normalized for the bcrypt package, None if not set'''
+    value = (os.environ.get('ADMIN_PASSWORD_HASH') or '').strip()
+    if not value:
+        return None
+    if value.startswith('$2a$'):
+        value = '$2b$' + value[4:]
+    return value
+
+
+def verify_admin_password(password: str, password_hash: Optional[str] = None) -> bool:
+    '''True if password matches the admin hash; a malformed hash never matches'''
+    import bcrypt
+    password_hash = password_hash or admin_password_hash()
+    if not password or not password_hash:
+        return False
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except Exception as e:
+        print(f'Password check error: {e}')
+        return False
+
+
+def check_admin_token(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    '''None if X-Admin-Token holds the admin password, else the error response to return'''
+    headers = event.get('headers', {}) or {}
+    admin_token = headers.get('x-admin-token') or headers.get('X-Admin-Token')
+    if not admin_token:
+        return error_response(401, 'Unauthorized: No token provided')
+
+    password_hash = admin_password_hash()
+    if not password_hash:
+        return error_response(500, 'Admin password not configured')
+
+    if not verify_admin_password(admin_token, password_hash):
+        return error_response(401, 'Unauthorized: Invalid token')
+    return None
@@ -0,0 +1,237 @@
+'''
+Shared utility: PostgreSQL connection pool reused across warm invocations
+Usage: from _shared.db_pool import db_connection
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        ...
+'''
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from _shared.tracing import TRACE_ENABLED, span, traced_cursor_class
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '5'))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', '5'))
+# Idle connections older than this are pinged with SELECT 1 before reuse
+POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+# Idle connections older than this are closed instead of reused
+POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '300'))
+
+
+class TracedConnection(psycopg2.extensions.connection):
+    '''Connection whose cursors record every execute as a span'''
+
+    def cursor(self, name=None, cursor_factory=None, **kwargs):
+        factory = cursor_factory or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(name, cursor_factory=traced_cursor_class(factory), **kwargs)
+
+
+class PoolExhaustedError(Exception):
+    '''Raised when no connection frees up within the checkout timeout'''
+
+
+class ConnectionPool:
+    '''Bounded, thread-safe pool of psycopg2 connections'''
+
+    def __init__(self, dsn: str, max_size: int = POOL_MAX_SIZE,
+                 checkout_timeout: float = POOL_CHECKOUT_TIMEOUT,
+                 ping_after: float = POOL_PING_AFTER,
+                 max_idle: float = POOL_MAX_IDLE):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+        self.max_idle = max_idle
+
+        self._cond = threading.Condition()
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._connects = 0
+        self._reconnects = 0
+        self._discarded = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._peak_in_use = 0
+
+    def _connect(self):
+        if TRACE_ENABLED:
+            conn = psycopg2.connect(self.dsn, connection_factory=TracedConnection)
+        else:
+            conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._connects += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_for: float) -> bool:
+        '''Cheap liveness check, with a round-trip ping for long-idle connections'''
+        if conn.closed:
+            return False
+        if idle_for < self.ping_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        '''Checks out a healthy connection, waiting up to checkout_timeout'''
+        deadline = time.monotonic() + self.checkout_timeout
+        conn = None
+        idle_since = 0.0
+
+        with self._cond:
+            waited = False
+            while True:
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    break
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                    print(f'DB pool saturated: {self._in_use}/{self.max_size} connections in use, waiting')
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolExhaustedError(
+                        f'No database connection available within {self.checkout_timeout}s '
+                        f'({self._in_use}/{self.max_size} in use)'
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+        try:
+            if conn is not None:
+                idle_for = time.monotonic() - idle_since
+                if idle_for > self.max_idle or not self._is_healthy(conn, idle_for):
+                    self._close_quietly(conn)
+                    conn = None
+                    with self._cond:
+                        self._reconnects += 1
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return conn
+
+    def putconn(self, conn, broken: bool = False) -> None:
+        '''Returns a connection; broken ones are closed and the slot freed'''
+        if not broken and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        else:
+            broken = True
+
+        if broken:
+            self._close_quietly(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def reset(self) -> None:
+        '''Drops every idle connection, e.g. after a failover to a new primary'''
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._discarded += len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        '''Snapshot of pool size and saturation counters'''
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'saturation': round(self._in_use / self.max_size, 3),
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'connects': self._connects,
+                'reconnects': self._reconnects,
+                'discarded': self._discarded,
+                'waits': self._waits,
+                'timeouts': self._timeouts
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    '''Returns the process-wide pool, creating it on first use'''
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                dsn = os.environ.get('DATABASE_URL')
+                if not dsn:
+                    raise Exception('DATABASE_URL not configured')
+                _pool = ConnectionPool(dsn)
+    return _pool
+
+
+@contextmanager
+def db_connection() -> Iterator[Any]:
+    '''
+    Borrows a pooled connection for the duration of the block
+
+    Uncommitted work is rolled back on return. If the connection dies
+    mid-block (server restart, failover) it is discarded together with
+    the idle ones, so the next checkout reconnects to the new primary.
+    '''
+    pool = get_pool()
+    with span('db.connect'):
+        conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        broken = bool(conn.closed)
+        pool.putconn(conn, broken=broken)
+        if broken:
+            pool.reset()
+
+
+def pool_stats() -> Dict[str, Any]:
+    '''Pool saturation report; empty until the pool is first used'''
+    if _pool is None:
+        return {}
+    return _pool.stats()
@@ -1,65 +1,176 @@
 '''
 Shared utility: Reads secrets from encrypted database storage
 Usage: from _shared.db_secrets import get_secret
+
+All secure_settings rows are loaded with one query on first use and kept
+for SECRETS_TTL seconds. After that, lookups keep serving the cached
+values while a background thread checks whether the table changed
+(row count and latest updated_at) and reloads it only if it did. Keys
+missing from the table are remembered for SECRETS_NEGATIVE_TTL seconds,
+so a missing secret costs a dict lookup rather than a query.
 '''
 
 import os
+import time
 import base64
-import psycopg2
-from typing import Optional
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from _shared.db_pool import db_connection
 
-_cache = {}
+SECRETS_TTL = float(os.environ.get('SECRETS_TTL', '300'))
+SECRETS_NEGATIVE_TTL = float(os.environ.get('SECRETS_NEGATIVE_TTL', '60'))
 
-def get_db_connection():
-    '''Creates database connection'''
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
 
 def decrypt_value(encrypted: str) -> str:
     '''Decrypts base64 encoded value'''
     return base64.b64decode(encrypted.encode()).decode()
 
+
+class SecretResolver:
+    '''Bulk-loaded, TTL-bounded secret cache with negative entries'''
+
+    def __init__(self, ttl: float = SECRETS_TTL, negative_ttl: float = SECRETS_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._lock = threading.Lock()
+        self._values: Dict[str, str] = {}
+        self._negative: Dict[str, float] = {}
+        self._version: Optional[Tuple[Any, Any]] = None
+        self._ready = threading.Event()
+        self._load_lock = threading.Lock()
+        self._checked_at = 0.0
+        self._fresh_until = 0.0
+        self._refreshing = False
+
+    def _read_version(self, cur) -> Tuple[Any, Any]:
+        cur.execute("SELECT COUNT(*), MAX(updated_at) FROM secure_settings")
+        return tuple(cur.fetchone())
+
+    def _load_all(self) -> None:
+        '''Reloads every row if the table changed since the last load'''
+        with db_connection() as conn:
+            cur = conn.cursor()
+            version = self._read_version(cur)
+            rows = None
+            if version != self._version:
+                cur.execute("SELECT key, encrypted_value FROM secure_settings")
+                rows = cur.fetchall()
+            cur.close()
+
+        values = None
+        if rows is not None:
+            values = {}
+            for key, encrypted in rows:
+                try:
+                    values[key] = decrypt_value(encrypted)
+                except Exception as e:
+                    print(f'Database secret decode error for {key}: {str(e)}')
+
+        now = time.monotonic()
+        with self._lock:
+            if values is not None:
+                self._values = values
+                self._negative = {}
+                self._version = version
+            self._checked_at = now
+            self._fresh_until = now + self.ttl
+
+    def _try_load(self) -> None:
+        try:
+            self._load_all()
+        except Exception as e:
+            print(f'Database secret read error: {str(e)}')
+            # Serve env fallbacks and retry after the negative TTL instead of per lookup
+            now = time.monotonic()
+            with self._lock:
+                self._checked_at = now
+                self._fresh_until = now + self.negative_ttl
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self._try_load()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name='secret-refresh', daemon=True).start()
+
+    def prefetch(self) -> None:
+        '''Loads all secrets once; concurrent first lookups wait for the same load'''
+        if self._ready.is_set():
+            return
+        with self._load_lock:
+            if not self._ready.is_set():
+                self._try_load()
+                self._ready.set()
+
+    def invalidate(self) -> None:
+        '''Marks the snapshot stale so the next lookup reloads it, e.g. after secure_settings was written'''
+        with self._lock:
+            self._version = None
+            self._fresh_until = 0.0
+
+    def get(self, key: str) -> Optional[str]:
+        '''Cached database value for key, or None if the table doesn't have it'''
+        self.prefetch()
+
+        now = time.monotonic()
+        stale = False
+        with self._lock:
+            value = self._values.get(key)
+            if value is not None:
+                stale = now >= self._fresh_until
+            else:
+                expires = self._negative.get(key)
+                if expires is None or now >= expires:
+                    self._negative[key] = now + self.negative_ttl
+                    # A secret added since the last load becomes visible within negative_ttl
+                    stale = now - self._checked_at >= self.negative_ttl
+
+        if stale:
+            self._refresh_in_background()
+        return value
+
+
+_resolver = SecretResolver()
+
+
 def get_secret(key: str, fallback_env: bool = True) -> Optional[str]:
     '''
     Reads secret from database, with optional fallback to environment variable
-    
+
     Args:
         key: Secret key name (e.g., 'OPENAI_API_KEY')
         fallback_env: If True, falls back to os.environ.get(key) if not found in DB
-    
+
     Returns:
         Secret value or None
     '''
-    # Check cache first
-    if key in _cache:
-        return _cache[key]
-    
-    # Try database
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute(
-            "SELECT encrypted_value FROM secure_settings WHERE key = %s",
-            (key,)
-        )
-        
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        if row:
-            value = decrypt_value(row[0])
-            _cache[key] = value
-            return value
-    except Exception as e:
-        print(f'Database secret read error for {key}: {str(e)}')
-    
-    # Fallback to environment variable
+    value = _resolver.get(key)
+    if value is not None:
+        return value
+
     if fallback_env:
         env_value = os.environ.get(key)
         if env_value:
-            _cache[key] = env_value
             return env_value
-    
+
     return None
+
+
+def prefetch_secrets() -> None:
+    '''Warms the cache with a single query, e.g. at module import'''
+    _resolver.prefetch()
+
+
+def invalidate_secrets() -> None:
+    '''Drops the cached snapshot so the next lookup reloads it'''
+    _resolver.invalidate()
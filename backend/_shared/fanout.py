@@ -0,0 +1,105 @@
+'''
+Shared utility: Concurrent integration calls under one request deadline
+Usage: from _shared.fanout import fan_out, invocation_deadline
+
+    deadline = invocation_deadline(context)
+    results = fan_out({
+        'bitrix24': lambda: send_lead(deadline),
+        'telegram': lambda: send_message(deadline)
+    }, deadline)
+
+Each call runs on a module-level thread pool that outlives the
+invocation, so the response takes as long as the slowest call, not the
+sum of all of them. Calls should pass the deadline on to http_request
+so their attempts stop at the same moment fan_out stops waiting.
+'''
+
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+# Upper bound for the whole fan-out regardless of the function timeout
+FANOUT_MAX_SECONDS = float(os.environ.get('FANOUT_MAX_SECONDS', '8'))
+# Time kept back from the invocation deadline to build and return the response
+FANOUT_RESERVE_MS = int(os.environ.get('FANOUT_RESERVE_MS', '300'))
+FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', '8'))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+    return _executor
+
+
+def invocation_deadline(context: Any, cap: float = FANOUT_MAX_SECONDS) -> float:
+    '''time.monotonic() value by which fan-out work must finish'''
+    budget = cap
+    remaining_ms = getattr(context, 'get_remaining_time_in_millis', None)
+    if callable(remaining_ms):
+        try:
+            budget = min(cap, max(0.0, (remaining_ms() - FANOUT_RESERVE_MS) / 1000))
+        except Exception:
+            pass
+    return time.monotonic() + budget
+
+
+def fan_out(calls: Dict[str, Optional[Callable[[], Any]]], deadline: float) -> Dict[str, Dict[str, Any]]:
+    '''
+    Runs calls concurrently and reports each one separately
+
+    Args:
+        calls: name -> zero-argument callable returning a truthy value on
+               success; None marks an integration that isn't configured
+        deadline: time.monotonic() value after which pending calls are reported as timed out
+
+    Returns:
+        name -> {'status': 'ok' | 'failed' | 'error' | 'timeout' | 'skipped',
+                 'ms': elapsed, 'value' or 'error': details}
+    '''
+    executor = _get_executor()
+    started = time.monotonic()
+    futures = {}
+    results: Dict[str, Dict[str, Any]] = {}
+
+    for name, call in calls.items():
+        if call is None:
+            results[name] = {'status': 'skipped'}
+            continue
+        # copy_context keeps the caller's trace so spans land in this invocation
+        futures[name] = executor.submit(contextvars.copy_context().run, _timed, call)
+
+    wait(futures.values(), timeout=max(0.0, deadline - time.monotonic()))
+
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            results[name] = {'status': 'timeout', 'ms': round((time.monotonic() - started) * 1000, 1)}
+            print(f'{name} error: deadline exceeded')
+            continue
+        value, error, elapsed = future.result()
+        if error is not None:
+            results[name] = {'status': 'error', 'ms': elapsed, 'error': error}
+            print(f'{name} error: {error}')
+        else:
+            results[name] = {'status': 'ok' if value else 'failed', 'ms': elapsed, 'value': value}
+
+    return results
+
+
+def _timed(call: Callable[[], Any]):
+    started = time.monotonic()
+    try:
+        value = call()
+        error = None
+    except Exception as e:
+        value, error = None, f'{type(e).__name__}: {e}'
+    return value, error, round((time.monotonic() - started) * 1000, 1)
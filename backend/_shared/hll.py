@@ -0,0 +1,76 @@
+'''
+Shared utility: HyperLogLog sketches for unique-visitor counts
+Usage: from _shared.hll import sketch_of, merge_all, estimate
+
+    day = sketch_of(session_ids)                # bytes, HLL_REGISTERS long
+    week = merge_all(sketches_for_seven_days)   # union, exact for HLL
+    visitors = estimate(week)                   # ~1.6% standard error
+
+A sketch is HLL_REGISTERS one-byte registers (4 KB at precision 12),
+stored in Postgres as bytea. Merging takes the register-wise maximum,
+so the union of any set of days is exactly the sketch of all their
+visitors together, whatever the range. The maximum is computed on all
+registers at once as one big integer (each register is below 0x80, so
+the subtraction of a byte lane never borrows from its neighbour),
+which makes a merge cost microseconds in pure Python.
+'''
+
+import math
+import hashlib
+from typing import Iterable
+
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+_RANK_BITS = 64 - HLL_PRECISION
+_RANK_MASK = (1 << _RANK_BITS) - 1
+
+_HIGH_BITS = int.from_bytes(b'\x80' * HLL_REGISTERS, 'little')
+_ALL_BITS = (1 << (8 * HLL_REGISTERS)) - 1
+_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+EMPTY_SKETCH = bytes(HLL_REGISTERS)
+
+
+def sketch_of(values: Iterable[str]) -> bytes:
+    '''Sketch of the distinct values in `values`'''
+    registers = bytearray(HLL_REGISTERS)
+    for value in values:
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> _RANK_BITS
+        rank = _RANK_BITS - (hashed & _RANK_MASK).bit_length() + 1
+        if rank > registers[index]:
+            registers[index] = rank
+    return bytes(registers)
+
+
+def merge(a: bytes, b: bytes) -> bytes:
+    '''Register-wise maximum of two sketches'''
+    left = int.from_bytes(a, 'little')
+    right = int.from_bytes(b, 'little')
+    # Lanes where left >= right keep their 0x80 bit after the subtraction
+    left_wins = (((left | _HIGH_BITS) - right) & _HIGH_BITS) >> 7
+    mask = (left_wins << 8) - left_wins
+    return ((left & mask) | (right & (_ALL_BITS ^ mask))).to_bytes(HLL_REGISTERS, 'little')
+
+
+def merge_all(sketches: Iterable[bytes]) -> bytes:
+    result = EMPTY_SKETCH
+    for sketch in sketches:
+        result = merge(result, bytes(sketch))
+    return result
+
+
+def estimate(sketch: bytes) -> int:
+    '''Estimated number of distinct values, with linear counting for small sets'''
+    sketch = bytes(sketch)
+    inverse_sum = 0.0
+    for rank in range(max(sketch) + 1):
+        count = sketch.count(rank)
+        if count:
+            inverse_sum += count / (1 << rank)
+    raw = _ALPHA * HLL_REGISTERS * HLL_REGISTERS / inverse_sum
+    zeros = sketch.count(0)
+    if raw <= 2.5 * HLL_REGISTERS and zeros:
+        return round(HLL_REGISTERS * math.log(HLL_REGISTERS / zeros))
+    return round(raw)
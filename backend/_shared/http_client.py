@@ -0,0 +1,364 @@
+'''
+Shared utility: Keep-alive HTTP client for outbound integrations
+Usage: from _shared.http_client import http_request
+
+    response = http_request('POST', url, integration='bitrix', json_body={'fields': data})
+    if response.ok:
+        result = response.json()
+
+Connections are pooled per (scheme, host, port) at module level, so a
+warm function reuses the TLS session it opened on an earlier invocation
+instead of handshaking again. Each integration has a timeout and retry
+policy in INTEGRATIONS. Retries also draw from a per-integration budget
+(RETRY_BUDGET_MIN plus RETRY_BUDGET_RATIO of recent requests), so an
+outage upstream can't multiply our own traffic. An idle connection the
+server has already closed is dropped before reuse. A request that fails
+on a reused connection before it was sent is resent on a fresh one
+without spending the budget. Once the body is out, a POST is never
+resent after a transport error: the server may have acted on it, so the
+error goes to the caller (or the outbox) to decide.
+'''
+
+import os
+import json
+import time
+import uuid
+import random
+import select
+import socket
+import threading
+import http.client
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from _shared.tracing import span
+
+HTTP_POOL_MAX_IDLE = int(os.environ.get('HTTP_POOL_MAX_IDLE', '4'))
+# Most APIs drop idle keep-alive connections after about a minute
+HTTP_POOL_IDLE_TTL = float(os.environ.get('HTTP_POOL_IDLE_TTL', '50'))
+RETRY_BUDGET_RATIO = float(os.environ.get('HTTP_RETRY_BUDGET_RATIO', '0.2'))
+RETRY_BUDGET_MIN = int(os.environ.get('HTTP_RETRY_BUDGET_MIN', '3'))
+RETRY_BUDGET_WINDOW = 10.0
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+# Statuses that mean the request was not processed, safe to resend even for POST
+REJECTED_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+@dataclass(frozen=True)
+class Policy:
+    timeout: float = 10.0
+    retries: int = 1
+    backoff: float = 0.2
+
+
+INTEGRATIONS: Dict[str, Policy] = {
+    'bitrix': Policy(timeout=10.0, retries=1),
+    'telegram': Policy(timeout=10.0, retries=1),
+    'yandex_metrika': Policy(timeout=10.0, retries=1),
+    'yandex_webmaster': Policy(timeout=10.0, retries=1),
+    'yandex_translate': Policy(timeout=3.0, retries=0),
+    'default': Policy()
+}
+
+
+class HttpClientError(Exception):
+    '''Raised when a request fails and no retry is left or allowed'''
+
+
+class HttpResponse:
+    '''Fully read response; the connection is already back in the pool'''
+
+    __slots__ = ('status_code', 'headers', 'content')
+
+    def __init__(self, status_code: int, headers: Dict[str, str], content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class RetryBudget:
+    '''Allows retries up to a fixed floor plus a ratio of recent requests'''
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, minimum: int = RETRY_BUDGET_MIN,
+                 window: float = RETRY_BUDGET_WINDOW):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self._lock = threading.Lock()
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self.exhausted = 0
+
+    def _trim(self, now: float) -> None:
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._retries) >= self.minimum + self.ratio * len(self._requests):
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+
+class HostPool:
+    '''Idle keep-alive connections to one origin'''
+
+    def __init__(self, scheme: str, host: str, port: int, max_idle: int = HTTP_POOL_MAX_IDLE):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[http.client.HTTPConnection, float]] = []
+        self.connects = 0
+        self.reuses = 0
+
+    def acquire(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        '''Returns (connection, reused)'''
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, idle_since = self._idle.pop()
+                if now - idle_since < HTTP_POOL_IDLE_TTL and conn.sock is not None and not _peer_closed(conn):
+                    try:
+                        conn.sock.settimeout(timeout)
+                    except OSError:
+                        conn.close()
+                        continue
+                    conn.timeout = timeout
+                    self.reuses += 1
+                    return conn, True
+                conn.close()
+            self.connects += 1
+
+        if self.scheme == 'https':
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=_ssl_context())
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        return conn, False
+
+    def release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'idle': len(self._idle), 'connects': self.connects, 'reuses': self.reuses}
+
+
+def _peer_closed(conn: http.client.HTTPConnection) -> bool:
+    '''An idle keep-alive socket is only readable if the server closed it (or broke protocol)'''
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+_ssl_lock = threading.Lock()
+_ssl_ctx = None
+
+
+def _ssl_context():
+    # One context per process lets TLS sessions be resumed across connections
+    global _ssl_ctx
+    if _ssl_ctx is None:
+        with _ssl_lock:
+            if _ssl_ctx is None:
+                import ssl
+                _ssl_ctx = ssl.create_default_context()
+    return _ssl_ctx
+
+
+_pools: Dict[Tuple[str, str, int], HostPool] = {}
+_budgets: Dict[str, RetryBudget] = {}
+_registry_lock = threading.Lock()
+
+
+def _pool_for(scheme: str, host: str, port: int) -> HostPool:
+    key = (scheme, host, port)
+    pool = _pools.get(key)
+    if pool is None:
+        with _registry_lock:
+            pool = _pools.setdefault(key, HostPool(scheme, host, port))
+    return pool
+
+
+def _budget_for(integration: str) -> RetryBudget:
+    budget = _budgets.get(integration)
+    if budget is None:
+        with _registry_lock:
+            budget = _budgets.setdefault(integration, RetryBudget())
+    return budget
+
+
+def encode_multipart(fields: Dict[str, Any], files: Dict[str, Tuple[str, bytes, str]]) -> Tuple[bytes, str]:
+    '''Encodes form fields and (filename, content, content_type) files as multipart/form-data'''
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+        )
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def _retry_after(response: HttpResponse) -> Optional[float]:
+    value = response.headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def http_request(method: str, url: str, integration: str = 'default', *,
+                 params: Optional[Dict[str, Any]] = None,
+                 headers: Optional[Dict[str, str]] = None,
+                 json_body: Any = None,
+                 data: Optional[bytes] = None,
+                 fields: Optional[Dict[str, Any]] = None,
+                 files: Optional[Dict[str, Tuple[str, bytes, str]]] = None,
+                 timeout: Optional[float] = None,
+                 deadline: Optional[float] = None) -> HttpResponse:
+    '''
+    Sends a request over a pooled keep-alive connection
+
+    Args:
+        method: HTTP method
+        url: Absolute http(s) URL
+        integration: Key into INTEGRATIONS; selects timeout, retries and budget
+        params: Query parameters appended to the URL
+        json_body / data / fields+files: Body as JSON, raw bytes or multipart form
+        timeout: Overrides the integration's per-attempt timeout
+        deadline: time.monotonic() value no attempt or backoff may run past
+
+    Returns:
+        HttpResponse with the body read; non-2xx statuses are returned, not raised
+    '''
+    policy = INTEGRATIONS.get(integration) or INTEGRATIONS['default']
+    method = method.upper()
+    split = urlsplit(url)
+    scheme = split.scheme or 'https'
+    port = split.port or (443 if scheme == 'https' else 80)
+    path = split.path or '/'
+    query = split.query
+    if params:
+        query = (query + '&' if query else '') + urlencode(params)
+    if query:
+        path += '?' + query
+
+    request_headers = {'Connection': 'keep-alive'}
+    body = data
+    if json_body is not None:
+        body = json.dumps(json_body, ensure_ascii=False).encode('utf-8')
+        request_headers['Content-Type'] = 'application/json'
+    elif fields is not None or files is not None:
+        body, request_headers['Content-Type'] = encode_multipart(fields or {}, files or {})
+    if headers:
+        request_headers.update(headers)
+
+    pool = _pool_for(scheme, split.hostname, port)
+    budget = _budget_for(integration)
+    budget.record_request()
+    attempt_timeout = timeout if timeout is not None else policy.timeout
+    retries_left = policy.retries
+    attempt = 0
+
+    with span(f'http.{integration}', host=split.hostname):
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise HttpClientError(f'{integration}: deadline exceeded')
+            per_try = attempt_timeout if remaining is None else min(attempt_timeout, remaining)
+
+            conn, reused = pool.acquire(per_try)
+            sent = False
+            try:
+                conn.request(method, path, body=body, headers=request_headers)
+                sent = True
+                raw = conn.getresponse()
+                content = raw.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                # After the body is out the server may have acted on it; resending
+                # a POST could create a second lead or message
+                resendable = not sent or method in IDEMPOTENT_METHODS
+                if reused and resendable and not isinstance(e, socket.timeout):
+                    # Stale keep-alive connection; the request never reached a live server
+                    continue
+                if resendable and retries_left > 0 and budget.try_spend():
+                    retries_left -= 1
+                    attempt += 1
+                    _sleep_backoff(policy, attempt, deadline)
+                    continue
+                raise HttpClientError(f'{integration}: {type(e).__name__}: {e}') from e
+
+            response = HttpResponse(raw.status, {k.lower(): v for k, v in raw.getheaders()}, content)
+            if raw.will_close:
+                conn.close()
+            else:
+                pool.release(conn)
+
+            retryable = response.status_code in (RETRY_STATUSES if method in IDEMPOTENT_METHODS else REJECTED_STATUSES)
+            if retryable and retries_left > 0 and budget.try_spend():
+                retries_left -= 1
+                attempt += 1
+                _sleep_backoff(policy, attempt, deadline, _retry_after(response))
+                continue
+            return response
+
+
+def _sleep_backoff(policy: Policy, attempt: int, deadline: Optional[float],
+                   retry_after: Optional[float] = None) -> None:
+    delay = policy.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, 2.0))
+    if deadline is not None:
+        delay = min(delay, max(0.0, deadline - time.monotonic()))
+    time.sleep(delay)
+
+
+def http_pool_stats() -> Dict[str, Any]:
+    '''Per-origin connection reuse and per-integration retry budget counters'''
+    with _registry_lock:
+        pools = dict(_pools)
+        budgets = dict(_budgets)
+    return {
+        'hosts': {f'{s}://{h}:{p}': pool.stats() for (s, h, p), pool in pools.items()},
+        'retry_budget_exhausted': {name: b.exhausted for name, b in budgets.items()}
+    }
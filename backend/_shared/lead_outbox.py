@@ -0,0 +1,306 @@
+'''
+Shared utility: Durable outbox for leads sent to Bitrix24 and Telegram
+Usage: from _shared.lead_outbox import enqueue_leads
+
+    enqueue_leads('contact-form', {
+        'bitrix24': {'fields': bitrix_fields},
+        'telegram': {'text': message}
+    })
+
+With LEAD_OUTBOX=1, handlers store one lead_outbox row per channel in a
+single INSERT and respond at once. Without it (the default) they deliver
+synchronously as before, because nothing runs the dispatcher on the
+cloud deploy. OutboxDispatcher (run by backend/outbox_worker.py or
+`local_host.py --outbox`) delivers them:
+- It claims due rows with FOR UPDATE SKIP LOCKED, so several workers
+  never claim the same row.
+- Claimed rows are leased: if a worker dies, they become due again.
+- All Bitrix24 leads for a webhook go in one `batch` call of up to 50
+  commands.
+- Failures are retried with exponential backoff until
+  OUTBOX_MAX_ATTEMPTS is reached, after which the row is marked failed.
+The Telegram bot token, chat id and Bitrix24 webhook are read through
+get_secret at delivery time, not stored with the lead.
+'''
+
+import os
+import json
+import random
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from _shared.db_pool import db_connection
+from _shared.db_secrets import get_secret
+from _shared.http_client import http_request
+from _shared.tracing import span
+
+# Only turn this on where a dispatcher runs; otherwise queued leads are never sent
+LEAD_OUTBOX = os.environ.get('LEAD_OUTBOX', '0') == '1'
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '50'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '12'))
+OUTBOX_BACKOFF_BASE = float(os.environ.get('OUTBOX_BACKOFF_BASE', '30'))
+OUTBOX_BACKOFF_MAX = float(os.environ.get('OUTBOX_BACKOFF_MAX', '3600'))
+# A claimed row becomes due again after this long if its worker died mid-delivery
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', '120'))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', '5'))
+
+# Bitrix24 REST accepts at most 50 commands per batch call
+BITRIX_BATCH_LIMIT = 50
+TELEGRAM_API_BASE = os.environ.get('TELEGRAM_API_BASE', 'https://api.telegram.org')
+
+
+def enqueue_leads(source: str, messages: Dict[str, Dict[str, Any]]) -> List[int]:
+    '''
+    Stores one outbox row per channel with a single INSERT
+
+    Args:
+        source: Function name recorded with the rows
+        messages: channel ('bitrix24' | 'telegram') -> payload
+
+    Returns:
+        Outbox row ids
+    '''
+    if not messages:
+        return []
+    placeholders = ', '.join(['(%s, %s, %s)'] * len(messages))
+    params: List[Any] = []
+    for channel, payload in messages.items():
+        params += [source, channel, json.dumps(payload, ensure_ascii=False)]
+
+    with span('outbox.enqueue'), db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f'INSERT INTO lead_outbox (source, channel, payload) VALUES {placeholders} RETURNING id',
+            params
+        )
+        ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        cur.close()
+    return ids
+
+
+def php_query(data: Any, prefix: str = '') -> List[Tuple[str, str]]:
+    '''Flattens nested dicts/lists into PHP-style key[sub][0] pairs as Bitrix24 expects'''
+    pairs: List[Tuple[str, str]] = []
+    items = data.items() if isinstance(data, dict) else enumerate(data)
+    for key, value in items:
+        name = f'{prefix}[{key}]' if prefix else str(key)
+        if isinstance(value, (dict, list)):
+            pairs += php_query(value, name)
+        elif value is not None:
+            pairs.append((name, value if isinstance(value, str) else json.dumps(value)))
+    return pairs
+
+
+def backoff_seconds(attempts: int) -> float:
+    '''Delay before the next attempt after `attempts` failures, with jitter'''
+    delay = min(OUTBOX_BACKOFF_BASE * (2 ** max(0, attempts - 1)), OUTBOX_BACKOFF_MAX)
+    return delay * (0.8 + random.random() * 0.4)
+
+
+class OutboxDispatcher:
+    '''Claims due outbox rows, delivers them, and records the outcome'''
+
+    def __init__(self, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.runs = 0
+        self.last_delivery_lag = 0.0
+        self.last_error: Optional[str] = None
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute('''
+                UPDATE lead_outbox
+                SET attempts = attempts + 1,
+                    next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                WHERE id IN (
+                    SELECT id FROM lead_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY next_attempt_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, channel, payload, attempts,
+                          EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - created_at)
+            ''', (OUTBOX_LEASE_SECONDS, self.batch_size))
+            rows = [
+                {'id': r[0], 'channel': r[1], 'payload': r[2], 'attempts': r[3], 'age': float(r[4])}
+                for r in cur.fetchall()
+            ]
+            conn.commit()
+            cur.close()
+        return rows
+
+    def _deliver_bitrix(self, rows: List[Dict[str, Any]]) -> Dict[int, Optional[str]]:
+        '''Sends leads through Bitrix24 `batch`; returns id -> error (None on success)'''
+        outcome: Dict[int, Optional[str]] = {}
+        configured = get_secret('BITRIX24_WEBHOOK_URL') or get_secret('bitrix24_webhook_url')
+
+        by_webhook: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            webhook = row['payload'].get('webhook') or configured
+            if not webhook:
+                outcome[row['id']] = 'Bitrix24 webhook not configured'
+                continue
+            by_webhook.setdefault(webhook, []).append(row)
+
+        for webhook, group in by_webhook.items():
+            for start in range(0, len(group), BITRIX_BATCH_LIMIT):
+                chunk = group[start:start + BITRIX_BATCH_LIMIT]
+                cmd = {
+                    f"lead_{row['id']}": 'crm.lead.add?' + urlencode(php_query({'fields': row['payload']['fields']}))
+                    for row in chunk
+                }
+                try:
+                    response = http_request('POST', f'{webhook}batch.json', 'bitrix', json_body={'halt': 0, 'cmd': cmd})
+                    body = response.json()
+                except Exception as e:
+                    for row in chunk:
+                        outcome[row['id']] = f'{type(e).__name__}: {e}'
+                    continue
+
+                result = body.get('result') or {}
+                created = result.get('result') or {}
+                errors = result.get('result_error') or {}
+                for row in chunk:
+                    key = f"lead_{row['id']}"
+                    if isinstance(created, dict) and created.get(key):
+                        outcome[row['id']] = None
+                    else:
+                        error = errors.get(key) if isinstance(errors, dict) else None
+                        outcome[row['id']] = json.dumps(error or body.get('error_description') or body.get('error')
+                                                        or 'no result', ensure_ascii=False)[:500]
+        return outcome
+
+    def _deliver_telegram(self, rows: List[Dict[str, Any]]) -> Dict[int, Optional[str]]:
+        outcome: Dict[int, Optional[str]] = {}
+        bot_token = get_secret('TELEGRAM_BOT_TOKEN')
+        chat_id = get_secret('TELEGRAM_CHAT_ID')
+        for row in rows:
+            if not bot_token or not chat_id:
+                outcome[row['id']] = 'Telegram bot token or chat id not configured'
+                continue
+            payload = {'chat_id': chat_id, **row['payload']}
+            try:
+                response = http_request('POST', f'{TELEGRAM_API_BASE}/bot{bot_token}/sendMessage', 'telegram',
+                                        json_body=payload)
+                body = response.json()
+                outcome[row['id']] = None if body.get('ok') else str(body.get('description', 'not ok'))[:500]
+            except Exception as e:
+                outcome[row['id']] = f'{type(e).__name__}: {e}'
+        return outcome
+
+    def _record(self, rows: List[Dict[str, Any]], outcome: Dict[int, Optional[str]]) -> None:
+        values = []
+        for row in rows:
+            error = outcome.get(row['id'], 'unknown channel')
+            if error is None:
+                values.append((row['id'], 'delivered', None, 0.0))
+            elif row['attempts'] >= OUTBOX_MAX_ATTEMPTS:
+                values.append((row['id'], 'failed', error, 0.0))
+            else:
+                values.append((row['id'], 'pending', error, backoff_seconds(row['attempts'])))
+
+        placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(values))
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f'''
+                UPDATE lead_outbox AS o
+                SET status = v.status,
+                    last_error = v.error,
+                    delivered_at = CASE WHEN v.status = 'delivered' THEN CURRENT_TIMESTAMP END,
+                    next_attempt_at = CASE WHEN v.status = 'pending'
+                                           THEN CURRENT_TIMESTAMP + make_interval(secs => v.delay)
+                                           ELSE o.next_attempt_at END
+                FROM (VALUES {placeholders}) AS v(id, status, error, delay)
+                WHERE o.id = v.id
+            ''', [item for value in values for item in value])
+            conn.commit()
+            cur.close()
+
+        with self._lock:
+            for row, (_, status, _, _) in zip(rows, values):
+                if status == 'delivered':
+                    self.delivered += 1
+                    self.last_delivery_lag = row['age']
+                elif status == 'failed':
+                    self.dead += 1
+                    print(f"Lead outbox row {row['id']} failed after {row['attempts']} attempts: {outcome.get(row['id'])}")
+                else:
+                    self.retried += 1
+
+    def run_once(self) -> int:
+        '''Delivers one batch of due rows; returns how many were claimed'''
+        with span('outbox.dispatch'):
+            rows = self._claim()
+            if rows:
+                outcome: Dict[int, Optional[str]] = {}
+                outcome.update(self._deliver_bitrix([r for r in rows if r['channel'] == 'bitrix24']))
+                outcome.update(self._deliver_telegram([r for r in rows if r['channel'] == 'telegram']))
+                self._record(rows, outcome)
+        with self._lock:
+            self.runs += 1
+        return len(rows)
+
+    def run_forever(self, interval: float = OUTBOX_POLL_INTERVAL) -> None:
+        '''Polls until stop(); drains back-to-back while full batches keep coming'''
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+                with self._lock:
+                    self.last_error = None
+            except Exception as e:
+                claimed = 0
+                with self._lock:
+                    self.last_error = f'{type(e).__name__}: {e}'
+                print(f'Lead outbox dispatch error: {self.last_error}')
+            if claimed < self.batch_size:
+                self._stop.wait(interval)
+
+    def start(self, interval: float = OUTBOX_POLL_INTERVAL) -> 'OutboxDispatcher':
+        self._thread = threading.Thread(target=self.run_forever, args=(interval,),
+                                        name='lead-outbox', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        '''Queue depth and lag from the table plus this worker's counters'''
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute('''
+                SELECT COUNT(*) FILTER (WHERE status = 'pending'),
+                       COUNT(*) FILTER (WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP),
+                       COUNT(*) FILTER (WHERE status = 'failed'),
+                       COALESCE(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(created_at) FILTER (WHERE status = 'pending')), 0)
+                FROM lead_outbox
+                WHERE status <> 'delivered'
+            ''')
+            pending, due, failed, oldest = cur.fetchone()
+            cur.close()
+
+        with self._lock:
+            return {
+                'queue_depth': pending,
+                'due': due,
+                'failed_total': failed,
+                'oldest_pending_seconds': round(float(oldest), 1),
+                'last_delivery_lag_seconds': round(self.last_delivery_lag, 1),
+                'delivered': self.delivered,
+                'retried': self.retried,
+                'dead': self.dead,
+                'runs': self.runs,
+                'last_error': self.last_error
+            }
@@ -0,0 +1,79 @@
+'''
+Shared utility: Keyset pagination over (created_at, id), newest first
+Usage: from _shared.pagination import decode_cursor, page_limit, page_offset, split_page
+
+    limit = page_limit(params.get('limit'))         # these raise InvalidPageError -> 400
+    offset = page_offset(params.get('offset'))
+    after = decode_cursor(params.get('cursor'))    # None on the first page
+    if after is not None:
+        cur.execute("... WHERE (created_at, id) < (%s, %s)"
+                    " ORDER BY created_at DESC, id DESC LIMIT %s", (*after, limit + 1))
+    else:
+        cur.execute("... ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s", (limit + 1, offset))
+    logs, next_cursor = split_page(cur.fetchall(), limit)
+
+With an index on (created_at DESC, id DESC) the row comparison is an
+index range start, so any page costs the same as the first one, while
+OFFSET has to walk past every skipped row. id breaks ties between rows
+logged in the same microsecond. Fetching limit + 1 rows tells whether a
+next page exists without counting the table.
+'''
+
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+PAGE_LIMIT_MAX = 500
+
+
+class InvalidPageError(ValueError):
+    '''limit, offset or cursor that can't be used; handlers answer 400'''
+
+
+class InvalidCursorError(InvalidPageError):
+    '''Cursor token that this module did not produce'''
+
+
+def page_limit(value: Any, default: int = 50) -> int:
+    try:
+        return max(1, min(int(value or default), PAGE_LIMIT_MAX))
+    except (TypeError, ValueError):
+        raise InvalidPageError('limit must be an integer')
+
+
+def page_offset(value: Any) -> int:
+    '''Row offset for the OFFSET form; Postgres rejects negative ones'''
+    try:
+        offset = int(value or 0)
+    except (TypeError, ValueError):
+        raise InvalidPageError('offset must be an integer')
+    if offset < 0:
+        raise InvalidPageError('offset must not be negative')
+    return offset
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    '''Opaque token for the position after (created_at, row_id)'''
+    raw = f'{created_at.isoformat()}|{row_id}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    '''(created_at, id) from a token, None for an empty one'''
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('ascii')
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursorError('Invalid cursor')
+
+
+def split_page(rows: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    '''First limit rows of a limit + 1 fetch and the cursor of the next page, if any'''
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1]['created_at'], page[-1]['id'])
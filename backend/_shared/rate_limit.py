@@ -0,0 +1,256 @@
+'''
+Shared utility: Token-bucket rate limiting per endpoint and client IP
+Usage: from _shared.rate_limit import RateLimiter
+
+    limiter = RateLimiter('contact-form', per_minute=6, burst=3)
+
+    if method == 'OPTIONS':
+        return preflight('POST, OPTIONS')
+    limited = limiter.check(event)
+    if limited is not None:
+        return limited          # 429 with Retry-After
+
+Every (endpoint, IP) pair gets a bucket of `burst` tokens, refilled at
+per_minute / 60 tokens per second, and each request takes one token.
+Buckets live in an LRU dict capped at RATE_LIMIT_MAX_KEYS. A check is a
+dict lookup and a little arithmetic, and a flood of distinct IPs evicts
+the coldest buckets instead of growing memory. An evicted bucket comes
+back full, so eviction can only err on the side of letting a request
+through. RATE_LIMIT_<NAME> (e.g. RATE_LIMIT_CONTACT_FORM=20) overrides
+per_minute for one endpoint.
+
+In-memory buckets belong to one process. When several instances serve
+one address, RATE_LIMIT_BACKEND=postgres keeps the buckets in the
+rate_limit_buckets table (one upsert per check), and
+RATE_LIMIT_BACKEND=redis keeps them at RATE_LIMIT_REDIS_URL (one Lua
+call per check; needs the redis package). If the shared store fails,
+checks fall back to the in-memory buckets for RATE_LIMIT_RETRY_SHARED
+seconds instead of failing the request.
+'''
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from _shared.responses import json_response
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000'))
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+RATE_LIMIT_RETRY_SHARED = float(os.environ.get('RATE_LIMIT_RETRY_SHARED', '30'))
+# Every Nth Postgres check also deletes buckets idle long enough to be full again
+RATE_LIMIT_SWEEP_EVERY = 1000
+
+_limiters: Dict[str, 'RateLimiter'] = {}
+_registry_lock = threading.Lock()
+
+
+def client_ip(event: Dict[str, Any]) -> str:
+    '''
+    Source IP the runtime (or local_host.py) reports from the connection.
+    Without one, X-Real-IP or the last X-Forwarded-For hop, the parts a
+    proxy sets; the first hop is whatever the client sent, and keying on
+    it would give every forged header a fresh bucket
+    '''
+    source_ip = (event.get('requestContext') or {}).get('identity', {}).get('sourceIp')
+    if source_ip:
+        return source_ip
+    headers = event.get('headers') or {}
+    real_ip = headers.get('X-Real-IP') or headers.get('x-real-ip') or ''
+    if real_ip.strip():
+        return real_ip.strip()
+    forwarded = headers.get('X-Forwarded-For') or headers.get('x-forwarded-for') or ''
+    return forwarded.split(',')[-1].strip() or 'unknown'
+
+
+class MemoryBuckets:
+    '''LRU-bounded token buckets for this process'''
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max(1, max_keys)
+        self._lock = threading.Lock()
+        self._buckets: 'OrderedDict[str, list]' = OrderedDict()
+        self.evicted = 0
+
+    def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        '''(allowed, seconds until a token is available)'''
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+                bucket = self._buckets[key] = [burst, now]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0.0
+            return False, (1 - bucket[0]) / rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class PostgresBuckets:
+    '''Token buckets shared through the rate_limit_buckets table'''
+
+    # Every right-hand side of SET sees the old row, so the refill is computed once per check
+    UPSERT = """
+        INSERT INTO rate_limit_buckets AS b (bucket_key, tokens, allowed, refreshed_at)
+        VALUES (%(key)s, %(burst)s - 1, TRUE, now())
+        ON CONFLICT (bucket_key) DO UPDATE
+        SET tokens = LEAST(%(burst)s, b.tokens + EXTRACT(EPOCH FROM now() - b.refreshed_at) * %(rate)s)
+                     - CASE WHEN LEAST(%(burst)s, b.tokens + EXTRACT(EPOCH FROM now() - b.refreshed_at) * %(rate)s) >= 1
+                            THEN 1 ELSE 0 END,
+            allowed = LEAST(%(burst)s, b.tokens + EXTRACT(EPOCH FROM now() - b.refreshed_at) * %(rate)s) >= 1,
+            refreshed_at = now()
+        RETURNING allowed, tokens
+    """
+
+    def __init__(self):
+        self._checks = 0
+
+    def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        from _shared.db_pool import db_connection
+        self._checks += 1
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(self.UPSERT, {'key': key, 'rate': rate, 'burst': burst})
+            allowed, tokens = cur.fetchone()
+            if self._checks % RATE_LIMIT_SWEEP_EVERY == 0:
+                cur.execute("DELETE FROM rate_limit_buckets WHERE refreshed_at < now() - INTERVAL '1 hour'")
+            conn.commit()
+            cur.close()
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+class RedisBuckets:
+    '''Token buckets shared through Redis; each key expires once its bucket would be full'''
+
+    SCRIPT = """
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local tokens = tonumber(bucket[1]) or burst
+        local ts = tonumber(bucket[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_BACKEND=redis needs the redis package')
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        allowed, tokens = self._script(keys=[f'rate_limit:{key}'], args=[rate, burst])
+        tokens = float(tokens)
+        return bool(allowed), 0.0 if allowed else (1 - tokens) / rate
+
+
+_memory = MemoryBuckets()
+_shared_store: Optional[Any] = None
+_shared_down_until = 0.0
+_shared_lock = threading.Lock()
+
+
+def _shared() -> Optional[Any]:
+    '''Shared bucket store for RATE_LIMIT_BACKEND, None while it is down or not configured'''
+    global _shared_store
+    if RATE_LIMIT_BACKEND not in ('postgres', 'redis') or time.monotonic() < _shared_down_until:
+        return None
+    if _shared_store is None:
+        with _shared_lock:
+            if _shared_store is None:
+                _shared_store = PostgresBuckets() if RATE_LIMIT_BACKEND == 'postgres' else RedisBuckets()
+    return _shared_store
+
+
+class RateLimiter:
+    '''Per-IP token bucket for one endpoint'''
+
+    def __init__(self, name: str, per_minute: float, burst: Optional[float] = None):
+        self.name = name
+        override = os.environ.get('RATE_LIMIT_' + name.upper().replace('-', '_'))
+        per_minute = float(override) if override else per_minute
+        self.rate = per_minute / 60
+        self.burst = float(burst if burst is not None else per_minute)
+
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.shared_errors = 0
+
+        with _registry_lock:
+            _limiters[name] = self
+
+    def allow(self, client: str) -> Tuple[bool, float]:
+        '''(allowed, seconds to wait) for one request from client'''
+        global _shared_down_until
+        key = f'{self.name}:{client}'
+        result = None
+        try:
+            store = _shared()
+            if store is not None:
+                result = store.take(key, self.rate, self.burst)
+        except Exception as e:
+            _shared_down_until = time.monotonic() + RATE_LIMIT_RETRY_SHARED
+            with self._lock:
+                self.shared_errors += 1
+            print(f'Rate limit store unavailable, using in-memory buckets: {type(e).__name__}: {e}')
+        if result is None:
+            result = _memory.take(key, self.rate, self.burst)
+        with self._lock:
+            if result[0]:
+                self.allowed += 1
+            else:
+                self.limited += 1
+        return result
+
+    def check(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        '''None if the request may proceed, else a 429 response with Retry-After'''
+        if not RATE_LIMIT_ENABLED:
+            return None
+        allowed, retry_after = self.allow(client_ip(event))
+        if allowed:
+            return None
+        return json_response(429, {'error': 'Too many requests'},
+                             headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'allowed': self.allowed, 'limited': self.limited, 'shared_errors': self.shared_errors}
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    '''Per-endpoint counters plus the size of the in-memory bucket table'''
+    with _registry_lock:
+        limiters = dict(_limiters)
+    return {
+        'backend': RATE_LIMIT_BACKEND,
+        'buckets': len(_memory),
+        'evicted': _memory.evicted,
+        'endpoints': {name: limiter.stats() for name, limiter in limiters.items()}
+    }
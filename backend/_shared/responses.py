@@ -0,0 +1,164 @@
+'''
+Shared utility: HTTP responses and JSON serialization for handlers
+Usage: from _shared.responses import json_response, preflight
+
+    if method == 'OPTIONS':
+        return preflight('GET, POST, OPTIONS')
+    return json_response(200, rows, event=event)
+
+    etag = etag_for(payload)
+    return not_modified(event, etag) or json_response(200, payload, event=event, headers={'ETag': etag})
+
+Header dicts are built once per process and shared between responses, so
+treat them as read-only. The encoder serializes datetime/date/time,
+Decimal, UUID and psycopg2's RealDictRow directly, so handlers can return
+rows as fetched instead of converting each field in a Python loop. With
+`event` given, bodies above COMPRESS_MIN_BYTES are gzip/brotli-encoded
+when the client accepts it.
+'''
+
+import os
+import json
+import gzip
+import base64
+import hashlib
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from _shared.tracing import span
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '2048'))
+
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, memoryview):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+_encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_UUID
+
+    def dumps(data: Any) -> str:
+        '''Serializes data to a compact JSON string'''
+        return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS).decode('utf-8')
+else:
+    def dumps(data: Any) -> str:
+        '''Serializes data to a compact JSON string'''
+        return _encoder.encode(data)
+
+
+@lru_cache(maxsize=None)
+def _preflight_headers(methods: str, allow_headers: str) -> Dict[str, str]:
+    return {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': methods,
+        'Access-Control-Allow-Headers': allow_headers,
+        'Access-Control-Max-Age': '86400'
+    }
+
+
+def preflight(methods: str = 'GET, OPTIONS', allow_headers: str = 'Content-Type') -> Dict[str, Any]:
+    '''CORS preflight response with cached headers'''
+    return {
+        'statusCode': 200,
+        'headers': _preflight_headers(methods, allow_headers),
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def _accepted_encoding(event: Dict[str, Any]) -> Optional[str]:
+    headers = event.get('headers') or {}
+    accept = headers.get('Accept-Encoding') or headers.get('accept-encoding') or ''
+    if brotli is not None and 'br' in accept:
+        return 'br'
+    if 'gzip' in accept:
+        return 'gzip'
+    return None
+
+
+def json_response(status_code: int, data: Any, event: Optional[Dict[str, Any]] = None,
+                  headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    '''
+    JSON response with CORS headers
+
+    Args:
+        status_code: HTTP status
+        data: Anything the shared encoder handles
+        event: Incoming event; enables compression for large bodies
+        headers: Extra headers merged over the JSON defaults
+    '''
+    with span('json.encode'):
+        body = dumps(data)
+    response_headers = {**JSON_HEADERS, **headers} if headers else JSON_HEADERS
+
+    if event is not None and len(body) >= COMPRESS_MIN_BYTES:
+        encoding = _accepted_encoding(event)
+        if encoding is not None:
+            raw = body.encode('utf-8')
+            compressed = brotli.compress(raw, quality=5) if encoding == 'br' else gzip.compress(raw, compresslevel=5)
+            return {
+                'statusCode': status_code,
+                'headers': {**response_headers, 'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'},
+                'body': base64.b64encode(compressed).decode('ascii'),
+                'isBase64Encoded': True
+            }
+
+    return {
+        'statusCode': status_code,
+        'headers': response_headers,
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+
+def etag_for(data: Any) -> str:
+    '''Weak ETag of the JSON encoding of data; weak because the body may be compressed'''
+    digest = hashlib.blake2b(dumps(data).encode('utf-8'), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def not_modified(event: Dict[str, Any], etag: str) -> Optional[Dict[str, Any]]:
+    '''304 response if the request's If-None-Match lists etag, else None'''
+    headers = event.get('headers') or {}
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match') or ''
+    candidates = {tag.strip() for tag in if_none_match.split(',')}
+    # Weak comparison: W/"x" and "x" name the same representation
+    if etag not in candidates and etag[2:] not in candidates and '*' not in candidates:
+        return None
+    return {
+        'statusCode': 304,
+        'headers': {**CORS_HEADERS, 'ETag': etag},
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def error_response(status_code: int, message: str, **extra: Any) -> Dict[str, Any]:
+    '''JSON error body in the {"error": message} shape handlers already use'''
+    return json_response(status_code, {'error': message, **extra})
@@ -0,0 +1,209 @@
+'''
+Shared utility: Per-invocation timing spans and latency histograms
+Usage: from _shared.tracing import span, traced
+
+    @traced
+    def handler(event, context):
+        with span('http.bitrix'):
+            ...
+
+Enabled with TRACE_SPANS=1. Each invocation then prints one JSON log line
+with its spans, e.g.
+{"trace": "contact-form", "request_id": "...", "status": 200,
+ "duration_ms": 31.2, "spans": [{"name": "http.bitrix", "start_ms": 0.4, "ms": 28.9}]}
+(TRACE_LOG=0 keeps the histograms but drops the log lines). Durations
+also feed process-wide histograms that render_prometheus() exposes in
+Prometheus text format. db_connection() and json_response() open their
+own spans, and pooled connections time every cursor.execute.
+
+When disabled, @traced returns the handler unchanged and span() returns
+a shared no-op context manager, so instrumented code pays one function
+call per span.
+'''
+
+import os
+import json
+import time
+import threading
+import contextvars
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TRACE_ENABLED = os.environ.get('TRACE_SPANS', '').lower() in ('1', 'true', 'yes')
+TRACE_LOG = os.environ.get('TRACE_LOG', '1').lower() not in ('0', 'false', 'no')
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    '''Cumulative-bucket histogram keyed by a tuple of label values'''
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, labels: Tuple[str, ...], seconds: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # one slot per bucket, then +Inf, sum
+                series = self._series[labels] = [0.0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(BUCKETS)] += 1
+            series[-1] += seconds
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            base = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            sep = ',' if base else ''
+            braces = f'{{{base}}}' if base else ''
+            cumulative = 0.0
+            for bound, count in zip(BUCKETS, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {cumulative:g}')
+            cumulative += series[len(BUCKETS)]
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {cumulative:g}')
+            lines.append(f'{self.name}_sum{braces} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{braces} {cumulative:g}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+INVOCATIONS = Histogram('function_invocation_duration_seconds',
+                        'Handler wall time per invocation', ('function', 'status'))
+SPANS = Histogram('function_span_duration_seconds',
+                  'Time spent in named spans inside handlers', ('function', 'span'))
+
+
+class Trace:
+    '''Spans collected during one invocation'''
+
+    __slots__ = ('function', 'request_id', 'started', 'spans')
+
+    def __init__(self, function: str, request_id: str):
+        self.function = function
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('trace', default=None)
+
+
+class _Span:
+    __slots__ = ('name', 'attrs', 'started')
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> '_Span':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        finished = time.perf_counter()
+        trace: Optional[Trace] = _current.get()
+        function = trace.function if trace is not None else '-'
+        SPANS.observe((function, self.name), finished - self.started)
+        if trace is not None:
+            record = {
+                'name': self.name,
+                'start_ms': round((self.started - trace.started) * 1000, 3),
+                'ms': round((finished - self.started) * 1000, 3)
+            }
+            if self.attrs:
+                record.update(self.attrs)
+            if exc_type is not None:
+                record['error'] = exc_type.__name__
+            trace.spans.append(record)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs: Any):
+    '''Times the enclosed block as a named span of the current invocation'''
+    if not TRACE_ENABLED:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def traced(handler: Callable) -> Callable:
+    '''Wraps a cloud function handler so each invocation is traced and logged'''
+    if not TRACE_ENABLED:
+        return handler
+
+    @wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Any:
+        function = getattr(context, 'function_name', None) or handler.__module__
+        trace = Trace(function, getattr(context, 'request_id', ''))
+        token = _current.set(trace)
+        status = 'error'
+        try:
+            response = handler(event, context)
+            if isinstance(response, dict):
+                status = str(response.get('statusCode', 200))
+            return response
+        finally:
+            _current.reset(token)
+            duration = time.perf_counter() - trace.started
+            INVOCATIONS.observe((function, status), duration)
+            if TRACE_LOG:
+                print(json.dumps({
+                    'trace': function,
+                    'request_id': trace.request_id,
+                    'status': status,
+                    'duration_ms': round(duration * 1000, 3),
+                    'spans': trace.spans
+                }, ensure_ascii=False, default=str))
+
+    return wrapper
+
+
+@lru_cache(maxsize=None)
+def traced_cursor_class(base: type) -> type:
+    '''Subclass of a psycopg2 cursor class whose execute() is a span'''
+
+    def execute(self, query, vars=None):
+        sql = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        with _Span('db.execute', {'sql': ' '.join(sql.split())[:80]}):
+            return base.execute(self, query, vars)
+
+    def executemany(self, query, vars_list):
+        with _Span('db.executemany', {}):
+            return base.executemany(self, query, vars_list)
+
+    return type('Traced' + base.__name__, (base,), {'execute': execute, 'executemany': executemany})
+
+
+def render_prometheus(extra: Optional[List[str]] = None) -> str:
+    '''Histograms (and any extra pre-rendered lines) in Prometheus text format'''
+    lines = INVOCATIONS.render() + SPANS.render()
+    if extra:
+        lines.extend(extra)
+    return '\n'.join(lines) + '\n'
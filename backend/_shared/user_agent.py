@@ -0,0 +1,112 @@
+'''
+Shared utility: Table-driven User-Agent classifier with an LRU cache
+Usage: from _shared.user_agent import classify_user_agent
+
+    ua = classify_user_agent(headers.get('user-agent', ''))
+    ua.device, ua.browser, ua.os, ua.is_bot
+
+One precompiled regex finds every known token in a single pass over
+the string. Each dimension is then decided by the first entry of its
+table whose token was found. The order of the tables matters:
+- Edge, Opera and Yandex come before Chrome, and Chrome before Safari,
+  because their UAs contain the later tokens too.
+- Tablet markers come before mobile ones.
+Results are cached by the raw UA string. A few hundred UAs make up
+nearly all traffic, so most calls are a cache hit.
+'''
+
+import os
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, NamedTuple, Tuple
+
+UA_CACHE_SIZE = int(os.environ.get('UA_CACHE_SIZE', '1024'))
+
+
+class UserAgentInfo(NamedTuple):
+    device: str
+    browser: str
+    os: str
+    is_bot: bool
+
+
+BOT_TOKENS: Tuple[str, ...] = (
+    'bot', 'crawl', 'spider', 'slurp', 'headlesschrome/', 'lighthouse',
+    'facebookexternalhit', 'yandexmetrika', 'python-', 'curl/', 'wget/', 'okhttp', 'go-http-client', 'httpclient'
+)
+
+BROWSERS: Tuple[Tuple[str, str], ...] = (
+    ('edg/', 'Edge'), ('edge/', 'Edge'), ('edga/', 'Edge'), ('edgios/', 'Edge'),
+    ('yabrowser', 'Yandex'), ('opr/', 'Opera'), ('opera', 'Opera'),
+    ('samsungbrowser', 'Samsung Internet'),
+    ('firefox/', 'Firefox'), ('fxios/', 'Firefox'),
+    ('crios/', 'Chrome'), ('chrome/', 'Chrome'), ('chromium/', 'Chrome'),
+    ('safari/', 'Safari'),
+    ('msie ', 'IE'), ('trident/', 'IE')
+)
+
+OPERATING_SYSTEMS: Tuple[Tuple[str, str], ...] = (
+    ('windows', 'Windows'),
+    ('iphone', 'iOS'), ('ipad', 'iOS'), ('ipod', 'iOS'),
+    ('android', 'Android'),
+    ('cros ', 'ChromeOS'),
+    ('mac os x', 'macOS'), ('macintosh', 'macOS'),
+    ('linux', 'Linux')
+)
+
+TABLET_TOKENS: Tuple[str, ...] = ('ipad', 'tablet', 'kindle', 'silk/', 'playbook')
+MOBILE_TOKENS: Tuple[str, ...] = ('mobile', 'iphone', 'ipod', 'android', 'windows phone', 'opera mini')
+
+_ALL_TOKENS = sorted(
+    set(BOT_TOKENS) | {t for t, _ in BROWSERS} | {t for t, _ in OPERATING_SYSTEMS}
+    | set(TABLET_TOKENS) | set(MOBILE_TOKENS),
+    key=len, reverse=True
+)
+_TOKEN_RE = re.compile('|'.join(re.escape(token) for token in _ALL_TOKENS))
+# Matches don't overlap, so a match also stands for the tokens inside it:
+# 'windows phone' implies 'windows', 'headlesschrome/' implies 'chrome/'
+_IMPLIED: Dict[str, FrozenSet[str]] = {
+    token: frozenset(t for t in _ALL_TOKENS if t in token) for token in _ALL_TOKENS
+}
+
+UNKNOWN = UserAgentInfo('desktop', 'unknown', 'unknown', False)
+
+
+def _tokens(ua: str) -> FrozenSet[str]:
+    found = set()
+    for match in _TOKEN_RE.finditer(ua.lower()):
+        found |= _IMPLIED[match.group()]
+    return frozenset(found)
+
+
+def _first(found: FrozenSet[str], table: Tuple[Tuple[str, str], ...], default: str) -> str:
+    for token, label in table:
+        if token in found:
+            return label
+    return default
+
+
+@lru_cache(maxsize=UA_CACHE_SIZE)
+def classify_user_agent(ua: str) -> UserAgentInfo:
+    '''Device (desktop/mobile/tablet), browser, OS and bot flag for a raw User-Agent'''
+    if not ua:
+        return UNKNOWN
+    found = _tokens(ua)
+
+    is_bot = any(token in found for token in BOT_TOKENS)
+    if any(token in found for token in TABLET_TOKENS):
+        device = 'tablet'
+    elif 'android' in found and 'mobile' not in found:
+        # Android tablets omit "Mobile"; phones always send it
+        device = 'tablet'
+    elif any(token in found for token in MOBILE_TOKENS):
+        device = 'mobile'
+    else:
+        device = 'desktop'
+
+    return UserAgentInfo(device, _first(found, BROWSERS, 'unknown'), _first(found, OPERATING_SYSTEMS, 'unknown'), is_bot)
+
+
+def user_agent_cache_stats() -> Dict[str, int]:
+    info = classify_user_agent.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
@@ -0,0 +1,225 @@
+'''
+Shared utility: Write-behind buffer that flushes rows to the database in batches
+Usage: from _shared.write_behind import WriteBehindBuffer
+
+    visits = WriteBehindBuffer('site_visits', flush_visits)
+    if not visits.submit(row):
+        flush_visits([row])   # queue full: write this one synchronously
+
+Rows are kept in a bounded in-memory queue and handed to flush(rows) on a
+background thread once WRITE_BEHIND_MAX_BATCH rows are waiting or the
+oldest has waited WRITE_BEHIND_MAX_DELAY seconds, so a burst of requests
+costs one statement and one commit instead of one per request.
+
+When the queue is full, submit() blocks for up to WRITE_BEHIND_BLOCK_MS
+and then returns False; callers write the row themselves, which slows
+them to the speed of the database instead of dropping data. A caller may
+instead pass block_ms=0 and drop the rejected row (load shedding) when
+losing rows under overload is preferable to waiting on the database, as
+bot-logger does; that has to be a deliberate, documented choice. A failed
+flush is retried with the rows kept at the head of the queue; once the
+retries are used up the batch is written row by row, so only the rows
+that still fail are dropped, not the rest of the batch with them. Buffers
+are flushed on interpreter exit and by flush_all(), which the local host
+calls on shutdown. Rows still buffered when a cloud instance is frozen are
+written on its next invocation or lost if it is reclaimed, so only
+enable this for data that tolerates that.
+'''
+
+import os
+import time
+import atexit
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+WRITE_BEHIND_MAX_BATCH = int(os.environ.get('WRITE_BEHIND_MAX_BATCH', '200'))
+WRITE_BEHIND_MAX_DELAY = float(os.environ.get('WRITE_BEHIND_MAX_DELAY', '1.0'))
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', '10000'))
+WRITE_BEHIND_BLOCK_MS = int(os.environ.get('WRITE_BEHIND_BLOCK_MS', '50'))
+# Consecutive failed flushes after which a batch is dropped instead of retried
+WRITE_BEHIND_MAX_RETRIES = int(os.environ.get('WRITE_BEHIND_MAX_RETRIES', '5'))
+
+_buffers: Dict[str, 'WriteBehindBuffer'] = {}
+_registry_lock = threading.Lock()
+
+
+class WriteBehindBuffer:
+    '''Bounded queue of rows drained by one flusher thread'''
+
+    def __init__(self, name: str, flush: Callable[[List[Any]], None],
+                 max_batch: int = WRITE_BEHIND_MAX_BATCH,
+                 max_delay: float = WRITE_BEHIND_MAX_DELAY,
+                 max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+                 block_ms: int = WRITE_BEHIND_BLOCK_MS):
+        self.name = name
+        self.flush = flush
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self.max_queue = max(self.max_batch, max_queue)
+        self.block_ms = block_ms
+
+        self._cond = threading.Condition()
+        self._queue: Deque[Any] = deque()
+        self._oldest: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._flushing = False
+        self._closed = False
+        self._failures = 0
+
+        self.submitted = 0
+        self.flushed = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+
+        with _registry_lock:
+            _buffers[name] = self
+
+    def submit(self, row: Any) -> bool:
+        '''Queues a row; False if the queue stayed full for block_ms'''
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._queue) >= self.max_queue:
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: len(self._queue) < self.max_queue or self._closed,
+                                    timeout=self.block_ms / 1000)
+                if len(self._queue) >= self.max_queue or self._closed:
+                    self.rejected += 1
+                    return False
+            self._queue.append(row)
+            self.submitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'write-behind-{self.name}', daemon=True)
+                self._thread.start()
+            if self._oldest is None:
+                # Wake the flusher so it starts the max_delay timer for this row
+                self._oldest = time.monotonic()
+                self._cond.notify_all()
+            elif len(self._queue) >= self.max_batch:
+                self._cond.notify_all()
+        return True
+
+    def _due(self) -> bool:
+        if not self._queue:
+            return False
+        return (self._closed or len(self._queue) >= self.max_batch
+                or time.monotonic() - self._oldest >= self.max_delay)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._closed and not self._queue:
+                        return
+                    timeout = None if self._oldest is None else self._oldest + self.max_delay - time.monotonic()
+                    self._cond.wait(timeout if timeout is None else max(0.0, timeout))
+                if self._failures:
+                    # Back off after a failed flush instead of hammering the database
+                    self._cond.wait_for(lambda: self._closed, timeout=min(self.max_delay * self._failures, 30))
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                self._oldest = time.monotonic() if self._queue else None
+                self._flushing = True
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch: List[Any]) -> None:
+        started = time.monotonic()
+        try:
+            self.flush(batch)
+            failed = None
+        except Exception as e:
+            failed = f'{type(e).__name__}: {e}'
+
+        isolate = False
+        with self._cond:
+            if failed is None:
+                self._failures = 0
+                self.flushed += len(batch)
+                self.batches += 1
+                self.last_flush_ms = round((time.monotonic() - started) * 1000, 1)
+            else:
+                self.errors += 1
+                self._failures += 1
+                if self._failures > WRITE_BEHIND_MAX_RETRIES or self._closed:
+                    self._failures = 0
+                    isolate = True
+                else:
+                    self._queue.extendleft(reversed(batch))
+                    self._oldest = time.monotonic()
+                    print(f'Write-behind {self.name}: flush failed, will retry: {failed}')
+            if not isolate:
+                self._flushing = False
+                self._cond.notify_all()
+                return
+
+        # Out of retries: write rows one at a time so a single bad row only loses itself
+        flushed = 0
+        for row in batch if len(batch) > 1 else ():
+            try:
+                self.flush([row])
+                flushed += 1
+            except Exception:
+                pass
+        with self._cond:
+            self._flushing = False
+            self.flushed += flushed
+            self.batches += flushed
+            self.dropped += len(batch) - flushed
+            print(f'Write-behind {self.name}: dropped {len(batch) - flushed} of {len(batch)} rows after error: {failed}')
+            self._cond.notify_all()
+
+    def drain(self, timeout: float = 10.0) -> None:
+        '''Blocks until everything queued so far has been flushed (or timeout)'''
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._oldest is not None:
+                self._oldest -= self.max_delay
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._queue and not self._flushing,
+                                timeout=max(0.0, deadline - time.monotonic()))
+
+    def close(self, timeout: float = 10.0) -> None:
+        '''Flushes what is left and stops the flusher thread'''
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        elif self._queue:
+            self._flush_batch(list(self._queue))
+            self._queue.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'queued': len(self._queue),
+                'max_queue': self.max_queue,
+                'submitted': self.submitted,
+                'flushed': self.flushed,
+                'batches': self.batches,
+                'rejected': self.rejected,
+                'errors': self.errors,
+                'dropped': self.dropped,
+                'last_flush_ms': self.last_flush_ms
+            }
+
+
+def flush_all(timeout: float = 10.0) -> None:
+    '''Flushes and closes every buffer in this process'''
+    with _registry_lock:
+        buffers = list(_buffers.values())
+    for buffer in buffers:
+        buffer.close(timeout)
+
+
+def write_behind_stats() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        buffers = dict(_buffers)
+    return {name: buffer.stats() for name, buffer in buffers.items()}
+
+
+atexit.register(flush_all)
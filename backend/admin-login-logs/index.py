@@ -1,120 +1,100 @@
-import json
 import os
-import psycopg2
 from typing import Dict, Any, List
 
+from _shared.db_pool import db_connection
+from _shared.pagination import InvalidPageError, decode_cursor, page_limit, page_offset, split_page
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
+# Totals and the page in one statement and one round trip. The FILTER
+# aggregate scans the table once instead of three COUNT(*) queries; the
+# page is read from the (created_at DESC, id DESC) index. With no cursor
+# the literal NULL folds the row comparison away at plan time, so both
+# the cursor and the OFFSET form keep their index plans. LEFT JOIN
+# returns the totals even when the page is empty.
+LOGS_QUERY = """
+    WITH totals AS (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE success = true) AS succeeded,
+               COUNT(*) FILTER (WHERE success = false) AS failed
+        FROM admin_login_logs
+    ), page AS (
+        SELECT id, ip_address, user_agent, success, created_at
+        FROM admin_login_logs
+        WHERE %(after_at)s::timestamp IS NULL OR (created_at, id) < (%(after_at)s, %(after_id)s)
+        ORDER BY created_at DESC, id DESC
+        LIMIT %(limit)s OFFSET %(offset)s
+    )
+    SELECT t.total, t.succeeded, t.failed,
+           p.id, p.ip_address, p.user_agent, p.success, p.created_at
+    FROM totals t
+    LEFT JOIN page p ON TRUE
+    ORDER BY p.created_at DESC, p.id DESC
+"""
+TOTAL_COLUMNS = 3
+PAGE_COLUMNS = ('id', 'ip_address', 'user_agent', 'success', 'created_at')
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Get admin login logs history
     Args: event with httpMethod, queryStringParameters for pagination
+          (limit, and cursor from next_cursor or offset)
           context with request_id
     Returns: HTTP response with login logs
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight()
     
     if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    database_url = os.environ.get('DATABASE_URL')
-    
-    if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Database not configured'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
     
     query_params = event.get('queryStringParameters') or {}
-    limit = int(query_params.get('limit', '50'))
-    offset = int(query_params.get('offset', '0'))
+    try:
+        limit = page_limit(query_params.get('limit'))
+        offset = page_offset(query_params.get('offset'))
+        after = decode_cursor(query_params.get('cursor'))
+    except InvalidPageError as e:
+        return error_response(400, str(e))
     
-    conn = psycopg2.connect(database_url)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT COUNT(*) FROM admin_login_logs"
-    )
-    total_count = cursor.fetchone()[0]
-    
-    cursor.execute(
-        """
-        SELECT id, ip_address, user_agent, success, created_at
-        FROM admin_login_logs
-        ORDER BY created_at DESC
-        LIMIT %s OFFSET %s
-        """,
-        (limit, offset)
-    )
+    database_url = os.environ.get('DATABASE_URL')
     
-    rows = cursor.fetchall()
+    if not database_url:
+        return error_response(500, 'Database not configured')
     
-    logs: List[Dict[str, Any]] = []
-    for row in rows:
-        logs.append({
-            'id': row[0],
-            'ip_address': row[1],
-            'user_agent': row[2],
-            'success': row[3],
-            'created_at': row[4].isoformat() if row[4] else None
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(LOGS_QUERY, {
+            'after_at': after[0] if after is not None else None,
+            'after_id': after[1] if after is not None else None,
+            'limit': limit + 1,
+            'offset': 0 if after is not None else offset
         })
+        result = cursor.fetchall()
+        cursor.close()
     
-    cursor.execute(
-        "SELECT COUNT(*) FROM admin_login_logs WHERE success = true"
-    )
-    success_count = cursor.fetchone()[0]
-    
-    cursor.execute(
-        "SELECT COUNT(*) FROM admin_login_logs WHERE success = false"
-    )
-    failed_count = cursor.fetchone()[0]
-    
-    cursor.close()
-    conn.close()
+    # Every row repeats the totals; the page columns follow them. Logs stay
+    # objects because LoginHistory.tsx reads them by field name
+    total_count, success_count, failed_count = result[0][:TOTAL_COLUMNS]
+    rows: List[Dict[str, Any]] = [
+        dict(zip(PAGE_COLUMNS, row[TOTAL_COLUMNS:])) for row in result if row[TOTAL_COLUMNS] is not None
+    ]
+    logs, next_cursor = split_page(rows, limit)
     
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
+    return json_response(200, {
+        'logs': logs,
+        'stats': {
+            'total_attempts': total_count,
+            'success_count': success_count,
+            'failed_count': failed_count
         },
-        'body': json.dumps({
-            'logs': logs,
-            'stats': {
-                'total_attempts': total_count,
-                'success_count': success_count,
-                'failed_count': failed_count
-            },
-            'pagination': {
-                'total': total_count,
-                'limit': limit,
-                'offset': offset,
-                'has_more': offset + limit < total_count
-            }
-        }),
-        'isBase64Encoded': False
-    }
+        'pagination': {
+            'total': total_count,
+            'limit': limit,
+            'offset': None if after is not None else offset,
+            'has_more': next_cursor is not None,
+            'next_cursor': next_cursor
+        }
+    }, event=event)
@@ -1,28 +1,35 @@
 import json
 import os
-import bcrypt
-import psycopg2
 from typing import Dict, Any
 
+from _shared.admin_auth import admin_password_hash, verify_admin_password
+from _shared.db_pool import db_connection
+from _shared.rate_limit import RateLimiter
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
 def log_login_attempt(ip_address: str, user_agent: str, success: bool) -> None:
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
         return
     
-    conn = psycopg2.connect(database_url)
-    cursor = conn.cursor()
-    
-    ip_address_escaped = ip_address.replace("'", "''")
-    user_agent_escaped = user_agent.replace("'", "''")
-    
-    cursor.execute(
-        f"INSERT INTO admin_login_logs (ip_address, user_agent, success) VALUES ('{ip_address_escaped}', '{user_agent_escaped}', {success})"
-    )
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        
+        ip_address_escaped = ip_address.replace("'", "''")
+        user_agent_escaped = user_agent.replace("'", "''")
+        
+        cursor.execute(
+            f"INSERT INTO admin_login_logs (ip_address, user_agent, success) VALUES ('{ip_address_escaped}', '{user_agent_escaped}', {success})"
+        )
+        
+        conn.commit()
+        cursor.close()
+
+# Caps password guessing and the bcrypt work it costs
+limiter = RateLimiter('auth-admin', per_minute=5, burst=5)
 
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Authenticate admin user with password and log attempt
@@ -40,28 +47,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     user_agent = headers.get('user-agent', headers.get('User-Agent', 'unknown'))
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight('POST, OPTIONS')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
+    
+    limited = limiter.check(event)
+    if limited is not None:
+        return limited
     
     body_str = event.get('body', '{}')
     if not body_str or body_str.strip() == '':
@@ -71,68 +64,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     password = body_data.get('password', '')
     
     if not password:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Password required'}),
-            'isBase64Encoded': False
-        }
-    
-    admin_password_hash = os.environ.get('ADMIN_PASSWORD_HASH')
-    
-    if not admin_password_hash:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Admin password not configured'}),
-            'isBase64Encoded': False
-        }
-    
-    password_bytes = password.encode('utf-8')
-    hash_str = admin_password_hash.strip()
-    
-    if hash_str.startswith('$2a$'):
-        hash_str = '$2b$' + hash_str[4:]
+        return error_response(400, 'Password required')
     
-    hash_bytes = hash_str.encode('utf-8')
+    password_hash = admin_password_hash()
     
-    print(f"Debug: Checking password against hash starting with: {hash_str[:10]}")
+    if not password_hash:
+        return error_response(500, 'Admin password not configured')
     
-    is_valid = False
-    try:
-        is_valid = bcrypt.checkpw(password_bytes, hash_bytes)
-        print(f"Debug: Password check result: {is_valid}")
-    except Exception as e:
-        print(f"Password check error: {e}")
+    is_valid = verify_admin_password(password, password_hash)
     
     log_login_attempt(ip_address, user_agent, is_valid)
     
     if is_valid:
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'success': True,
-                'message': 'Authentication successful'
-            }),
-            'isBase64Encoded': False
-        }
+        return json_response(200, {
+            'success': True,
+            'message': 'Authentication successful'
+        })
     else:
-        return {
-            'statusCode': 401,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Invalid password'}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+        return error_response(401, 'Invalid password')
\ No newline at end of file
@@ -0,0 +1,62 @@
+'''
+bot_log_summary maintenance: add the IPs logged before migration V0019 to the sketch
+Usage: python backend/backfill_bot_ips.py
+
+Meant to be run once after the migration. It streams the distinct
+bot_logs IPs without holding any lock, then merges them into the summary
+sketch of shard 0 in a short transaction, so bot-logger inserts only wait
+for that last UPDATE. IPs bot-logger added meanwhile are counted again,
+which a sketch union absorbs, so a rerun is harmless.
+'''
+
+import json
+import os
+import sys
+from typing import Any, Dict
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from _shared.db_pool import db_connection
+from _shared.hll import EMPTY_SKETCH, estimate, merge, sketch_of
+
+# Distinct IPs read per round trip
+BACKFILL_CHUNK_ROWS = 10000
+
+
+def backfill() -> Dict[str, Any]:
+    '''Merges every distinct bot_logs IP into the summary sketch; returns what was done'''
+    with db_connection() as conn:
+        ips = conn.cursor(name='bot_logs_ips')
+        ips.itersize = BACKFILL_CHUNK_ROWS
+        ips.execute('SELECT DISTINCT ip_address FROM bot_logs WHERE ip_address IS NOT NULL')
+        sketch = sketch_of(ip for (ip,) in ips)
+        ips.close()
+        # The named cursor's snapshot is released before the summary row is locked
+        conn.commit()
+
+        cur = conn.cursor()
+        cur.execute('SELECT ip_sketch FROM bot_log_summary WHERE shard = 0 FOR UPDATE')
+        row = cur.fetchone()
+        stored = bytes(row[0]) if row and row[0] is not None else EMPTY_SKETCH
+        merged = merge(stored, sketch)
+        if merged != stored:
+            cur.execute('''
+                INSERT INTO bot_log_summary (shard, ip_sketch)
+                VALUES (0, %s)
+                ON CONFLICT (shard) DO UPDATE
+                SET ip_sketch = EXCLUDED.ip_sketch, updated_at = CURRENT_TIMESTAMP
+            ''', (merged,))
+        conn.commit()
+        cur.close()
+
+    return {'unique_ips': estimate(merged), 'changed': merged != stored}
+
+
+def main() -> None:
+    print(json.dumps(backfill(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
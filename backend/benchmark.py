@@ -0,0 +1,437 @@
+'''
+Load and latency benchmark for backend functions
+Usage: python backend/benchmark.py [--only track-visit,get-analytics] [--concurrency 8] [--requests 500]
+       python backend/benchmark.py --mode http --concurrency 32
+       python backend/benchmark.py --write-baseline bench_baseline.json
+       python backend/benchmark.py --baseline bench_baseline.json --tolerance 0.25
+
+Replays each function's tests.json. In-process mode calls the handlers
+directly, as local_host.py loads them. HTTP mode sends the same cases
+through the local host over keep-alive connections, either one started
+in this process or the one at --url (which keeps whatever integrations
+it was started with).
+
+Outbound integrations are pointed at a stub server started here.
+Telegram, Bitrix24, Yandex Metrika/Webmaster and OpenAI all answer
+locally, after --stub-latency ms. The database comes from DATABASE_URL,
+normally the docker-compose postgres.
+
+Reports per function:
+- p50/p95/p99 latency
+- throughput
+- the share of responses whose status differs from expectedStatus
+- peak traced allocation per call
+
+With --baseline, exits non-zero when any of these regresses past
+--tolerance.
+'''
+
+import argparse
+import http.client
+import json
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from local_host import FunctionRegistry, InvocationContext, PooledHTTPServer, build_event
+
+# Functions whose upstreams have no stand-in here (public RSS feeds)
+EXTERNAL_FUNCTIONS = {'news-feed'}
+
+_SEO_SUGGESTION = {
+    'title': 'Разработка сайтов на React и TypeScript',
+    'description': 'Создаём современные сайты на React и TypeScript',
+    'h1_suggestions': ['Разработка сайтов', 'Frontend на React', 'Сайты на TypeScript'],
+    'keywords': ['разработка сайтов', 'react', 'typescript', 'frontend', 'веб-разработка'],
+    'improvements': ['Добавьте alt к изображениям', 'Сократите title', 'Добавьте FAQ']
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    '''Canned responses for every third-party API the functions call'''
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _dispatch(self) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        path = urlsplit(self.path).path
+        service = path.strip('/').split('/', 1)[0]
+        self.server.count(service)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        body = self._route(service, path)
+        if body is None:
+            self._send(404, {'error': f'No stub for {path}'})
+        else:
+            self._send(200, body)
+
+    def _route(self, service: str, path: str) -> Optional[Dict[str, Any]]:
+        if service == 'telegram':
+            return {'ok': True, 'result': {'message_id': 1, 'date': int(time.time())}}
+        if service == 'bitrix':
+            return {'result': 1, 'time': {'start': time.time(), 'finish': time.time()}}
+        if service == 'openai' and path.endswith('/chat/completions'):
+            return {
+                'id': 'chatcmpl-bench',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': 'gpt-4o-mini',
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': json.dumps(_SEO_SUGGESTION, ensure_ascii=False)},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+            }
+        if service == 'metrika':
+            today = time.strftime('%Y-%m-%d')
+            return {'data': [{'dimensions': [{'name': today}], 'metrics': [42.0]}]}
+        if service == 'webmaster':
+            if path.endswith('/user/hosts'):
+                return {'hosts': [{
+                    'host_id': 'https:example.com:443',
+                    'user_id': 1,
+                    'unicode_host_url': 'https://example.com',
+                    'verified': True
+                }]}
+            if path.endswith('/summary'):
+                return {'site_problems': [{'title': 'Дубли страниц', 'importance': 'RECOMMENDATION'}]}
+            if path.endswith('/diagnostics'):
+                return {'problems': [{'problem_type': 'NO_SITEMAP', 'severity': 'WARNING'}]}
+            if path.endswith('/sqi-history'):
+                return {'indicators': [{'value': 40}]}
+        return None
+
+    def _send(self, status: int, data: Dict[str, Any]) -> None:
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = _dispatch
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    '''Local stand-in for Telegram, Bitrix24, Yandex and OpenAI'''
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, latency_ms: float = 0):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.latency = latency_ms / 1000
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def count(self, service: str) -> None:
+        with self._lock:
+            self.calls[service] = self.calls.get(service, 0) + 1
+
+    def environment(self) -> Dict[str, str]:
+        '''Env overrides that route every integration to this server'''
+        base = self.base_url
+        return {
+            'TELEGRAM_API_BASE': f'{base}/telegram',
+            'TELEGRAM_BOT_TOKEN': 'bench',
+            'TELEGRAM_CHAT_ID': '1',
+            'BITRIX24_WEBHOOK_URL': f'{base}/bitrix/',
+            'OPENAI_API_KEY': 'bench',
+            'OPENAI_API_BASE': f'{base}/openai/v1',
+            'YANDEX_METRIKA_API_BASE': f'{base}/metrika',
+            'YANDEX_WEBMASTER_API_BASE': f'{base}/webmaster',
+            'YANDEX_WEBMASTER_TOKEN': 'bench'
+        }
+
+    def start(self) -> 'StubServer':
+        threading.Thread(target=self.serve_forever, name='bench-stubs', daemon=True).start()
+        return self
+
+
+def load_cases(name: str) -> List[Dict[str, Any]]:
+    '''Normalizes a function's tests.json into request cases'''
+    path = os.path.join(BACKEND_DIR, name, 'tests.json')
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        tests = json.load(f).get('tests', [])
+
+    cases = []
+    for test in tests:
+        split = urlsplit(test.get('path') or '/')
+        query = parse_qsl(split.query, keep_blank_values=True) + list((test.get('queryParams') or {}).items())
+        body = test.get('body')
+        if body is None:
+            body = ''
+        elif not isinstance(body, str):
+            body = json.dumps(body, ensure_ascii=False)
+        cases.append({
+            'name': test.get('name', ''),
+            'method': test.get('method', 'GET'),
+            'path': split.path or '/',
+            'query': urlencode(query),
+            'headers': {'Content-Type': 'application/json', **(test.get('headers') or {})},
+            'body': body.encode('utf-8'),
+            'expected': test.get('expectedStatus')
+        })
+    return cases
+
+
+class InProcessTarget:
+    '''Calls handlers directly, the way local_host.py invokes them'''
+
+    def __init__(self, registry: FunctionRegistry):
+        self.registry = registry
+
+    def call(self, name: str, case: Dict[str, Any]) -> int:
+        event = build_event(case['method'], case['path'], case['query'], dict(case['headers']),
+                            case['body'], '127.0.0.1')
+        try:
+            response = self.registry.handlers[name](event, InvocationContext(name, 30))
+        except Exception:
+            return 599
+        return int((response or {}).get('statusCode', 200))
+
+
+class HttpTarget:
+    '''Sends cases to a local host over one keep-alive connection per thread'''
+
+    def __init__(self, base_url: str):
+        split = urlsplit(base_url)
+        self.host = split.hostname
+        self.port = split.port or 80
+        self.prefix = split.path.rstrip('/')
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return conn
+
+    def call(self, name: str, case: Dict[str, Any]) -> int:
+        url = f"{self.prefix}/{name}{case['path']}" + (f"?{case['query']}" if case['query'] else '')
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(case['method'], url, body=case['body'] or None, headers=case['headers'])
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self._local.conn = None
+        return 599
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    '''Nearest-rank percentile of an ascending list'''
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_load(target: Any, name: str, cases: List[Dict[str, Any]],
+             requests: int, concurrency: int) -> Dict[str, Any]:
+    '''Replays cases round-robin from `concurrency` threads until `requests` were sent'''
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal errors
+        local_latencies = []
+        local_errors = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            case = cases[i % len(cases)]
+            start = time.perf_counter()
+            status = target.call(name, case)
+            local_latencies.append((time.perf_counter() - start) * 1000)
+            if case['expected'] is not None and status != case['expected']:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'error_rate': round(errors / len(latencies), 4) if latencies else 0.0
+    }
+
+
+def measure_allocations(target: InProcessTarget, name: str, cases: List[Dict[str, Any]],
+                        samples: int) -> float:
+    '''Mean peak traced memory per call in KiB, measured single-threaded'''
+    tracemalloc.start()
+    try:
+        peaks = []
+        for i in range(samples):
+            case = cases[i % len(cases)]
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            target.call(name, case)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return round(sum(peaks) / len(peaks) / 1024, 1)
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float) -> List[str]:
+    '''Returns a message for every metric that regressed past tolerance'''
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or 'error' in result:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'peak_alloc_kb'):
+            if metric in base and metric in result and base[metric] > 0 and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {result[metric]} > {base[metric]} baseline')
+        if base.get('rps') and result['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {result['rps']} < {base['rps']} baseline")
+        if result['error_rate'] > base.get('error_rate', 0):
+            regressions.append(f"{name}: error_rate {result['error_rate']} > {base.get('error_rate', 0)} baseline")
+    return regressions
+
+
+def print_report(results: Dict[str, Dict[str, Any]]) -> None:
+    width = max(len(name) for name in results)
+    print(f"{'function':<{width}}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'rps':>8}  {'errors':>7}  {'alloc':>9}")
+    for name, r in sorted(results.items()):
+        if 'error' in r:
+            print(f"{name:<{width}}  ERROR  {r['error']}")
+            continue
+        alloc = f"{r['peak_alloc_kb']:.1f}KiB" if 'peak_alloc_kb' in r else '-'
+        print(f"{name:<{width}}  {r['p50_ms']:>6.2f}ms  {r['p95_ms']:>6.2f}ms  {r['p99_ms']:>6.2f}ms  "
+              f"{r['rps']:>8.1f}  {r['error_rate']:>6.1%}  {alloc:>9}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark backend functions with their tests.json cases')
+    parser.add_argument('--mode', choices=('inprocess', 'http'), default='inprocess')
+    parser.add_argument('--url', help='existing local host to benchmark in http mode')
+    parser.add_argument('--only', default='', help='comma-separated function names')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per function')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per function')
+    parser.add_argument('--alloc-samples', type=int, default=20, help='calls traced for allocations; 0 disables')
+    parser.add_argument('--stub-latency', type=float, default=0, help='ms the stub integrations wait before answering')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--baseline', help='JSON file of previous results; fail on regression')
+    parser.add_argument('--write-baseline', help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    args = parser.parse_args(argv)
+
+    stubs = StubServer(args.stub_latency).start()
+    os.environ.update(stubs.environment())
+    # Every replayed request comes from 127.0.0.1 and would trip the per-IP limits;
+    # rate_limit reads this at import, so it has to be set before the handlers load
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+
+    only = {n.strip() for n in args.only.split(',') if n.strip()}
+    registry = FunctionRegistry(only=only or None)
+    names = sorted(only or set(registry.aliases.values()) - EXTERNAL_FUNCTIONS)
+
+    server = None
+    if args.mode == 'http' and not args.url:
+        server = PooledHTTPServer(('127.0.0.1', 0), registry, workers=max(args.concurrency, 4), quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        args.url = f'http://127.0.0.1:{server.server_address[1]}'
+    target = HttpTarget(args.url) if args.mode == 'http' else InProcessTarget(registry)
+    inprocess = InProcessTarget(registry)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for name in names:
+            cases = load_cases(name)
+            if name not in registry.handlers:
+                results[name] = {'error': registry.errors.get(name, 'not loaded')}
+                continue
+            if not cases:
+                results[name] = {'error': 'no tests.json cases'}
+                continue
+
+            for i in range(args.warmup):
+                target.call(name, cases[i % len(cases)])
+            results[name] = run_load(target, name, cases, args.requests, args.concurrency)
+            if args.alloc_samples > 0:
+                results[name]['peak_alloc_kb'] = measure_allocations(inprocess, name, cases, args.alloc_samples)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        stubs.shutdown()
+
+    if args.json:
+        print(json.dumps({'mode': args.mode, 'results': results, 'stub_calls': stubs.calls},
+                         indent=2, ensure_ascii=False))
+    else:
+        print_report(results)
+        if stubs.calls:
+            print('stub calls: ' + ', '.join(f'{k}={v}' for k, v in sorted(stubs.calls.items())))
+
+    if args.write_baseline:
+        stored = {}
+        if os.path.exists(args.write_baseline):
+            with open(args.write_baseline) as f:
+                stored = json.load(f)
+        stored[args.mode] = {name: r for name, r in results.items() if 'error' not in r}
+        with open(args.write_baseline, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get(args.mode, {})
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,244 @@
+'''
+get-analytics query benchmark on a synthetic site_visits table
+Usage: python backend/benchmark_analytics.py [--rows 10000000] [--span-days 365] [--days 30]
+       python backend/benchmark_analytics.py --rows 1000000 --repeat 20 --keep
+
+Builds a scratch schema (bench_analytics) in the DATABASE_URL database.
+It holds a monthly-partitioned site_visits filled with --rows visits
+spread over --span-days, plus the daily_stats, visit_dimension_daily and
+visitor_sketches tables track-visit would have filled while ingesting
+them, and is queried through search_path so the production tables are
+never touched. The script times:
+- before: the four per-dimension queries get-analytics used to run over
+  raw visits
+- after, cold: get-analytics' load_period() for the past days of the
+  window and for today, which is what a recomputation on an empty cache
+  runs
+- after, warm: load_period() for today alone, once the past days are cached
+Each variant runs --repeat times after one warm-up, and the script
+prints p50/p95 in ms. The schema is dropped at the end unless --keep is
+given; with --keep, a rerun skips the seeding.
+'''
+
+import argparse
+import importlib.util
+import math
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from typing import Callable, List
+
+import psycopg2
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from _shared.hll import sketch_of
+
+SCHEMA = 'bench_analytics'
+
+LEGACY_QUERIES = [
+    """
+    SELECT COUNT(*), COUNT(DISTINCT session_id)
+    FROM site_visits
+    WHERE visit_date = CURRENT_DATE AND is_admin = FALSE
+    """,
+    """
+    SELECT page_path, COUNT(*) as count
+    FROM site_visits
+    WHERE visit_date >= CURRENT_DATE - INTERVAL '%s days' AND is_admin = FALSE
+    GROUP BY page_path
+    ORDER BY count DESC
+    LIMIT 10
+    """,
+    """
+    SELECT device_type, COUNT(*) as count
+    FROM site_visits
+    WHERE visit_date >= CURRENT_DATE - INTERVAL '%s days' AND is_admin = FALSE
+    GROUP BY device_type
+    """,
+    """
+    SELECT browser, COUNT(*) as count
+    FROM site_visits
+    WHERE visit_date >= CURRENT_DATE - INTERVAL '%s days' AND is_admin = FALSE
+    GROUP BY browser
+    ORDER BY count DESC
+    """
+]
+
+
+def load_get_analytics():
+    '''get-analytics module, so its queries run exactly as deployed'''
+    path = os.path.join(BACKEND_DIR, 'get-analytics', 'index.py')
+    spec = importlib.util.spec_from_file_location('get_analytics_index', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def seed(cur, rows: int, span_days: int) -> None:
+    cur.execute(f'CREATE SCHEMA {SCHEMA}')
+    cur.execute(f'SET search_path TO {SCHEMA}, public')
+    cur.execute('''
+        CREATE TABLE site_visits (
+            id BIGSERIAL,
+            visit_date DATE NOT NULL DEFAULT CURRENT_DATE,
+            page_path TEXT,
+            user_agent TEXT,
+            referrer TEXT,
+            session_id VARCHAR(100),
+            ip_address VARCHAR(50),
+            device_type VARCHAR(20),
+            browser VARCHAR(50),
+            is_admin BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, visit_date)
+        ) PARTITION BY RANGE (visit_date)
+    ''')
+    cur.execute('CREATE TABLE site_visits_default PARTITION OF site_visits DEFAULT')
+    # Same monthly layout as migration V0015; ensure_site_visits_partitions() can't be used
+    # here because it would find the production partitions through search_path
+    month = (date.today() - timedelta(days=span_days)).replace(day=1)
+    while month <= date.today():
+        following = (month + timedelta(days=32)).replace(day=1)
+        cur.execute(f'''
+            CREATE TABLE site_visits_{month:%Y_%m} PARTITION OF site_visits
+            FOR VALUES FROM (%s) TO (%s)
+        ''', (month, following))
+        month = following
+    cur.execute('''
+        CREATE TABLE visit_dimension_daily (
+            stat_date DATE NOT NULL, dimension VARCHAR(20) NOT NULL, value TEXT NOT NULL,
+            shard SMALLINT NOT NULL DEFAULT 0, views INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, dimension, value, shard)
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE daily_stats (
+            stat_date DATE NOT NULL, shard SMALLINT NOT NULL DEFAULT 0,
+            total_visits INTEGER NOT NULL DEFAULT 0, unique_visitors INTEGER NOT NULL DEFAULT 0,
+            page_views INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, shard)
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE visitor_sketches (
+            stat_date DATE NOT NULL, shard SMALLINT NOT NULL DEFAULT 0, sketch BYTEA NOT NULL,
+            PRIMARY KEY (stat_date, shard)
+        )
+    ''')
+
+    started = time.monotonic()
+    # Page popularity is skewed like real traffic; sessions average ~4 views
+    cur.execute('''
+        INSERT INTO site_visits (visit_date, page_path, user_agent, referrer, session_id,
+                                 ip_address, device_type, browser, is_admin)
+        SELECT CURRENT_DATE - (random() ^ 2 * %(span)s)::int,
+               '/page/' || (floor(200 * random() ^ 3))::int,
+               'Mozilla/5.0',
+               '',
+               'session-' || (n / 4 + floor(random() * 3))::bigint,
+               '10.0.0.' || (n %% 250),
+               (ARRAY['desktop', 'mobile', 'tablet'])[1 + floor(random() * 3)::int],
+               (ARRAY['Chrome', 'Safari', 'Yandex', 'Firefox', 'Edge', 'Opera', 'unknown'])[1 + floor(random() * 7)::int],
+               random() < 0.02
+        FROM generate_series(1, %(rows)s) AS n
+    ''', {'rows': rows, 'span': span_days})
+    # What track-visit would have accumulated while ingesting these visits
+    cur.execute('''
+        INSERT INTO visit_dimension_daily (stat_date, dimension, value, views)
+        SELECT v.visit_date, d.dimension, d.value, COUNT(*)
+        FROM site_visits v
+        CROSS JOIN LATERAL (VALUES ('page', v.page_path), ('device', v.device_type),
+                                   ('browser', v.browser), ('referrer', '')) AS d(dimension, value)
+        WHERE v.is_admin = FALSE
+        GROUP BY 1, 2, 3
+    ''')
+    cur.execute('''
+        INSERT INTO daily_stats (stat_date, total_visits, unique_visitors, page_views)
+        SELECT visit_date, COUNT(*), COUNT(DISTINCT session_id), COUNT(*)
+        FROM site_visits
+        WHERE is_admin = FALSE
+        GROUP BY 1
+    ''')
+    # One folded sketch per day, as compact_visits.py leaves them
+    cur.execute('''
+        SELECT visit_date, array_agg(DISTINCT session_id)
+        FROM site_visits
+        WHERE is_admin = FALSE
+        GROUP BY 1
+    ''')
+    for visit_date, sessions in cur.fetchall():
+        cur.execute('INSERT INTO visitor_sketches (stat_date, sketch) VALUES (%s, %s)',
+                    (visit_date, sketch_of(sessions)))
+    print(f'Seeded {rows} visits and their rollups in {time.monotonic() - started:.1f}s')
+
+
+def timed(run: Callable[[], None], repeat: int) -> List[float]:
+    run()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)
+
+
+def report(name: str, samples: List[float]) -> None:
+    p95 = samples[max(0, math.ceil(0.95 * len(samples)) - 1)]
+    print(f'{name:<48} p50 {statistics.median(samples):>9.1f} ms   p95 {p95:>9.1f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark get-analytics queries on synthetic visits')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--span-days', type=int, default=365, help='history the visits are spread over')
+    parser.add_argument('--days', type=int, default=30, help='dashboard window, as ?days=')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--keep', action='store_true', help='keep the bench_analytics schema for the next run')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    cur.execute('SELECT 1 FROM pg_namespace WHERE nspname = %s', (SCHEMA,))
+    if cur.fetchone() is None:
+        seed(cur, args.rows, args.span_days)
+    cur.execute(f'SET search_path TO {SCHEMA}, public')
+    for table in ('site_visits', 'visit_dimension_daily', 'daily_stats', 'visitor_sketches'):
+        cur.execute(f'VACUUM ANALYZE {table}')
+
+    def legacy() -> None:
+        for query in LEGACY_QUERIES:
+            cur.execute(query % args.days if '%s' in query else query)
+            cur.fetchall()
+
+    get_analytics = load_get_analytics()
+
+    def cold() -> None:
+        get_analytics.load_period(cur, args.days, 1)
+        get_analytics.load_period(cur, 0, 0)
+
+    def warm() -> None:
+        get_analytics.load_period(cur, 0, 0)
+
+    results = [('before: 4 queries over raw visits', timed(legacy, args.repeat)),
+               ('after, cold: past days + today', timed(cold, args.repeat)),
+               ('after, warm: today only', timed(warm, args.repeat))]
+
+    print(f'\n{args.rows} visits over {args.span_days} days, window {args.days} days, {args.repeat} runs each')
+    for name, samples in results:
+        report(name, samples)
+
+    if not args.keep:
+        cur.execute(f'DROP SCHEMA {SCHEMA} CASCADE')
+    cur.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
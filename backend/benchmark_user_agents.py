@@ -0,0 +1,182 @@
+'''
+User-Agent classifier benchmark
+Usage: python backend/benchmark_user_agents.py [--calls 200000] [--distinct 300]
+       python backend/benchmark_user_agents.py --check
+
+Replays a stream of User-Agent strings in which a few popular UAs dominate
+(Zipf-distributed over the corpus plus --distinct synthetic variants) through:
+- the substring checks track-visit used before _shared.user_agent
+- classify_user_agent with its cache bypassed
+- classify_user_agent as handlers call it, behind the LRU cache
+and prints the mean cost per call and the cache hit ratio. --check only
+verifies the corpus labels and exits non-zero on any mismatch.
+'''
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from _shared.user_agent import classify_user_agent, user_agent_cache_stats
+
+# (User-Agent, device, browser, os, is_bot), most common first
+CORPUS: List[Tuple[str, str, str, str, bool]] = [
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Safari/537.36', 'desktop', 'Chrome', 'Windows', False),
+    ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.1 Mobile/15E148 Safari/604.1', 'mobile', 'Safari', 'iOS', False),
+    ('Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Mobile Safari/537.36', 'mobile', 'Chrome', 'Android', False),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 YaBrowser/24.1.0.0 Safari/537.36', 'desktop', 'Yandex', 'Windows', False),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Safari/537.36 Edg/120.0.2210.91', 'desktop', 'Edge', 'Windows', False),
+    ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.1 Safari/605.1.15', 'desktop', 'Safari', 'macOS', False),
+    ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Safari/537.36', 'desktop', 'Chrome', 'macOS', False),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
+     'desktop', 'Firefox', 'Windows', False),
+    ('Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)', 'desktop', 'unknown', 'unknown', True),
+    ('Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+     'desktop', 'unknown', 'unknown', True),
+    ('Mozilla/5.0 (iPad; CPU OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.1 Mobile/15E148 Safari/604.1', 'tablet', 'Safari', 'iOS', False),
+    ('Mozilla/5.0 (Linux; Android 13; SM-X700) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Safari/537.36', 'tablet', 'Chrome', 'Android', False),
+    ('Mozilla/5.0 (Linux; Android 13; SAMSUNG SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'SamsungBrowser/23.0 Chrome/115.0.0.0 Mobile Safari/537.36', 'mobile', 'Samsung Internet', 'Android', False),
+    ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'CriOS/120.0.6099.119 Mobile/15E148 Safari/604.1', 'mobile', 'Chrome', 'iOS', False),
+    ('Mozilla/5.0 (Linux; arm_64; Android 12; CPH2205) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 YaBrowser/23.11.4.80.00 SA/3 Mobile Safari/537.36', 'mobile', 'Yandex', 'Android', False),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Safari/537.36 OPR/106.0.0.0', 'desktop', 'Opera', 'Windows', False),
+    ('Mozilla/5.0 (Android 13; Mobile; rv:121.0) Gecko/121.0 Firefox/121.0', 'mobile', 'Firefox', 'Android', False),
+    ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+     'desktop', 'Chrome', 'Linux', False),
+    ('Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0',
+     'desktop', 'Firefox', 'Linux', False),
+    ('Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Safari/537.36', 'desktop', 'Chrome', 'ChromeOS', False),
+    ('Mozilla/5.0 (Linux; Android 10; HD1913) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.6099.144 Mobile Safari/537.36 EdgA/120.0.2210.115', 'mobile', 'Edge', 'Android', False),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/70.0.3538.102 Safari/537.36 Edge/18.19582', 'desktop', 'Edge', 'Windows', False),
+    ('Mozilla/5.0 (Windows NT 10.0; Trident/7.0; rv:11.0) like Gecko', 'desktop', 'IE', 'Windows', False),
+    ('Mozilla/5.0 (Linux; U; Android 4.0.3; en-us; KFTT Build/IML74K) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Silk/3.68 like Chrome/39.0.2171.93 Safari/537.36', 'tablet', 'Chrome', 'Android', False),
+    ('Mozilla/5.0 (Windows Phone 10.0; Android 6.0.1; Microsoft; Lumia 950) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/52.0.2743.116 Mobile Safari/537.36 Edge/15.15063', 'mobile', 'Edge', 'Windows', False),
+    ('Mozilla/5.0 (Linux; Android 11; moto g(30)) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Mobile Safari/537.36 (compatible; Google-Read-Aloud; +https://support.google.com/webmasters/answer/1061943)',
+     'mobile', 'Chrome', 'Android', False),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'HeadlessChrome/120.0.6099.109 Safari/537.36', 'desktop', 'Chrome', 'Windows', True),
+    ('Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)', 'desktop', 'unknown', 'unknown', True),
+    ('facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)',
+     'desktop', 'unknown', 'unknown', True),
+    ('TelegramBot (like TwitterBot)', 'desktop', 'unknown', 'unknown', True),
+    ('Mozilla/5.0 (compatible; YandexMetrika/2.0; +http://yandex.com/bots yabs01)',
+     'desktop', 'unknown', 'unknown', True),
+    ('python-requests/2.31.0', 'desktop', 'unknown', 'unknown', True),
+    ('curl/8.4.0', 'desktop', 'unknown', 'unknown', True),
+    ('Opera/9.80 (J2ME/MIDP; Opera Mini/9.80 (S60; SymbOS; Opera Mobi/23.348; U; en) Presto/2.5.25 Version/10.54',
+     'mobile', 'Opera', 'unknown', False),
+    ('', 'desktop', 'unknown', 'unknown', False),
+]
+
+
+def legacy_classify(user_agent: str) -> Tuple[str, str]:
+    '''track-visit's classification before _shared.user_agent, kept for comparison'''
+    device_type = 'desktop'
+    if 'mobile' in user_agent.lower():
+        device_type = 'mobile'
+    elif 'tablet' in user_agent.lower():
+        device_type = 'tablet'
+
+    browser = 'unknown'
+    if 'chrome' in user_agent.lower():
+        browser = 'Chrome'
+    elif 'firefox' in user_agent.lower():
+        browser = 'Firefox'
+    elif 'safari' in user_agent.lower():
+        browser = 'Safari'
+    elif 'edge' in user_agent.lower():
+        browser = 'Edge'
+    return device_type, browser
+
+
+def check_corpus() -> int:
+    '''Prints every corpus entry the classifier labels differently; returns the count'''
+    mismatches = 0
+    for ua, device, browser, os_name, is_bot in CORPUS:
+        got = classify_user_agent(ua)
+        if tuple(got) != (device, browser, os_name, is_bot):
+            mismatches += 1
+            print(f'MISMATCH {tuple(got)} != {(device, browser, os_name, is_bot)}\n  {ua}')
+    legacy_wrong = sum(1 for ua, device, browser, _, _ in CORPUS if legacy_classify(ua) != (device, browser))
+    print(f'{len(CORPUS) - mismatches}/{len(CORPUS)} corpus entries classified as expected '
+          f'(the old substring checks got {legacy_wrong} device/browser labels wrong)')
+    return mismatches
+
+
+def build_stream(calls: int, distinct: int, seed: int) -> List[str]:
+    '''UA stream where the i-th most popular UA appears with weight 1/(i+1)'''
+    rng = random.Random(seed)
+    population = [entry[0] for entry in CORPUS]
+    # Synthetic long tail: minor version bumps of the corpus, as real traffic has
+    for i in range(distinct):
+        base = population[i % len(CORPUS)]
+        population.append(f'{base} build/{i}')
+    weights = [1 / (rank + 1) for rank in range(len(population))]
+    return rng.choices(population, weights=weights, k=calls)
+
+
+def time_calls(classify: Callable[[str], object], stream: List[str]) -> float:
+    '''Mean microseconds per call'''
+    started = time.perf_counter()
+    for ua in stream:
+        classify(ua)
+    return (time.perf_counter() - started) / len(stream) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the User-Agent classifier')
+    parser.add_argument('--calls', type=int, default=200000, help='UA strings to classify per variant')
+    parser.add_argument('--distinct', type=int, default=300, help='synthetic long-tail UAs added to the corpus')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--check', action='store_true', help='only verify the corpus labels')
+    args = parser.parse_args()
+
+    if check_corpus() and args.check:
+        sys.exit(1)
+    if args.check:
+        return
+
+    stream = build_stream(args.calls, args.distinct, args.seed)
+    uncached = classify_user_agent.__wrapped__
+
+    results = [
+        ('substring checks (old)', time_calls(legacy_classify, stream)),
+        ('classifier, no cache', time_calls(uncached, stream))
+    ]
+    classify_user_agent.cache_clear()
+    results.append(('classifier + LRU', time_calls(classify_user_agent, stream)))
+    cache = user_agent_cache_stats()
+
+    print(f'\n{len(stream)} calls over {len(set(stream))} distinct UAs')
+    for name, micros in results:
+        print(f'{name:<26}{micros:>8.2f} µs/call')
+    hit_ratio = cache['hits'] / max(1, cache['hits'] + cache['misses'])
+    print(f"LRU hit ratio {hit_ratio:.1%} ({cache['size']}/{cache['max_size']} entries)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,94 +1,128 @@
 import json
 import os
+import random
 from datetime import datetime
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from typing import Dict, Any, List, Tuple
 
+from psycopg2.extras import execute_values
+
+from _shared.db_pool import db_connection
+from _shared.hll import EMPTY_SKETCH, merge, sketch_of
+from _shared.rate_limit import RateLimiter
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+from _shared.write_behind import WriteBehindBuffer
+
+# With BOT_LOG_WRITE_BEHIND=1 hits are buffered and written in batches after the response;
+# a buffered hit is lost if the instance is reclaimed, and a full queue sheds hits
+BOT_LOG_WRITE_BEHIND = os.environ.get('BOT_LOG_WRITE_BEHIND', '0') == '1'
+# Long user agents are cut so a flood of them can't bloat the in-process queue
+USER_AGENT_MAX = 1000
+# bot_logs.ip_address is VARCHAR(50); a longer value would fail the whole batch
+IP_ADDRESS_MAX = 50
+# Concurrent hits update a random bot_log_summary shard instead of all locking one row
+BOT_LOG_SUMMARY_SHARDS = max(1, int(os.environ.get('BOT_LOG_SUMMARY_SHARDS', '16')))
+
+
+def write_bot_logs(rows: List[Tuple]) -> List[int]:
+    '''
+    Writes bot hits with one multi-row parameterized INSERT and adds them
+    to one bot_log_summary shard's counters and IP sketch in the same transaction
+    Each row: (user_agent, is_blocked, ip_address, created_at)
+    Returns the bot_logs ids in row order
+    '''
+    blocked = sum(1 for row in rows if row[1])
+    ip_sketch = sketch_of(row[2] for row in rows)
+    shard = random.randrange(BOT_LOG_SUMMARY_SHARDS)
+    
+    with db_connection() as conn:
+        cur = conn.cursor()
+        ids = execute_values(cur, """
+            INSERT INTO bot_logs (user_agent, is_blocked, ip_address, created_at)
+            VALUES %s
+            RETURNING id
+        """, rows, page_size=len(rows), fetch=True)
+        
+        cur.execute("""
+            INSERT INTO bot_log_summary (shard, total_attempts, blocked_count, allowed_count, ip_sketch)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (shard) DO NOTHING
+        """, (shard, len(rows), blocked, len(rows) - blocked, ip_sketch))
+        if cur.rowcount == 0:
+            # Registers merge by max, which SQL can't do on bytea; the row lock keeps it atomic
+            cur.execute("SELECT ip_sketch FROM bot_log_summary WHERE shard = %s FOR UPDATE", (shard,))
+            stored = cur.fetchone()[0]
+            stored = bytes(stored) if stored is not None else EMPTY_SKETCH
+            merged = merge(stored, ip_sketch)
+            # A bot that keeps coming back usually leaves every register as it was;
+            # then the 4 KB sketch is neither sent nor rewritten
+            cur.execute("""
+                UPDATE bot_log_summary
+                SET total_attempts = total_attempts + %s,
+                    blocked_count = blocked_count + %s,
+                    allowed_count = allowed_count + %s,
+                    ip_sketch = COALESCE(%s, ip_sketch),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE shard = %s
+            """, (len(rows), blocked, len(rows) - blocked, merged if merged != stored else None, shard))
+        conn.commit()
+        cur.close()
+    return [row[0] for row in ids]
+
+
+# block_ms=0: when the queue is full during a flood, hits are shed instead of
+# making the request wait for the database
+bot_log_buffer = WriteBehindBuffer('bot_logs', write_bot_logs, block_ms=0) if BOT_LOG_WRITE_BEHIND else None
+
+
+# One bot can't fill the write-behind queue on its own
+limiter = RateLimiter('bot-logger', per_minute=60, burst=30)
+
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Логирование попыток доступа ботов с сохранением в БД
+    С BOT_LOG_WRITE_BEHIND=1 запись копится в памяти и уходит в БД пачкой
+    после ответа; при переполненной очереди она отбрасывается (queued: false)
     Args: event с httpMethod (POST/OPTIONS), body с user_agent, is_blocked
     Returns: JSON с результатом логирования
     '''
     method: str = event.get('httpMethod', 'POST')
-    
+
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
+        return preflight('POST, OPTIONS')
+
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
+        return error_response(405, 'Method not allowed')
+
+    limited = limiter.check(event)
+    if limited is not None:
+        return limited
+
     try:
-        body_data = json.loads(event.get('body', '{}'))
-        user_agent: str = body_data.get('user_agent', 'Unknown')
-        is_blocked: bool = body_data.get('is_blocked', False)
-        ip_address: str = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'Unknown')
-        
-        database_url = os.environ.get('DATABASE_URL')
-        if not database_url:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Content-Type': 'application/json'
-                },
-                'body': json.dumps({'error': 'DATABASE_URL not configured'})
-            }
-        
-        conn = psycopg2.connect(database_url)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        user_agent_escaped = user_agent.replace("'", "''")
-        ip_address_escaped = ip_address.replace("'", "''")
-        timestamp = datetime.utcnow().isoformat()
-        
-        cur.execute(
-            f"INSERT INTO bot_logs (user_agent, is_blocked, ip_address, created_at) VALUES ('{user_agent_escaped}', {is_blocked}, '{ip_address_escaped}', '{timestamp}') RETURNING id"
-        )
-        
-        result = cur.fetchone()
-        conn.commit()
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'isBase64Encoded': False,
-            'body': json.dumps({
-                'success': True,
-                'log_id': result['id'],
-                'is_blocked': is_blocked
-            })
-        }
-        
+        body_data = json.loads(event.get('body') or '{}')
+        user_agent = str(body_data.get('user_agent') or 'Unknown')[:USER_AGENT_MAX]
+        is_blocked = bool(body_data.get('is_blocked', False))
+        ip_address = str(event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'Unknown'))[:IP_ADDRESS_MAX]
+
+        # Time of the hit, not of the flush
+        row = (user_agent, is_blocked, ip_address, datetime.utcnow())
+
+        if bot_log_buffer is None:
+            log_id = write_bot_logs([row])[0]
+            queued = True
+        else:
+            # The id only exists once the batch is written
+            log_id = None
+            queued = bot_log_buffer.submit(row)
+
+        return json_response(200, {
+            'success': True,
+            'log_id': log_id,
+            'queued': queued,
+            'is_blocked': is_blocked
+        })
+
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        return error_response(500, str(e))
@@ -1,122 +1,93 @@
-import json
 import os
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from _shared.db_pool import db_connection
+from _shared.hll import estimate, merge_all
+from _shared.pagination import InvalidPageError, decode_cursor, page_limit, page_offset, split_page
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Получение статистики и логов ботов из БД
-    Args: event с httpMethod (GET/OPTIONS), queryStringParameters с limit, offset
+    Args: event с httpMethod (GET/OPTIONS), queryStringParameters с limit и
+          cursor (next_cursor предыдущей страницы) или offset
     Returns: JSON со статистикой и списком логов
     '''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight()
     
     if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return error_response(405, 'Method not allowed')
     
     try:
         params = event.get('queryStringParameters') or {}
-        limit = int(params.get('limit', 50))
-        offset = int(params.get('offset', 0))
+        try:
+            limit = page_limit(params.get('limit'))
+            offset = page_offset(params.get('offset'))
+            after = decode_cursor(params.get('cursor'))
+        except InvalidPageError as e:
+            return error_response(400, str(e))
         
         database_url = os.environ.get('DATABASE_URL')
         if not database_url:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Content-Type': 'application/json'
-                },
-                'body': json.dumps({'error': 'DATABASE_URL not configured'})
-            }
-        
-        conn = psycopg2.connect(database_url)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cur.execute("""
-            SELECT 
-                COUNT(*) as total_attempts,
-                COUNT(*) FILTER (WHERE is_blocked = true) as blocked_count,
-                COUNT(*) FILTER (WHERE is_blocked = false) as allowed_count,
-                COUNT(DISTINCT ip_address) as unique_ips
-            FROM bot_logs
-        """)
-        stats = cur.fetchone()
+            return error_response(500, 'DATABASE_URL not configured')
         
-        cur.execute(f"""
-            SELECT 
-                id,
-                user_agent,
-                is_blocked,
-                ip_address,
-                created_at
-            FROM bot_logs
-            ORDER BY created_at DESC
-            LIMIT {limit} OFFSET {offset}
-        """)
+        with db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            
+            # Kept up to date by bot-logger, so the header costs one read of a few shard rows
+            cur.execute("""
+                SELECT COALESCE(SUM(total_attempts), 0)::BIGINT AS total_attempts,
+                       COALESCE(SUM(blocked_count), 0)::BIGINT AS blocked_count,
+                       COALESCE(SUM(allowed_count), 0)::BIGINT AS allowed_count,
+                       array_agg(ip_sketch) FILTER (WHERE ip_sketch IS NOT NULL) AS ip_sketches
+                FROM bot_log_summary
+            """)
+            stats = cur.fetchone()
+            
+            if after is not None:
+                cur.execute("""
+                    SELECT id, user_agent, is_blocked, ip_address, created_at
+                    FROM bot_logs
+                    WHERE (created_at, id) < (%s, %s)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                """, (*after, limit + 1))
+            else:
+                cur.execute("""
+                    SELECT id, user_agent, is_blocked, ip_address, created_at
+                    FROM bot_logs
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s OFFSET %s
+                """, (limit + 1, offset))
+            
+            logs, next_cursor = split_page(cur.fetchall(), limit)
+            
+            total = stats['total_attempts']
+            
+            cur.close()
         
-        logs = cur.fetchall()
-        
-        for log in logs:
-            if log['created_at']:
-                log['created_at'] = log['created_at'].isoformat()
-        
-        cur.execute("SELECT COUNT(*) as total FROM bot_logs")
-        total = cur.fetchone()['total']
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
+        return json_response(200, {
+            'stats': {
+                'total_attempts': stats['total_attempts'],
+                'blocked_count': stats['blocked_count'],
+                'allowed_count': stats['allowed_count'],
+                'unique_ips': estimate(merge_all(stats['ip_sketches'] or []))
             },
-            'isBase64Encoded': False,
-            'body': json.dumps({
-                'stats': {
-                    'total_attempts': stats['total_attempts'],
-                    'blocked_count': stats['blocked_count'],
-                    'allowed_count': stats['allowed_count'],
-                    'unique_ips': stats['unique_ips']
-                },
-                'logs': logs,
-                'pagination': {
-                    'total': total,
-                    'limit': limit,
-                    'offset': offset,
-                    'has_more': offset + limit < total
-                }
-            })
-        }
+            'logs': logs,
+            'pagination': {
+                'total': total,
+                'limit': limit,
+                'offset': None if after is not None else offset,
+                'has_more': next_cursor is not None,
+                'next_cursor': next_cursor
+            }
+        }, event=event)
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Content-Type': 'application/json'
-            },
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        return error_response(500, str(e))
\ No newline at end of file
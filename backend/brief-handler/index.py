@@ -3,19 +3,20 @@ import os
 import io
 from typing import Dict, Any
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_LEFT
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
-import requests
 
+from _shared.db_secrets import get_secret
+from _shared.rate_limit import RateLimiter
+from _shared.responses import json_response, error_response, preflight
+from _shared.http_client import http_request
+from _shared.lead_outbox import LEAD_OUTBOX, enqueue_leads
+from _shared.tracing import span, traced
+
+TELEGRAM_API_BASE = os.environ.get('TELEGRAM_API_BASE', 'https://api.telegram.org')
+
+# Each brief renders a PDF and sends mail
+limiter = RateLimiter('brief-handler', per_minute=3, burst=2)
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Обработка заполненной анкеты - генерация PDF, отправка клиенту и уведомление в Telegram
@@ -25,23 +26,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight('POST, OPTIONS')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return error_response(405, 'Method not allowed')
+    
+    limited = limiter.check(event)
+    if limited is not None:
+        return limited
     
     headers = event.get('headers', {})
     origin = headers.get('origin', headers.get('Origin', ''))
@@ -62,29 +54,28 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             break
     
     if not is_allowed:
-        return {
-            'statusCode': 403,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Forbidden: Invalid origin'})
-        }
+        return error_response(403, 'Forbidden: Invalid origin')
     
     try:
         body_data = json.loads(event.get('body', '{}'))
         
-        telegram_token = os.environ.get('TELEGRAM_BOT_TOKEN', '')
-        telegram_chat_id = os.environ.get('TELEGRAM_CHAT_ID', '')
+        # Те же ключи, что читает диспетчер очереди
+        telegram_token = get_secret('TELEGRAM_BOT_TOKEN') or ''
+        telegram_chat_id = get_secret('TELEGRAM_CHAT_ID') or ''
         
-        pdf_buffer = generate_pdf(body_data)
+        with span('pdf.build'):
+            pdf_buffer = generate_pdf(body_data)
         
         delivery_success = False
         
         if body_data.get('deliveryMethod') == 'email' and body_data.get('clientEmail'):
             try:
-                send_email_with_pdf(
-                    to_email=body_data.get('clientEmail'),
-                    pdf_buffer=pdf_buffer,
-                    brief_data=body_data
-                )
+                with span('smtp.send'):
+                    send_email_with_pdf(
+                        to_email=body_data.get('clientEmail'),
+                        pdf_buffer=pdf_buffer,
+                        brief_data=body_data
+                    )
                 delivery_success = True
             except Exception as email_error:
                 print(f'Email sending error: {email_error}')
@@ -101,35 +92,42 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 print(f'Telegram sending error: {tg_error}')
         
         if telegram_token and telegram_chat_id:
-            try:
-                send_telegram_notification(body_data, telegram_token, telegram_chat_id)
-            except Exception as notif_error:
-                print(f'Notification error: {notif_error}')
+            queued = False
+            if LEAD_OUTBOX:
+                try:
+                    enqueue_leads('brief-handler', {
+                        'telegram': {'text': build_notification_message(body_data), 'parse_mode': 'HTML'}
+                    })
+                    queued = True
+                except Exception as outbox_error:
+                    print(f'Lead outbox error: {outbox_error}')
+            if not queued:
+                try:
+                    send_telegram_notification(body_data, telegram_token, telegram_chat_id)
+                except Exception as notif_error:
+                    print(f'Notification error: {notif_error}')
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({
-                'success': True, 
-                'message': 'Анкета успешно обработана',
-                'delivered': delivery_success
-            })
-        }
+        return json_response(200, {
+            'success': True, 
+            'message': 'Анкета успешно обработана',
+            'delivered': delivery_success
+        })
         
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         print(f'Error: {error_details}')
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e), 'details': error_details})
-        }
+        return json_response(500, {'error': str(e), 'details': error_details})
 
 
 def generate_pdf(data: Dict[str, Any]) -> io.BytesIO:
+    # reportlab is imported here so preflights and rejected requests don't pay for it
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.enums import TA_LEFT
+    
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
     
@@ -208,6 +206,11 @@ def generate_pdf(data: Dict[str, Any]) -> io.BytesIO:
 
 
 def send_email_with_pdf(to_email: str, pdf_buffer: io.BytesIO, brief_data: Dict[str, Any]) -> None:
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from email.mime.application import MIMEApplication
+    
     smtp_host = os.environ.get('SMTP_HOST')
     smtp_port = int(os.environ.get('SMTP_PORT', '587'))
     smtp_user = os.environ.get('SMTP_USER')
@@ -263,7 +266,7 @@ Email: ivanickiy@centerai.tech
 
 
 def send_telegram_pdf(telegram_username: str, pdf_buffer: io.BytesIO, bot_token: str) -> None:
-    url = f'https://api.telegram.org/bot{bot_token}/sendDocument'
+    url = f'{TELEGRAM_API_BASE}/bot{bot_token}/sendDocument'
     
     caption_text = f'''Здравствуйте!
 
@@ -282,12 +285,10 @@ def send_telegram_pdf(telegram_username: str, pdf_buffer: io.BytesIO, bot_token:
         'caption': caption_text
     }
     
-    requests.post(url, files=files, data=data)
+    http_request('POST', url, 'telegram', fields=data, files=files)
 
 
-def send_telegram_notification(brief_data: Dict[str, Any], bot_token: str, chat_id: str) -> None:
-    url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-    
+def build_notification_message(brief_data: Dict[str, Any]) -> str:
     design_types = {
         'corporate': 'Строгий корпоративный',
         'corporate-graphics': 'Корпоративный с графикой',
@@ -315,11 +316,16 @@ def send_telegram_notification(brief_data: Dict[str, Any], bot_token: str, chat_
 
 ⏰ Дата: {datetime.now().strftime("%d.%m.%Y %H:%M")}
 '''
+    return message
+
+
+def send_telegram_notification(brief_data: Dict[str, Any], bot_token: str, chat_id: str) -> None:
+    url = f'{TELEGRAM_API_BASE}/bot{bot_token}/sendMessage'
     
     data = {
         'chat_id': chat_id,
-        'text': message,
+        'text': build_notification_message(brief_data),
         'parse_mode': 'HTML'
     }
     
-    requests.post(url, json=data)
\ No newline at end of file
+    http_request('POST', url, 'telegram', json_body=data)
\ No newline at end of file
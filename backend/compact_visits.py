@@ -0,0 +1,183 @@
+'''
+site_visits maintenance: create partitions ahead, roll up and drop old months
+Usage: python backend/compact_visits.py [--retention-days 90] [--months-ahead 3]
+       python backend/compact_visits.py --dry-run
+       python backend/compact_visits.py --backfill-sketches
+
+Meant to run daily from cron. Each run:
+1. Makes sure monthly partitions exist --months-ahead months into the
+   future, so inserts never fall into site_visits_default.
+2. Rolls non-admin visits older than --retention-days into
+   site_visits_rollup (views per day, page, device and browser) and moves
+   the site_visits_compaction watermark in the same transaction. The
+   dashboard reads visit_dimension_daily, which track-visit keeps up
+   to date; the rollup keeps the page x device x browser breakdown that
+   visit_dimension_daily does not.
+3. Folds the visitor_sketches shards of past days into shard 0, so
+   get-analytics reads one 4 KB sketch per day.
+4. Drops every monthly partition that lies entirely at or before the
+   watermark, in a separate short transaction after the steps above are
+   committed: the DROP locks site_visits against inserts while it runs.
+
+--backfill-sketches also builds visitor sketches from the raw visits of
+days that have none yet (the days before migration V0017). It reads
+every session of those days, so it is meant to be run once.
+'''
+
+import argparse
+import json
+import os
+import re
+import sys
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from _shared.db_pool import db_connection
+from _shared.hll import merge_all, sketch_of
+
+VISIT_RETENTION_DAYS = int(os.environ.get('VISIT_RETENTION_DAYS', '90'))
+VISIT_PARTITIONS_AHEAD = int(os.environ.get('VISIT_PARTITIONS_AHEAD', '3'))
+
+PARTITION_RE = re.compile(r'^site_visits_(\d{4})_(\d{2})$')
+
+
+def month_after(year: int, month: int) -> date:
+    return date(year + month // 12, month % 12 + 1, 1)
+
+
+def fold_sketches(cur) -> int:
+    '''Merges the shards of every past day into shard 0; returns the number of days folded'''
+    cur.execute('''
+        SELECT stat_date, array_agg(sketch)
+        FROM visitor_sketches
+        WHERE stat_date < CURRENT_DATE
+        GROUP BY stat_date
+        HAVING COUNT(*) > 1 OR MIN(shard) > 0
+    ''')
+    days = cur.fetchall()
+    for stat_date, sketches in days:
+        cur.execute('DELETE FROM visitor_sketches WHERE stat_date = %s', (stat_date,))
+        cur.execute('''
+            INSERT INTO visitor_sketches (stat_date, shard, sketch)
+            VALUES (%s, 0, %s)
+        ''', (stat_date, merge_all(sketches)))
+    return len(days)
+
+
+def backfill_sketches(cur) -> int:
+    '''Builds sketches for days that have raw visits but no sketch; returns the number of days'''
+    cur.execute('''
+        SELECT v.visit_date, array_agg(DISTINCT COALESCE(NULLIF(v.session_id, ''), v.ip_address || '|' || v.user_agent))
+        FROM site_visits v
+        WHERE v.is_admin = FALSE
+          AND v.visit_date < CURRENT_DATE
+          AND NOT EXISTS (SELECT 1 FROM visitor_sketches s WHERE s.stat_date = v.visit_date)
+        GROUP BY v.visit_date
+    ''')
+    days = cur.fetchall()
+    for stat_date, visitors in days:
+        cur.execute('''
+            INSERT INTO visitor_sketches (stat_date, shard, sketch)
+            VALUES (%s, 0, %s)
+        ''', (stat_date, sketch_of(visitor for visitor in visitors if visitor is not None)))
+    return len(days)
+
+
+def compact(retention_days: int, months_ahead: int, dry_run: bool = False,
+            backfill: bool = False) -> Dict[str, Any]:
+    '''Runs one maintenance pass; returns what was done'''
+    report: Dict[str, Any] = {'dry_run': dry_run}
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute('SELECT ensure_site_visits_partitions(CURRENT_DATE, %s)', (months_ahead,))
+        report['partitions_created'] = cur.fetchone()[0]
+
+        cur.execute('''
+            SELECT rolled_up_through, CURRENT_DATE - %s
+            FROM site_visits_compaction
+            FOR UPDATE
+        ''', (retention_days + 1,))
+        watermark, target = cur.fetchone()
+        report['rolled_up_through'] = watermark.isoformat()
+
+        if target > watermark:
+            cur.execute('''
+                INSERT INTO site_visits_rollup (visit_date, page_path, device_type, browser, views)
+                SELECT visit_date, COALESCE(page_path, ''), COALESCE(device_type, ''), COALESCE(browser, ''), COUNT(*)
+                FROM site_visits
+                WHERE visit_date > %s AND visit_date <= %s AND is_admin = FALSE
+                GROUP BY 1, 2, 3, 4
+                ON CONFLICT (visit_date, page_path, device_type, browser)
+                DO UPDATE SET views = EXCLUDED.views
+            ''', (watermark, target))
+            report['rollup_rows'] = cur.rowcount
+            cur.execute('''
+                UPDATE site_visits_compaction
+                SET rolled_up_through = %s, compacted_at = CURRENT_TIMESTAMP
+            ''', (target,))
+            cur.execute('DELETE FROM site_visits_default WHERE visit_date <= %s', (target,))
+            watermark = target
+            report['rolled_up_through'] = watermark.isoformat()
+
+        # Before the partitions are dropped, while the raw sessions of those days still exist
+        if backfill:
+            report['sketch_days_backfilled'] = backfill_sketches(cur)
+
+        report['sketch_days_folded'] = fold_sketches(cur)
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+
+        # DROP takes ACCESS EXCLUSIVE on site_visits and blocks every insert,
+        # so it gets its own short transaction and gives up rather than queue
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+        cur.execute('''
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'site_visits'::regclass
+        ''')
+        dropped: List[str] = []
+        for (name,) in cur.fetchall():
+            match = PARTITION_RE.match(name)
+            if match and month_after(int(match.group(1)), int(match.group(2))) <= watermark + timedelta(days=1):
+                if not dry_run:
+                    # Table names come from pg_class and match PARTITION_RE, so they are safe to interpolate
+                    cur.execute(f'DROP TABLE {name}')
+                dropped.append(name)
+        report['partitions_dropped'] = sorted(dropped)
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        cur.close()
+
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Roll up and drop old site_visits partitions')
+    parser.add_argument('--retention-days', type=int, default=VISIT_RETENTION_DAYS,
+                        help='raw visits are kept at least this many days')
+    parser.add_argument('--months-ahead', type=int, default=VISIT_PARTITIONS_AHEAD,
+                        help='monthly partitions to create in advance')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change, then roll back')
+    parser.add_argument('--backfill-sketches', action='store_true',
+                        help='build visitor sketches for past days that have none')
+    args = parser.parse_args()
+
+    report = compact(args.retention_days, args.months_ahead, args.dry_run, args.backfill_sketches)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,24 +6,25 @@ Returns: HTTP response with success/error status
 import json
 import os
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from _shared.db_pool import db_connection
+from _shared.rate_limit import RateLimiter
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
+limiter = RateLimiter('consent', per_minute=30, burst=10)
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight('GET, POST, OPTIONS')
+    
+    limited = limiter.check(event)
+    if limited is not None:
+        return limited
     
     if method == 'POST':
         try:
@@ -37,15 +38,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             privacy = body_data.get('privacy', False)
             
             if not full_name:
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Full name is required'})
-                }
+                return error_response(400, 'Full name is required')
             
             request_context = event.get('requestContext', {})
             ip_address = request_context.get('identity', {}).get('sourceIp', 'unknown')
@@ -55,60 +48,43 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             if not database_url:
                 raise Exception('DATABASE_URL not configured')
             
-            conn = psycopg2.connect(database_url)
-            cur = conn.cursor()
-            
-            insert_query = '''
-                INSERT INTO user_consents 
-                (full_name, phone, email, cookies_accepted, terms_accepted, privacy_accepted, ip_address, user_agent)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            '''
-            
-            cur.execute(insert_query, (
-                full_name,
-                phone,
-                email,
-                cookies,
-                terms,
-                privacy,
-                ip_address,
-                user_agent
-            ))
-            
-            result = cur.fetchone()
-            consent_id = result[0] if result else None
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({
-                    'success': True,
-                    'id': consent_id
-                })
-            }
+            with db_connection() as conn:
+                cur = conn.cursor()
+                
+                insert_query = '''
+                    INSERT INTO user_consents 
+                    (full_name, phone, email, cookies_accepted, terms_accepted, privacy_accepted, ip_address, user_agent)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                '''
+                
+                cur.execute(insert_query, (
+                    full_name,
+                    phone,
+                    email,
+                    cookies,
+                    terms,
+                    privacy,
+                    ip_address,
+                    user_agent
+                ))
+                
+                result = cur.fetchone()
+                consent_id = result[0] if result else None
+                
+                conn.commit()
+                cur.close()
+            
+            return json_response(200, {
+                'success': True,
+                'id': consent_id
+            })
             
         except Exception as e:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({
-                    'error': 'Internal server error',
-                    'message': str(e)
-                })
-            }
+            return json_response(500, {
+                'error': 'Internal server error',
+                'message': str(e)
+            })
     
     if method == 'GET':
         try:
@@ -116,67 +92,29 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             if not database_url:
                 raise Exception('DATABASE_URL not configured')
             
-            conn = psycopg2.connect(database_url)
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            
-            cur.execute('''
-                SELECT id, full_name, phone, email, 
-                       cookies_accepted, terms_accepted, privacy_accepted,
-                       ip_address, created_at
-                FROM user_consents
-                ORDER BY created_at DESC
-                LIMIT 100
-            ''')
-            
-            consents = cur.fetchall()
-            
-            cur.close()
-            conn.close()
-            
-            result = []
-            for consent in consents:
-                result.append({
-                    'id': consent['id'],
-                    'fullName': consent['full_name'],
-                    'phone': consent['phone'],
-                    'email': consent['email'],
-                    'cookies': consent['cookies_accepted'],
-                    'terms': consent['terms_accepted'],
-                    'privacy': consent['privacy_accepted'],
-                    'ipAddress': consent['ip_address'],
-                    'createdAt': consent['created_at'].isoformat() if consent['created_at'] else None
-                })
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({'consents': result})
-            }
+            with db_connection() as conn:
+                cur = conn.cursor(cursor_factory=RealDictCursor)
+                
+                cur.execute('''
+                    SELECT id, full_name AS "fullName", phone, email,
+                           cookies_accepted AS cookies, terms_accepted AS terms,
+                           privacy_accepted AS privacy,
+                           ip_address AS "ipAddress", created_at AS "createdAt"
+                    FROM user_consents
+                    ORDER BY created_at DESC
+                    LIMIT 100
+                ''')
+                
+                consents = cur.fetchall()
+                
+                cur.close()
+            
+            return json_response(200, {'consents': consents}, event=event)
             
         except Exception as e:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({
-                    'error': 'Internal server error',
-                    'message': str(e)
-                })
-            }
+            return json_response(500, {
+                'error': 'Internal server error',
+                'message': str(e)
+            })
     
-    return {
-        'statusCode': 405,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps({'error': 'Method not allowed'})
-    }
+    return error_response(405, 'Method not allowed')
@@ -1,39 +1,35 @@
 import json
 import os
-import urllib.request
 from typing import Dict, Any
-import psycopg2
-import base64
 
-_secret_cache = {}
+from _shared.db_secrets import get_secret
+from _shared.fanout import fan_out, invocation_deadline
+from _shared.http_client import http_request
+from _shared.lead_outbox import LEAD_OUTBOX, enqueue_leads
+from _shared.rate_limit import RateLimiter
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
 
-def get_secret(key: str) -> str:
-    '''Reads secret from database with caching'''
-    if key in _secret_cache:
-        return _secret_cache[key]
-    
-    try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor()
-        key_escaped = key.replace("'", "''")
-        cur.execute(f"SELECT encrypted_value FROM secure_settings WHERE key = '{key_escaped}'")
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        if row:
-            value = base64.b64decode(row[0].encode()).decode()
-            _secret_cache[key] = value
-            return value
-    except Exception as e:
-        print(f'DB secret read error for {key}: {str(e)}')
-    
-    env_value = os.environ.get(key, '')
-    _secret_cache[key] = env_value
-    return env_value
+TELEGRAM_API_BASE = os.environ.get('TELEGRAM_API_BASE', 'https://api.telegram.org')
 
 
+def send_bitrix_lead(webhook: str, fields: Dict[str, Any], deadline: float) -> Any:
+    response = http_request('POST', f'{webhook}crm.lead.add.json', 'bitrix',
+                            json_body={'fields': fields}, deadline=deadline)
+    return response.json().get('result', False)
+
+
+def send_telegram_message(bot_token: str, payload: Dict[str, Any], deadline: float) -> bool:
+    response = http_request('POST', f'{TELEGRAM_API_BASE}/bot{bot_token}/sendMessage', 'telegram',
+                            json_body=payload, deadline=deadline)
+    return response.json().get('ok', False)
+
+
+# Each submission is a lead in Bitrix24 and Telegram
+limiter = RateLimiter('contact-form', per_minute=6, burst=3)
+
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Обработка контактной формы и отправка в Битрикс24 + Telegram
@@ -44,26 +40,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight('POST, OPTIONS')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return error_response(405, 'Method not allowed')
+    
+    limited = limiter.check(event)
+    if limited is not None:
+        return limited
     
     headers = event.get('headers', {})
     origin = headers.get('origin', headers.get('Origin', ''))
@@ -86,14 +70,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             break
     
     if not is_allowed:
-        return {
-            'statusCode': 403,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Forbidden: Invalid origin'})
-        }
+        return error_response(403, 'Forbidden: Invalid origin')
     
     body_data = json.loads(event.get('body', '{}'))
     
@@ -105,37 +82,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     # Битрикс24
     bitrix_webhook = get_secret('BITRIX24_WEBHOOK_URL') or get_secret('bitrix24_webhook_url') or ''
     
-    bitrix_success = False
-    if bitrix_webhook:
-        try:
-            bitrix_data = {
-                'TITLE': f'Обратная связь: {name}',
-                'NAME': name,
-                'PHONE': [{'VALUE': phone, 'VALUE_TYPE': 'WORK'}],
-                'COMMENTS': f'📝 Форма: {form_type}\n🕐 Время: {timestamp}',
-                'SOURCE_ID': 'WEB'
-            }
-            
-            bitrix_url = f'{bitrix_webhook}crm.lead.add.json'
-            bitrix_request = urllib.request.Request(
-                bitrix_url,
-                data=json.dumps({'fields': bitrix_data}).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
-            )
-            with urllib.request.urlopen(bitrix_request, timeout=10) as response:
-                bitrix_result = json.loads(response.read().decode('utf-8'))
-                bitrix_success = bitrix_result.get('result', False)
-        except Exception as e:
-            print(f'Bitrix24 error: {str(e)}')
+    bitrix_data = {
+        'TITLE': f'Обратная связь: {name}',
+        'NAME': name,
+        'PHONE': [{'VALUE': phone, 'VALUE_TYPE': 'WORK'}],
+        'COMMENTS': f'📝 Форма: {form_type}\n🕐 Время: {timestamp}',
+        'SOURCE_ID': 'WEB'
+    }
     
     # Telegram
-    telegram_success = False
     telegram_bot_token = get_secret('TELEGRAM_BOT_TOKEN') or ''
     telegram_chat_id = get_secret('TELEGRAM_CHAT_ID') or ''
     
+    telegram_data = None
     if telegram_bot_token and telegram_chat_id:
-        try:
-            telegram_message = f'''
+        telegram_message = f'''
 🆕 Новая заявка с сайта
 
 👤 Имя: {name}
@@ -144,36 +105,37 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 📝 Тип формы: {form_type}
 🕐 Время: {timestamp}
 '''
-            
-            telegram_url = f'https://api.telegram.org/bot{telegram_bot_token}/sendMessage'
-            telegram_data = {
-                'chat_id': telegram_chat_id,
-                'text': telegram_message
-            }
-            
-            telegram_request = urllib.request.Request(
-                telegram_url,
-                data=json.dumps(telegram_data).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            with urllib.request.urlopen(telegram_request, timeout=10) as response:
-                telegram_result = json.loads(response.read().decode('utf-8'))
-                telegram_success = telegram_result.get('ok', False)
+        telegram_data = {
+            'chat_id': telegram_chat_id,
+            'text': telegram_message
+        }
+    
+    outbox = {}
+    if bitrix_webhook:
+        outbox['bitrix24'] = {'fields': bitrix_data}
+    if telegram_data:
+        outbox['telegram'] = {'text': telegram_message}
+    
+    results = None
+    if LEAD_OUTBOX:
+        try:
+            enqueue_leads('contact-form', outbox)
+            results = {key: {'status': 'queued' if key in outbox else 'skipped'} for key in ('bitrix24', 'telegram')}
         except Exception as e:
-            print(f'Telegram error: {str(e)}')
-    
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps({
-            'success': True,
-            'bitrix24': bitrix_success,
-            'telegram': telegram_success,
-            'message': 'Заявка отправлена'
-        })
-    }
\ No newline at end of file
+            # Без очереди отправляем напрямую, чтобы заявка не потерялась
+            print(f'Lead outbox error: {e}')
+    
+    if results is None:
+        deadline = invocation_deadline(context)
+        results = fan_out({
+            'bitrix24': (lambda: send_bitrix_lead(bitrix_webhook, bitrix_data, deadline)) if bitrix_webhook else None,
+            'telegram': (lambda: send_telegram_message(telegram_bot_token, telegram_data, deadline)) if telegram_data else None
+        }, deadline)
+    
+    return json_response(200, {
+        'success': True,
+        'bitrix24': results['bitrix24']['status'] in ('ok', 'queued'),
+        'telegram': results['telegram']['status'] in ('ok', 'queued'),
+        'integrations': {key: {'status': r['status'], 'ms': r.get('ms')} for key, r in results.items()},
+        'message': 'Заявка отправлена'
+    })
\ No newline at end of file
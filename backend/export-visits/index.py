@@ -0,0 +1,221 @@
+'''
+Business: Выгрузка сырых визитов site_visits за период в CSV или NDJSON
+Args: event с httpMethod GET, queryStringParameters from, to (YYYY-MM-DD),
+      format (csv/ndjson), gzip (1 - сжать страницу), cursor (продолжение)
+Returns: страница выгрузки; курсор следующей страницы в заголовке X-Export-Cursor
+'''
+
+import base64
+import binascii
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from _shared.admin_auth import check_admin_token
+from _shared.db_pool import db_connection
+from _shared.responses import CORS_HEADERS, dumps, error_response, preflight
+from _shared.tracing import traced
+
+# Rows the server-side cursor hands over per round trip
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '5000'))
+# Uncompressed bytes per response page; the rest comes with the next cursor
+EXPORT_PAGE_BYTES = int(os.environ.get('EXPORT_PAGE_BYTES', str(4 * 1024 * 1024)))
+
+COLUMNS = ('id', 'visit_date', 'created_at', 'page_path', 'referrer', 'user_agent',
+           'session_id', 'ip_address', 'device_type', 'browser', 'is_admin')
+
+# Keyset on id: the (id, visit_date) primary key of every partition serves
+# both the resume point and the order, so a page never sorts or skips rows
+EXPORT_QUERY = f"""
+    SELECT {', '.join(COLUMNS)}
+    FROM site_visits
+    WHERE visit_date BETWEEN %(from)s AND %(to)s AND id > %(after)s
+    ORDER BY id
+"""
+
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+class ExportRequestError(ValueError):
+    '''Malformed dates, format or cursor token'''
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return {'from': state['from'], 'to': state['to'], 'format': state['format'], 'after': int(state['after'])}
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ExportRequestError('Invalid cursor')
+
+
+def parse_request(params: Dict[str, str]) -> Dict[str, Any]:
+    '''
+    Export state from a cursor token, or from from/to/format for the first
+    page. A missing from/to stays None until resolve_range fills it in
+    '''
+    if params.get('cursor'):
+        state = decode_cursor(params['cursor'])
+    else:
+        state = {
+            'from': params.get('from') or None,
+            'to': params.get('to') or None,
+            'format': params.get('format', 'csv'),
+            'after': 0
+        }
+    if state['format'] not in CONTENT_TYPES:
+        raise ExportRequestError('format must be csv or ndjson')
+    try:
+        start, end = (date.fromisoformat(state[key]) if state[key] is not None else None for key in ('from', 'to'))
+    except (TypeError, ValueError):
+        raise ExportRequestError('Dates must be YYYY-MM-DD')
+    if start and end and start > end:
+        raise ExportRequestError('from is after to')
+    return state
+
+
+def resolve_range(cur, state: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Fills in a missing from/to from the database's CURRENT_DATE, the same
+    clock that stamps visit_date, so a UTC host doesn't shift the window.
+    The resolved dates go into the cursor, and later pages keep the range
+    even if the date rolls over mid-export
+    '''
+    cur.execute("""
+        SELECT COALESCE(%(from)s::date, CURRENT_DATE - 6), COALESCE(%(to)s::date, CURRENT_DATE)
+    """, state)
+    start, end = cur.fetchone()
+    if start > end:
+        raise ExportRequestError('from is after to')
+    return {**state, 'from': start.isoformat(), 'to': end.isoformat()}
+
+
+def encode_rows(rows: List[Tuple], fmt: str) -> Iterator[Tuple[int, bytes]]:
+    '''(id, encoded line) for each row'''
+    if fmt == 'ndjson':
+        for row in rows:
+            yield row[0], (dumps(dict(zip(COLUMNS, row))) + '\n').encode('utf-8')
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        writer.writerow(row)
+        yield row[0], buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_page(state: Dict[str, Any], compress: bool) -> Tuple[bytes, int, Optional[str], Dict[str, Any]]:
+    '''
+    Reads one page through a named (server-side) cursor in EXPORT_CHUNK_ROWS
+    chunks, so memory is bounded by the page, not by the size of the export.
+    Returns (body, rows, next cursor or None when the range is exhausted,
+    state with the resolved dates)
+    '''
+    # wbits=31: every page is a complete gzip member, and concatenated members are one valid .gz
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    parts: List[bytes] = []
+    size = 0
+    rows = 0
+    last_id = state['after']
+    full = False
+
+    def emit(data: bytes) -> None:
+        nonlocal size
+        size += len(data)
+        parts.append(compressor.compress(data) if compressor else data)
+
+    if state['after'] == 0 and state['format'] == 'csv':
+        emit((','.join(COLUMNS) + '\n').encode('utf-8'))
+
+    with db_connection() as conn:
+        if state['from'] is None or state['to'] is None:
+            cur = conn.cursor()
+            try:
+                state = resolve_range(cur, state)
+            finally:
+                cur.close()
+        cur = conn.cursor(name='export_visits')
+        cur.execute(EXPORT_QUERY, state)
+        while not full:
+            chunk = cur.fetchmany(EXPORT_CHUNK_ROWS)
+            if not chunk:
+                break
+            for row_id, line in encode_rows(chunk, state['format']):
+                emit(line)
+                rows += 1
+                last_id = row_id
+                if size >= EXPORT_PAGE_BYTES:
+                    full = True
+                    break
+        cur.close()
+        conn.rollback()
+
+    if compressor:
+        parts.append(compressor.flush())
+    next_cursor = encode_cursor({**state, 'after': last_id}) if full else None
+    return b''.join(parts), rows, next_cursor, state
+
+
+@traced
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Выгрузка визитов для офлайн-анализа
+    Каждый вызов отдаёт страницу до EXPORT_PAGE_BYTES байт; пока в
+    ответе есть X-Export-Cursor, его передают параметром cursor за
+    следующей страницей. Страницы склеиваются в один файл как есть
+    Args: event - параметры запроса (from, to, format, gzip, cursor)
+    Returns: CSV/NDJSON (с gzip=1 - gzip) со строками site_visits
+    '''
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return preflight('GET, OPTIONS', 'Content-Type, X-Admin-Token')
+
+    if method != 'GET':
+        return error_response(405, 'Method not allowed')
+
+    denied = check_admin_token(event)
+    if denied is not None:
+        return denied
+
+    params = event.get('queryStringParameters', {}) or {}
+    try:
+        state = parse_request(params)
+    except ExportRequestError as e:
+        return error_response(400, str(e))
+
+    compress = params.get('gzip') == '1'
+
+    try:
+        body, rows, next_cursor, state = export_page(state, compress)
+    except ExportRequestError as e:
+        return error_response(400, str(e))
+    except Exception as e:
+        print(f'Error exporting visits: {str(e)}')
+        return error_response(500, str(e))
+
+    filename = f"visits_{state['from']}_{state['to']}.{state['format']}" + ('.gz' if compress else '')
+    headers = {
+        **CORS_HEADERS,
+        'Content-Type': 'application/gzip' if compress else CONTENT_TYPES[state['format']],
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Access-Control-Expose-Headers': 'X-Export-Cursor, X-Export-Rows',
+        'X-Export-Rows': str(rows)
+    }
+    if next_cursor:
+        headers['X-Export-Cursor'] = next_cursor
+
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': base64.b64encode(body).decode('ascii') if compress else body.decode('utf-8'),
+        'isBase64Encoded': compress
+    }
@@ -1,133 +1,164 @@
-import json
-import psycopg2
 import os
-from datetime import datetime, timedelta
-from typing import Dict, Any
+import time
+import threading
+from collections import Counter, OrderedDict
+from datetime import date
+from typing import Dict, Any, List, NamedTuple, Tuple
 
+from _shared.db_pool import db_connection
+from _shared.hll import EMPTY_SKETCH, estimate, merge, merge_all
+from _shared.responses import json_response, error_response, preflight, etag_for, not_modified
+from _shared.tracing import traced
+
+# A computed response is served as is for this many seconds, so a polling
+# dashboard costs at most one recomputation per TTL per ?days= value
+ANALYTICS_TODAY_TTL = float(os.environ.get('ANALYTICS_TODAY_TTL', '30'))
+# Distinct ?days= values whose history and response are kept
+ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', '16'))
+
+# Every query covers the days from CURRENT_DATE - days to CURRENT_DATE - until:
+# past days (until = 1) never change after the date rolls over and are cached
+# until it does, today (days = until = 0) is read on every recomputation.
+STATS_QUERY = """
+    SELECT stat_date, SUM(total_visits), SUM(unique_visitors), SUM(page_views)
+    FROM daily_stats
+    WHERE stat_date BETWEEN CURRENT_DATE - %(days)s AND CURRENT_DATE - %(until)s
+    GROUP BY stat_date
+    ORDER BY stat_date ASC
+"""
+
+# Pages, referrers, devices and browsers come from the per-day rollups that
+# track-visit maintains, so the cost depends on days x distinct values, not on visits
+ANALYTICS_QUERY = """
+    SELECT dimension, value, SUM(views)
+    FROM visit_dimension_daily
+    WHERE stat_date BETWEEN CURRENT_DATE - %(days)s AND CURRENT_DATE - %(until)s
+    GROUP BY dimension, value
+"""
+
+# One sketch per day once compact_visits.py has folded the shards, so this reads ~4 KB per day
+SKETCH_QUERY = """
+    SELECT stat_date, sketch
+    FROM visitor_sketches
+    WHERE stat_date BETWEEN CURRENT_DATE - %(days)s AND CURRENT_DATE - %(until)s
+"""
+
+
+class Period(NamedTuple):
+    visits: List[Dict[str, Any]]
+    dimensions: Dict[str, Counter]
+    sketch: bytes
+
+
+_lock = threading.Lock()
+# days -> (CURRENT_DATE it was read on, past days of the window)
+_history: 'OrderedDict[int, Tuple[date, Period]]' = OrderedDict()
+# days -> (monotonic expiry, payload, ETag)
+_responses: 'OrderedDict[int, Tuple[float, Dict[str, Any], str]]' = OrderedDict()
+
+
+def _remember(cache: OrderedDict, key: int, value: Any) -> None:
+    with _lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > ANALYTICS_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def load_period(cur, days: int, until: int) -> Period:
+    params = {'days': days, 'until': until}
+
+    cur.execute(SKETCH_QUERY, params)
+    day_sketches: Dict[date, bytes] = {}
+    for stat_date, sketch in cur.fetchall():
+        day_sketches[stat_date] = merge(day_sketches.get(stat_date, EMPTY_SKETCH), bytes(sketch))
+
+    cur.execute(STATS_QUERY, params)
+    visits = []
+    for row in cur.fetchall():
+        # Days before migration V0017 have no sketch and keep the stored value
+        sketch = day_sketches.get(row[0])
+        visits.append({
+            'date': row[0].strftime('%Y-%m-%d'),
+            'visits': row[1],
+            'unique': estimate(sketch) if sketch is not None else row[2],
+            'pageViews': row[3]
+        })
+
+    cur.execute(ANALYTICS_QUERY, params)
+    dimensions: Dict[str, Counter] = {}
+    for dimension, value, views in cur.fetchall():
+        dimensions.setdefault(dimension, Counter())[value] = views
+
+    return Period(visits, dimensions, merge_all(day_sketches.values()))
+
+
+def compute(days: int) -> Dict[str, Any]:
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT CURRENT_DATE')
+        current_date = cur.fetchone()[0]
+        today = load_period(cur, 0, 0)
+
+        with _lock:
+            cached = _history.get(days)
+        if cached is not None and cached[0] == current_date:
+            history = cached[1]
+        else:
+            history = load_period(cur, days, 1)
+            _remember(_history, days, (current_date, history))
+        cur.close()
+
+    def totals(dimension: str) -> Counter:
+        return history.dimensions.get(dimension, Counter()) + today.dimensions.get(dimension, Counter())
+
+    return {
+        'visits': history.visits + today.visits,
+        'today': {
+            'visits': today.visits[0]['visits'] if today.visits else 0,
+            'unique': estimate(today.sketch)
+        },
+        'uniqueVisitors': estimate(merge(history.sketch, today.sketch)),
+        'topPages': [{'page': value or None, 'views': views} for value, views in totals('page').most_common(10)],
+        'topReferrers': [{'source': value, 'views': views} for value, views in totals('referrer').most_common(10)],
+        'devices': [{'type': value or None, 'count': views} for value, views in totals('device').most_common()],
+        'browsers': [{'name': value or None, 'count': views} for value, views in totals('browser').most_common()]
+    }
+
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Получение статистики посещений сайта
-    Возвращает агрегированные данные по дням
+    Возвращает агрегированные данные по дням. Прошедшие дни кешируются до
+    смены даты, ответ целиком - на ANALYTICS_TODAY_TTL секунд; неизменившийся
+    ответ отдаётся как 304 по If-None-Match
     Args: event - параметры запроса (days - количество дней)
     Returns: JSON со статистикой
     '''
     method: str = event.get('httpMethod', 'GET')
-    
+
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
+        return preflight('GET, POST, OPTIONS', 'Content-Type, If-None-Match')
+
     try:
         params = event.get('queryStringParameters', {}) or {}
-        days = int(params.get('days', '14'))
-        
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT 
-                stat_date,
-                total_visits,
-                unique_visitors,
-                page_views
-            FROM daily_stats
-            WHERE stat_date >= CURRENT_DATE - INTERVAL '%s days'
-            ORDER BY stat_date ASC
-        """ % days)
-        
-        rows = cur.fetchall()
-        
-        visits = []
-        for row in rows:
-            visits.append({
-                'date': row[0].strftime('%Y-%m-%d'),
-                'visits': row[1],
-                'unique': row[2],
-                'pageViews': row[3]
-            })
-        
-        cur.execute("""
-            SELECT COUNT(*), COUNT(DISTINCT session_id)
-            FROM site_visits
-            WHERE visit_date = CURRENT_DATE AND is_admin = FALSE
-        """)
-        today_row = cur.fetchone()
-        today_visits = today_row[0] if today_row else 0
-        today_unique = today_row[1] if today_row else 0
-        
-        cur.execute("""
-            SELECT page_path, COUNT(*) as count
-            FROM site_visits
-            WHERE visit_date >= CURRENT_DATE - INTERVAL '%s days' AND is_admin = FALSE
-            GROUP BY page_path
-            ORDER BY count DESC
-            LIMIT 10
-        """ % days)
-        
-        pages_rows = cur.fetchall()
-        top_pages = [{'page': row[0], 'views': row[1]} for row in pages_rows]
-        
-        cur.execute("""
-            SELECT device_type, COUNT(*) as count
-            FROM site_visits
-            WHERE visit_date >= CURRENT_DATE - INTERVAL '%s days' AND is_admin = FALSE
-            GROUP BY device_type
-        """ % days)
-        
-        devices_rows = cur.fetchall()
-        devices = [{'type': row[0], 'count': row[1]} for row in devices_rows]
-        
-        cur.execute("""
-            SELECT browser, COUNT(*) as count
-            FROM site_visits
-            WHERE visit_date >= CURRENT_DATE - INTERVAL '%s days' AND is_admin = FALSE
-            GROUP BY browser
-            ORDER BY count DESC
-        """ % days)
-        
-        browsers_rows = cur.fetchall()
-        browsers = [{'name': row[0], 'count': row[1]} for row in browsers_rows]
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'visits': visits,
-                'today': {
-                    'visits': today_visits,
-                    'unique': today_unique
-                },
-                'topPages': top_pages,
-                'devices': devices,
-                'browsers': browsers
-            }),
-            'isBase64Encoded': False
-        }
-        
+        days = max(0, int(params.get('days', '14')))
+
+        now = time.monotonic()
+        with _lock:
+            cached = _responses.get(days)
+        if cached is None or cached[0] <= now:
+            payload = compute(days)
+            cached = (now + ANALYTICS_TODAY_TTL, payload, etag_for(payload))
+            _remember(_responses, days, cached)
+        _, payload, etag = cached
+
+        # no-cache: the browser keeps the body but asks again with If-None-Match every time
+        return not_modified(event, etag) or json_response(
+            200, payload, event=event, headers={'ETag': etag, 'Cache-Control': 'no-cache'}
+        )
+
     except Exception as e:
         print(f'Error getting analytics: {str(e)}')
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+        return error_response(500, str(e))
@@ -0,0 +1,385 @@
+'''
+Local host: serves every function from backend/ in one Python process
+Usage: python backend/local_host.py [--port 8000] [--workers 16]
+
+Each index.py listed in func2url.json, plus any function directory not
+deployed yet (so not in func2url.json), is imported once at startup and
+called with the same event/context shape the cloud runtime passes, so
+handlers run unchanged. A function is reachable both by name
+(/track-visit) and by the id from its cloud URL
+(/f4905f63-ce85-4850-9f3a-2677d35f7d16), so the frontend only needs its
+host swapped. Requests are served by a bounded thread pool and all
+handlers share one process, hence one _shared.db_pool connection pool.
+/_metrics serves the _shared.tracing histograms (populated when
+TRACE_SPANS=1) and pool gauges in Prometheus text format. With --outbox
+the process also runs the _shared.lead_outbox dispatcher on a background
+thread and turns on LEAD_OUTBOX, so the form handlers queue their leads.
+'''
+
+import argparse
+import base64
+import importlib.util
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_WORKERS = int(os.environ.get('LOCAL_HOST_WORKERS', '16'))
+DEFAULT_TIMEOUT = float(os.environ.get('LOCAL_HOST_FUNCTION_TIMEOUT', '30'))
+# pool_stats() keys that are point-in-time values; the rest are counters
+POOL_GAUGES = {'max_size', 'in_use', 'idle', 'saturation', 'peak_in_use'}
+# OutboxDispatcher.stats() keys that are point-in-time values; the rest are counters
+OUTBOX_GAUGES = {'queue_depth', 'due', 'failed_total', 'oldest_pending_seconds', 'last_delivery_lag_seconds'}
+WRITE_BEHIND_GAUGES = {'queued', 'max_queue', 'last_flush_ms'}
+# Peers whose X-Real-IP / X-Forwarded-For are believed: the reverse proxy in front of this host
+TRUSTED_PROXIES = {ip.strip() for ip in os.environ.get('LOCAL_HOST_TRUSTED_PROXIES', '127.0.0.1,::1').split(',') if ip.strip()}
+
+
+def source_ip(headers: Any, peer: str) -> str:
+    '''
+    Client address for event.requestContext.identity.sourceIp. Forwarding
+    headers are only believed from a trusted proxy, and then only the
+    parts it wrote: X-Real-IP, or the last X-Forwarded-For hop, which the
+    proxy appended. Earlier hops come from the client and can be anything.
+    '''
+    if peer not in TRUSTED_PROXIES:
+        return peer
+    real_ip = (headers.get('X-Real-IP') or '').strip()
+    if real_ip:
+        return real_ip
+    hops = [hop.strip() for hop in (headers.get('X-Forwarded-For') or '').split(',') if hop.strip()]
+    return hops[-1] if hops else peer
+
+
+class InvocationContext:
+    '''Mirror of the context object the cloud runtime hands to handlers'''
+
+    def __init__(self, function_name: str, timeout: float):
+        self.request_id = str(uuid.uuid4())
+        self.function_name = function_name
+        self.function_version = 'local'
+        self.memory_limit_in_mb = 128
+        self.token = None
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class FunctionRegistry:
+    '''Imports each function's index.py once and resolves request paths to handlers'''
+
+    def __init__(self, backend_dir: str = BACKEND_DIR, only: Optional[set] = None):
+        self.backend_dir = backend_dir
+        self.handlers: Dict[str, Callable] = {}
+        self.errors: Dict[str, str] = {}
+        self.aliases: Dict[str, str] = {}
+
+        with open(os.path.join(backend_dir, 'func2url.json')) as f:
+            func2url = json.load(f)
+
+        for name, url in func2url.items():
+            if only and name not in only:
+                continue
+            self.aliases[name] = name
+            cloud_id = urlsplit(url).path.strip('/')
+            if cloud_id:
+                self.aliases[cloud_id] = name
+            self._load(name)
+
+        for name in sorted(os.listdir(backend_dir)):
+            if name in self.aliases or (only and name not in only):
+                continue
+            if os.path.isfile(os.path.join(backend_dir, name, 'index.py')):
+                self.aliases[name] = name
+                self._load(name)
+
+    def _load(self, name: str) -> None:
+        path = os.path.join(self.backend_dir, name, 'index.py')
+        module_name = 'fn_' + name.replace('-', '_')
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+            self.handlers[name] = module.handler
+        except Exception as e:
+            sys.modules.pop(module_name, None)
+            self.errors[name] = f'{type(e).__name__}: {e}'
+            print(f'Failed to load {name}: {self.errors[name]}')
+
+    def resolve(self, path: str) -> Tuple[Optional[str], str]:
+        '''Maps /<name-or-id>/rest to (function name, /rest)'''
+        parts = path.lstrip('/').split('/', 1)
+        name = self.aliases.get(parts[0])
+        rest = '/' + parts[1] if len(parts) > 1 else '/'
+        return name, rest
+
+
+def build_event(method: str, path: str, query: str, headers: Dict[str, str],
+                body: bytes, source_ip: str) -> Dict[str, Any]:
+    '''Builds the HTTP event in the shape the cloud runtime delivers'''
+    multi_query = parse_qs(query, keep_blank_values=True)
+
+    is_base64 = False
+    try:
+        body_str = body.decode('utf-8')
+    except UnicodeDecodeError:
+        body_str = base64.b64encode(body).decode('ascii')
+        is_base64 = True
+
+    return {
+        'httpMethod': method,
+        'headers': headers,
+        'multiValueHeaders': {k: [v] for k, v in headers.items()},
+        'queryStringParameters': {k: v[-1] for k, v in multi_query.items()},
+        'multiValueQueryStringParameters': multi_query,
+        'requestContext': {
+            'identity': {
+                'sourceIp': source_ip,
+                'userAgent': headers.get('User-Agent', '')
+            },
+            'httpMethod': method,
+            'requestId': str(uuid.uuid4()),
+            'requestTimeEpoch': int(time.time() * 1000)
+        },
+        'url': path + ('?' + query if query else ''),
+        'path': path,
+        'body': body_str,
+        'isBase64Encoded': is_base64
+    }
+
+
+class FunctionRequestHandler(BaseHTTPRequestHandler):
+    '''Translates HTTP requests into handler(event, context) calls'''
+
+    server_version = 'LocalFunctionHost/1.0'
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections give their worker back after this many seconds
+    timeout = 15
+    # Headers and body go out in separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def _dispatch(self) -> None:
+        registry: FunctionRegistry = self.server.registry
+        split = urlsplit(self.path)
+
+        if split.path in ('/_health', '/_health/'):
+            self._send_json(200, self.server.health())
+            return
+        if split.path in ('/_metrics', '/metrics'):
+            self._send_response({
+                'statusCode': 200,
+                'headers': {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+                'body': self.server.metrics()
+            })
+            return
+
+        name, rest = registry.resolve(split.path)
+        if name is None:
+            self._send_json(404, {'error': 'Function not found'})
+            return
+        handler = registry.handlers.get(name)
+        if handler is None:
+            self._send_json(503, {'error': f'Function {name} failed to load', 'details': registry.errors.get(name)})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        headers = {k: v for k, v in self.headers.items()}
+        event = build_event(self.command, rest, split.query, headers, body, source_ip(self.headers, self.client_address[0]))
+        context = InvocationContext(name, self.server.function_timeout)
+
+        try:
+            response = handler(event, context)
+        except Exception as e:
+            traceback.print_exc()
+            self._send_json(500, {'error': str(e)})
+            return
+
+        self._send_response(response or {})
+
+    def _send_response(self, response: Dict[str, Any]) -> None:
+        body = response.get('body') or ''
+        if response.get('isBase64Encoded') and body:
+            payload = base64.b64decode(body)
+        elif isinstance(body, bytes):
+            payload = body
+        else:
+            payload = (body if isinstance(body, str) else json.dumps(body)).encode('utf-8')
+
+        self.send_response(int(response.get('statusCode', 200)))
+        for key, value in (response.get('headers') or {}).items():
+            if key.lower() != 'content-length':
+                self.send_header(key, str(value))
+        for key, values in (response.get('multiValueHeaders') or {}).items():
+            for value in values:
+                self.send_header(key, str(value))
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+        self._send_response({
+            'statusCode': status,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(data)
+        })
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_HEAD = _dispatch
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class PooledHTTPServer(HTTPServer):
+    '''HTTPServer that serves connections on a fixed-size thread pool'''
+
+    # The default listen backlog of 5 drops SYNs under bursts of new connections
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int], registry: FunctionRegistry,
+                 workers: int = DEFAULT_WORKERS, function_timeout: float = DEFAULT_TIMEOUT,
+                 quiet: bool = False):
+        super().__init__(address, FunctionRequestHandler)
+        self.registry = registry
+        self.workers = workers
+        self.function_timeout = function_timeout
+        self.quiet = quiet
+        self.started_at = time.time()
+        self.outbox = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fn-worker')
+
+    def process_request(self, request, client_address) -> None:
+        self._executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def health(self) -> Dict[str, Any]:
+        from _shared.db_pool import pool_stats
+        from _shared.http_client import http_pool_stats
+        from _shared.rate_limit import rate_limit_stats
+        from _shared.write_behind import write_behind_stats
+        return {
+            'status': 'ok',
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'workers': self.workers,
+            'functions': sorted(self.registry.handlers),
+            'failed': self.registry.errors,
+            'db_pool': pool_stats(),
+            'http_pool': http_pool_stats(),
+            'outbox': self._outbox_stats(),
+            'write_behind': write_behind_stats(),
+            'rate_limit': rate_limit_stats()
+        }
+
+    def _outbox_stats(self) -> Optional[Dict[str, Any]]:
+        if self.outbox is None:
+            return None
+        try:
+            return self.outbox.stats()
+        except Exception as e:
+            return {'error': f'{type(e).__name__}: {e}'}
+
+    def metrics(self) -> str:
+        '''Span histograms plus pool gauges in Prometheus text format'''
+        from _shared.db_pool import pool_stats
+        from _shared.rate_limit import rate_limit_stats
+        from _shared.tracing import render_prometheus
+        from _shared.write_behind import write_behind_stats
+
+        lines = [
+            '# HELP local_host_uptime_seconds Seconds since the local host started',
+            '# TYPE local_host_uptime_seconds gauge',
+            f'local_host_uptime_seconds {time.time() - self.started_at:.1f}'
+        ]
+        for key, value in pool_stats().items():
+            if key in POOL_GAUGES:
+                lines += [f'# TYPE db_pool_{key} gauge', f'db_pool_{key} {value}']
+            else:
+                lines += [f'# TYPE db_pool_{key}_total counter', f'db_pool_{key}_total {value}']
+        for key, value in (self._outbox_stats() or {}).items():
+            if key in OUTBOX_GAUGES:
+                lines += [f'# TYPE lead_outbox_{key} gauge', f'lead_outbox_{key} {value}']
+            elif isinstance(value, int):
+                lines += [f'# TYPE lead_outbox_{key}_total counter', f'lead_outbox_{key}_total {value}']
+        for name, stats in write_behind_stats().items():
+            for key, value in stats.items():
+                kind = 'gauge' if key in WRITE_BEHIND_GAUGES else 'counter'
+                metric = f'write_behind_{key}' + ('' if kind == 'gauge' else '_total')
+                lines += [f'# TYPE {metric} {kind}', f'{metric}{{buffer="{name}"}} {value}']
+        limits = rate_limit_stats()
+        lines += ['# TYPE rate_limit_buckets gauge', f'rate_limit_buckets {limits["buckets"]}',
+                  '# TYPE rate_limit_evicted_total counter', f'rate_limit_evicted_total {limits["evicted"]}']
+        for name, stats in limits['endpoints'].items():
+            for key, value in stats.items():
+                lines += [f'# TYPE rate_limit_{key}_total counter', f'rate_limit_{key}_total{{endpoint="{name}"}} {value}']
+        return render_prometheus(lines)
+
+    def server_close(self) -> None:
+        from _shared.write_behind import flush_all
+        super().server_close()
+        self._executor.shutdown(wait=True)
+        # Buffered rows go out after the last request has been handled
+        flush_all()
+        if self.outbox is not None:
+            self.outbox.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve every backend function from one process')
+    parser.add_argument('--host', default=os.environ.get('LOCAL_HOST_BIND', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('LOCAL_HOST_PORT', '8000')))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='size of the request thread pool')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='per-invocation deadline in seconds')
+    parser.add_argument('--only', default='', help='comma-separated function names to load')
+    parser.add_argument('--quiet', action='store_true', help='disable per-request access log')
+    parser.add_argument('--outbox', action='store_true', help='deliver queued leads from this process')
+    args = parser.parse_args()
+
+    only = {n.strip() for n in args.only.split(',') if n.strip()} or None
+    if args.outbox:
+        # Read at import, so it has to be set before the handlers load
+        os.environ['LEAD_OUTBOX'] = '1'
+    registry = FunctionRegistry(only=only)
+    server = PooledHTTPServer((args.host, args.port), registry, args.workers, args.timeout, args.quiet)
+    if args.outbox:
+        from _shared.lead_outbox import OutboxDispatcher
+        server.outbox = OutboxDispatcher().start()
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f'Serving {len(registry.handlers)} functions on http://{args.host}:{args.port} '
+          f'with {args.workers} workers')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,20 @@
-import json
-import feedparser
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 import re
 from html import unescape
 import os
-import http.client
+
+from _shared.http_client import http_request
+from _shared.responses import error_response, json_response, preflight
+from _shared.tracing import span, traced
 
 cache: Dict[str, Any] = {}
 cache_timestamp: Optional[datetime] = None
 CACHE_DURATION_HOURS = 24
+TRANSLATE_URL = 'https://translate.api.cloud.yandex.net/translate/v2/translate'
+CACHE_HEADERS = {'Cache-Control': f'public, max-age={CACHE_DURATION_HOURS * 3600}'}
 
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Получение последних новостей из RSS-фидов web.dev и SitePoint с кешированием на 24 часа
@@ -22,36 +26,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight()
     
     if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return error_response(405, 'Method not allowed')
     
     now = datetime.now()
     if cache_timestamp and (now - cache_timestamp) < timedelta(hours=CACHE_DURATION_HOURS):
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Cache-Control': f'public, max-age={CACHE_DURATION_HOURS * 3600}'
-            },
-            'isBase64Encoded': False,
-            'body': json.dumps(cache)
-        }
+        return json_response(200, cache, event=event, headers=CACHE_HEADERS)
     
     feeds = [
         {
@@ -111,38 +93,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return text
         
         try:
-            conn = http.client.HTTPSConnection('translate.api.cloud.yandex.net', timeout=3)
-            
-            payload = json.dumps({
+            payload = {
                 'folderId': folder_id,
                 'texts': [text[:500]],
                 'targetLanguageCode': 'ru'
-            })
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Api-Key {api_key}'
             }
             
-            conn.request('POST', '/translate/v2/translate', payload, headers)
-            response = conn.getresponse()
-            data = response.read().decode('utf-8')
+            response = http_request(
+                'POST', TRANSLATE_URL, 'yandex_translate',
+                json_body=payload,
+                headers={'Authorization': f'Api-Key {api_key}'}
+            )
             
-            if response.status == 200:
-                result = json.loads(data)
+            if response.status_code == 200:
+                result = response.json()
                 if result and 'translations' in result and len(result['translations']) > 0:
-                    translated = result['translations'][0]['text']
-                    conn.close()
-                    return translated
-            
-            conn.close()
+                    return result['translations'][0]['text']
         except:
             pass
         
         return text
     
+    # feedparser is only needed when the 24h cache is refreshed
+    import feedparser
+    
     for feed_info in feeds:
-        feed = feedparser.parse(feed_info['url'])
+        with span('http.feed'):
+            feed = feedparser.parse(feed_info['url'])
         
         for entry in feed.entries[:12]:
             category = 'Веб-разработка'
@@ -192,13 +169,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     cache = {'news': all_news}
     cache_timestamp = datetime.now()
     
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Cache-Control': f'public, max-age={CACHE_DURATION_HOURS * 3600}'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps(cache)
-    }
\ No newline at end of file
+    return json_response(200, cache, event=event, headers=CACHE_HEADERS)
\ No newline at end of file
@@ -0,0 +1,58 @@
+'''
+Lead outbox worker: delivers queued leads to Bitrix24 and Telegram
+Usage: python backend/outbox_worker.py [--interval 5] [--batch 50]
+       python backend/outbox_worker.py --once
+       python backend/outbox_worker.py --stats
+
+With LEAD_OUTBOX=1, contact-form, submit-order and brief-handler only
+write lead_outbox rows; this worker (or `local_host.py --outbox`) sends
+them. Several workers may run at once: rows are claimed with FOR UPDATE
+SKIP LOCKED. --once drains the due rows and exits, which suits a cron
+job; --stats prints queue depth and lag as JSON.
+'''
+
+import argparse
+import json
+import os
+import signal
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from _shared.lead_outbox import OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OutboxDispatcher
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Deliver queued leads from lead_outbox')
+    parser.add_argument('--interval', type=float, default=OUTBOX_POLL_INTERVAL, help='seconds between polls when idle')
+    parser.add_argument('--batch', type=int, default=OUTBOX_BATCH_SIZE, help='rows claimed per round')
+    parser.add_argument('--once', action='store_true', help='deliver every due row, then exit')
+    parser.add_argument('--stats', action='store_true', help='print queue depth and lag, then exit')
+    args = parser.parse_args()
+
+    dispatcher = OutboxDispatcher(batch_size=args.batch)
+
+    if args.stats:
+        print(json.dumps(dispatcher.stats(), indent=2))
+        return
+
+    if args.once:
+        while dispatcher.run_once() >= args.batch:
+            pass
+        print(json.dumps(dispatcher.stats()))
+        return
+
+    def stop(signum, frame):
+        dispatcher.stop(timeout=0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f'Delivering lead outbox every {args.interval}s in batches of {args.batch}')
+    dispatcher.run_forever(args.interval)
+
+
+if __name__ == '__main__':
+    main()
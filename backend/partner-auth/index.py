@@ -1,8 +1,12 @@
 import json
 import os
-import psycopg2
 from typing import Dict, Any
 
+from _shared.db_pool import db_connection
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Авторизация партнёра по логину и паролю
@@ -13,114 +17,46 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight('POST, OPTIONS')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
     
     body = json.loads(event.get('body', '{}'))
     login = body.get('login', '').strip()
     password = body.get('password', '').strip()
     
     if not login or not password:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Login and password are required'}),
-            'isBase64Encoded': False
-        }
+        return error_response(400, 'Login and password are required')
     
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'DATABASE_URL not configured'}),
-            'isBase64Encoded': False
-        }
-    
-    conn = psycopg2.connect(database_url)
-    cursor = conn.cursor()
+        return error_response(500, 'DATABASE_URL not configured')
     
-    try:
-        cursor.execute(
-            'SELECT id, login, name, discount_percent, is_active FROM partners WHERE login = %s AND password = %s',
-            (login, password)
-        )
-        row = cursor.fetchone()
-        conn.close()
-        
-        if not row:
-            return {
-                'statusCode': 401,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Invalid credentials'}),
-                'isBase64Encoded': False
-            }
-        
-        partner_id, partner_login, partner_name, discount_percent, is_active = row
+    with db_connection() as conn:
+        cursor = conn.cursor()
         
-        if not is_active:
-            return {
-                'statusCode': 403,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Partner account is inactive'}),
-                'isBase64Encoded': False
-            }
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
+        try:
+            cursor.execute(
+                'SELECT id, login, name, discount_percent, is_active FROM partners WHERE login = %s AND password = %s',
+                (login, password)
+            )
+            row = cursor.fetchone()
+            
+            if not row:
+                return error_response(401, 'Invalid credentials')
+            
+            partner_id, partner_login, partner_name, discount_percent, is_active = row
+            
+            if not is_active:
+                return error_response(403, 'Partner account is inactive')
+            
+            return json_response(200, {
                 'id': partner_id,
                 'login': partner_login,
                 'name': partner_name,
                 'discount_percent': discount_percent
-            }),
-            'isBase64Encoded': False
-        }
-    
-    except Exception as e:
-        conn.close()
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+            })
+        
+        except Exception as e:
+            return error_response(500, str(e))
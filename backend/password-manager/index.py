@@ -3,6 +3,10 @@ import os
 import bcrypt
 from typing import Dict, Any
 
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Управление паролями администратора
@@ -14,28 +18,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight('POST, OPTIONS')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
     
     query_params = event.get('queryStringParameters') or {}
     action = query_params.get('action', 'change')
@@ -50,74 +36,34 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         new_password = body_data.get('new_password', '')
         
         if not new_password:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'New password required'}),
-                'isBase64Encoded': False
-            }
+            return error_response(400, 'New password required')
         
         if len(new_password) < 8:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Password must be at least 8 characters'}),
-                'isBase64Encoded': False
-            }
+            return error_response(400, 'Password must be at least 8 characters')
         
         new_password_bytes = new_password.encode('utf-8')
         salt = bcrypt.gensalt(rounds=10)
         new_hash = bcrypt.hashpw(new_password_bytes, salt)
         new_hash_str = new_hash.decode('utf-8')
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'success': True,
-                'message': 'New password hash generated',
-                'new_hash': new_hash_str,
-                'instructions': 'Copy this hash and update ADMIN_PASSWORD_HASH secret'
-            }),
-            'isBase64Encoded': False
-        }
+        return json_response(200, {
+            'success': True,
+            'message': 'New password hash generated',
+            'new_hash': new_hash_str,
+            'instructions': 'Copy this hash and update ADMIN_PASSWORD_HASH secret'
+        })
     
     # ACTION: test - тестирование пароля против хеша
     if action == 'test':
         password = body_data.get('password', '')
         
         if not password:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Password required'}),
-                'isBase64Encoded': False
-            }
+            return error_response(400, 'Password required')
         
         admin_password_hash = os.environ.get('ADMIN_PASSWORD_HASH', '')
         
         if not admin_password_hash:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'ADMIN_PASSWORD_HASH not set'}),
-                'isBase64Encoded': False
-            }
+            return error_response(500, 'ADMIN_PASSWORD_HASH not set')
         
         password_bytes = password.encode('utf-8')
         hash_str = admin_password_hash.strip()
@@ -136,92 +82,44 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         except Exception as e:
             error_msg = str(e)
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'password_length': len(password),
-                'hash_prefix': original_hash[:15] if len(original_hash) >= 15 else original_hash,
-                'hash_length': len(original_hash),
-                'hash_converted': original_hash != hash_str,
-                'password_matches': is_valid,
-                'error': error_msg,
-                'hash_format_valid': original_hash.startswith('$2a$') or original_hash.startswith('$2b$')
-            }),
-            'isBase64Encoded': False
-        }
+        return json_response(200, {
+            'password_length': len(password),
+            'hash_prefix': original_hash[:15] if len(original_hash) >= 15 else original_hash,
+            'hash_length': len(original_hash),
+            'hash_converted': original_hash != hash_str,
+            'password_matches': is_valid,
+            'error': error_msg,
+            'hash_format_valid': original_hash.startswith('$2a$') or original_hash.startswith('$2b$')
+        })
     
     # ACTION: change (default) - смена пароля с проверкой текущего
     current_password = body_data.get('current_password', '')
     new_password = body_data.get('new_password', '')
     
     if not current_password or not new_password:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Current and new passwords required'}),
-            'isBase64Encoded': False
-        }
+        return error_response(400, 'Current and new passwords required')
     
     if len(new_password) < 8:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'New password must be at least 8 characters'}),
-            'isBase64Encoded': False
-        }
+        return error_response(400, 'New password must be at least 8 characters')
     
     admin_password_hash = os.environ.get('ADMIN_PASSWORD_HASH')
     
     if not admin_password_hash:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Admin password not configured'}),
-            'isBase64Encoded': False
-        }
+        return error_response(500, 'Admin password not configured')
     
     current_password_bytes = current_password.encode('utf-8')
     hash_bytes = admin_password_hash.encode('utf-8')
     
     if not bcrypt.checkpw(current_password_bytes, hash_bytes):
-        return {
-            'statusCode': 401,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Current password is incorrect'}),
-            'isBase64Encoded': False
-        }
+        return error_response(401, 'Current password is incorrect')
     
     new_password_bytes = new_password.encode('utf-8')
     salt = bcrypt.gensalt(rounds=10)
     new_hash = bcrypt.hashpw(new_password_bytes, salt)
     new_hash_str = new_hash.decode('utf-8')
     
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps({
-            'success': True,
-            'message': 'Password changed successfully',
-            'new_hash': new_hash_str
-        }),
-        'isBase64Encoded': False
-    }
+    return json_response(200, {
+        'success': True,
+        'message': 'Password changed successfully',
+        'new_hash': new_hash_str
+    })
@@ -7,21 +7,15 @@ Returns: HTTP response dict with statusCode, headers, body
 """
 
 import json
-import os
-import psycopg2
 from typing import Dict, Any, List
 
-def get_db_connection():
-    """Create database connection"""
-    dsn = os.environ.get('DATABASE_URL')
-    if not dsn:
-        raise Exception('DATABASE_URL not found in environment')
-    return psycopg2.connect(dsn)
+from _shared.db_pool import db_connection
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
 
 def get_all_projects() -> List[Dict[str, Any]]:
     """Get all active portfolio projects sorted by display_order"""
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 SELECT id, title, description, image_url, carousel_image_url, preview_image_url, website_url, display_order, is_active, created_at
@@ -31,21 +25,11 @@ def get_all_projects() -> List[Dict[str, Any]]:
             """)
             
             columns = [desc[0] for desc in cur.description]
-            projects = []
-            for row in cur.fetchall():
-                project = dict(zip(columns, row))
-                if project.get('created_at'):
-                    project['created_at'] = project['created_at'].isoformat()
-                projects.append(project)
-            
-            return projects
-    finally:
-        conn.close()
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
 
 def create_project(data: Dict[str, Any]) -> Dict[str, Any]:
     """Create new portfolio project"""
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO t_p26695620_cav_bitrix_portfolio.portfolio_projects 
@@ -66,19 +50,11 @@ def create_project(data: Dict[str, Any]) -> Dict[str, Any]:
             conn.commit()
             
             columns = [desc[0] for desc in cur.description]
-            row = cur.fetchone()
-            project = dict(zip(columns, row))
-            if project.get('created_at'):
-                project['created_at'] = project['created_at'].isoformat()
-            
-            return project
-    finally:
-        conn.close()
+            return dict(zip(columns, cur.fetchone()))
 
 def update_project(project_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """Update portfolio project"""
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 UPDATE t_p26695620_cav_bitrix_portfolio.portfolio_projects
@@ -105,18 +81,11 @@ def update_project(project_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
             if not row:
                 return None
             
-            project = dict(zip(columns, row))
-            if project.get('created_at'):
-                project['created_at'] = project['created_at'].isoformat()
-            
-            return project
-    finally:
-        conn.close()
+            return dict(zip(columns, row))
 
 def delete_project(project_id: int) -> bool:
     """Delete portfolio project"""
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 DELETE FROM t_p26695620_cav_bitrix_portfolio.portfolio_projects
@@ -125,120 +94,54 @@ def delete_project(project_id: int) -> bool:
             
             conn.commit()
             return cur.rowcount > 0
-    finally:
-        conn.close()
 
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'Access-Control-Allow-Origin': '*'
-    }
+        return preflight('GET, POST, PUT, DELETE, OPTIONS', 'Content-Type, X-User-Id, X-Auth-Token')
     
     try:
         if method == 'GET':
             projects = get_all_projects()
-            return {
-                'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps(projects),
-                'isBase64Encoded': False
-            }
+            return json_response(200, projects, event=event)
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
             project = create_project(body_data)
-            return {
-                'statusCode': 201,
-                'headers': headers,
-                'body': json.dumps(project),
-                'isBase64Encoded': False
-            }
+            return json_response(201, project)
         
         elif method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
             project_id = body_data.get('id')
             
             if not project_id:
-                return {
-                    'statusCode': 400,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Project ID is required'}),
-                    'isBase64Encoded': False
-                }
+                return error_response(400, 'Project ID is required')
             
             project = update_project(project_id, body_data)
             
             if not project:
-                return {
-                    'statusCode': 404,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Project not found'}),
-                    'isBase64Encoded': False
-                }
+                return error_response(404, 'Project not found')
             
-            return {
-                'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps(project),
-                'isBase64Encoded': False
-            }
+            return json_response(200, project)
         
         elif method == 'DELETE':
             body_data = json.loads(event.get('body', '{}'))
             project_id = body_data.get('id')
             
             if not project_id:
-                return {
-                    'statusCode': 400,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Project ID is required'}),
-                    'isBase64Encoded': False
-                }
+                return error_response(400, 'Project ID is required')
             
             deleted = delete_project(project_id)
             
             if not deleted:
-                return {
-                    'statusCode': 404,
-                    'headers': headers,
-                    'body': json.dumps({'error': 'Project not found'}),
-                    'isBase64Encoded': False
-                }
+                return error_response(404, 'Project not found')
             
-            return {
-                'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps({'success': True}),
-                'isBase64Encoded': False
-            }
+            return json_response(200, {'success': True})
         
         else:
-            return {
-                'statusCode': 405,
-                'headers': headers,
-                'body': json.dumps({'error': 'Method not allowed'}),
-                'isBase64Encoded': False
-            }
+            return error_response(405, 'Method not allowed')
     
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': headers,
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+        return error_response(500, str(e))
\ No newline at end of file
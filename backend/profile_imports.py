@@ -0,0 +1,155 @@
+'''
+Cold-start import profiler for backend functions
+Usage: python backend/profile_imports.py [--only seo-analyze,brief-handler] [--top 5]
+       python backend/profile_imports.py --budget import_budget.json
+       python backend/profile_imports.py --write-budget import_budget.json --slack 1.5
+
+Imports each function's index.py in a fresh interpreter under
+`python -X importtime`, so every measurement is a true cold start. Reports
+the total import cost, the number of modules pulled in, and the heaviest
+direct imports. With --budget, exits non-zero when a function exceeds its
+cap ({"function-name": max_ms}); --write-budget records current costs
+(times --slack) as the new caps.
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_IMPORT_SNIPPET = '''
+import sys, time
+sys.path[:0] = [{fn_dir!r}, {backend_dir!r}]
+t = time.perf_counter()
+import index
+print(round((time.perf_counter() - t) * 1000, 2))
+'''
+
+
+def list_functions() -> List[str]:
+    '''Function names as registered in func2url.json'''
+    with open(os.path.join(BACKEND_DIR, 'func2url.json')) as f:
+        return list(json.load(f))
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    '''Parses `-X importtime` lines into {module, depth, self_us, cumulative_us}'''
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue
+        name = name[1:]
+        stripped = name.lstrip(' ')
+        entries.append({
+            'module': stripped.strip(),
+            'depth': (len(name) - len(stripped)) // 2,
+            'self_us': self_us,
+            'cumulative_us': cumulative_us
+        })
+    return entries
+
+
+def profile_function(name: str, top: int = 5) -> Dict[str, Any]:
+    '''Imports one function cold and summarizes where the time went'''
+    fn_dir = os.path.join(BACKEND_DIR, name)
+    code = _IMPORT_SNIPPET.format(fn_dir=fn_dir, backend_dir=BACKEND_DIR)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=fn_dir
+    )
+
+    entries = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'import failed'
+        return {'function': name, 'error': error}
+
+    # Children are printed before their parent; everything up to the
+    # top-level `index` entry was imported on behalf of the function.
+    index_pos = max(i for i, e in enumerate(entries) if e['module'] == 'index' and e['depth'] == 0)
+    own = entries[:index_pos + 1]
+    direct = sorted(
+        (e for e in own if e['depth'] == 1),
+        key=lambda e: e['cumulative_us'], reverse=True
+    )
+
+    return {
+        'function': name,
+        'import_ms': float(proc.stdout.strip().splitlines()[-1]),
+        'modules': len(own),
+        'heaviest': [
+            {'module': e['module'], 'ms': round(e['cumulative_us'] / 1000, 2)}
+            for e in direct[:top]
+        ]
+    }
+
+
+def check_budget(results: List[Dict[str, Any]], budget: Dict[str, float]) -> List[str]:
+    '''Returns a message for every function over its cap'''
+    failures = []
+    for result in results:
+        cap = budget.get(result['function'])
+        if cap is None:
+            continue
+        if 'error' in result:
+            failures.append(f"{result['function']}: {result['error']}")
+        elif result['import_ms'] > cap:
+            failures.append(f"{result['function']}: {result['import_ms']}ms > {cap}ms budget")
+    return failures
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    width = max(len(r['function']) for r in results)
+    for r in sorted(results, key=lambda r: r.get('import_ms', -1), reverse=True):
+        if 'error' in r:
+            print(f"{r['function']:<{width}}  ERROR  {r['error']}")
+            continue
+        heaviest = ', '.join(f"{h['module']} {h['ms']}ms" for h in r['heaviest'])
+        print(f"{r['function']:<{width}}  {r['import_ms']:>8.1f}ms  {r['modules']:>4} modules  {heaviest}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Measure cold-start import cost of each function')
+    parser.add_argument('--only', default='', help='comma-separated function names')
+    parser.add_argument('--top', type=int, default=5, help='heaviest direct imports to list')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--budget', help='JSON file of per-function caps in ms; fail when exceeded')
+    parser.add_argument('--write-budget', help='write current costs as caps to this JSON file')
+    parser.add_argument('--slack', type=float, default=1.5, help='multiplier applied by --write-budget')
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.only.split(',') if n.strip()] or list_functions()
+    results = [profile_function(name, args.top) for name in names]
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print_report(results)
+
+    if args.write_budget:
+        budget = {r['function']: round(r['import_ms'] * args.slack, 1) for r in results if 'error' not in r}
+        with open(args.write_budget, 'w') as f:
+            json.dump(budget, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.budget:
+        with open(args.budget) as f:
+            failures = check_budget(results, json.load(f))
+        for failure in failures:
+            print(f'Over budget: {failure}', file=sys.stderr)
+        if failures:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
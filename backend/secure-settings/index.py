@@ -9,9 +9,14 @@ import os
 from typing import Dict, Any, Optional
 from cryptography.fernet import Fernet
 from dataclasses import dataclass
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from _shared.admin_auth import check_admin_token
+from _shared.db_pool import db_connection
+from _shared.db_secrets import invalidate_secrets
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
 @dataclass
 class SecureSetting:
     key: str
@@ -38,11 +43,6 @@ def get_cipher():
         _cipher = Fernet(_encryption_key)
     return _cipher
 
-def get_db_connection():
-    '''Создает подключение к БД'''
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
-
 def encrypt_value(value: str) -> str:
     '''Шифрует значение (временно отключено для отладки)'''
     import base64
@@ -55,20 +55,19 @@ def decrypt_value(encrypted: str) -> str:
 
 def get_all_settings(category: Optional[str] = None) -> list:
     '''Получает все настройки из БД'''
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    if category:
-        category_escaped = category.replace("'", "''")
-        cur.execute(
-            f"SELECT id, key, encrypted_value, category, description, created_at, updated_at FROM secure_settings WHERE category = '{category_escaped}' ORDER BY key"
-        )
-    else:
-        cur.execute("SELECT id, key, encrypted_value, category, description, created_at, updated_at FROM secure_settings ORDER BY category, key")
-    
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        if category:
+            category_escaped = category.replace("'", "''")
+            cur.execute(
+                f"SELECT id, key, encrypted_value, category, description, created_at, updated_at FROM secure_settings WHERE category = '{category_escaped}' ORDER BY key"
+            )
+        else:
+            cur.execute("SELECT id, key, encrypted_value, category, description, created_at, updated_at FROM secure_settings ORDER BY category, key")
+        
+        rows = cur.fetchall()
+        cur.close()
     
     result = []
     for row in rows:
@@ -86,17 +85,16 @@ def get_all_settings(category: Optional[str] = None) -> list:
 
 def get_setting(key: str) -> Optional[Dict[str, Any]]:
     '''Получает одну настройку по ключу'''
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    key_escaped = key.replace("'", "''")
-    cur.execute(
-        f"SELECT id, key, encrypted_value, category, description, created_at, updated_at FROM secure_settings WHERE key = '{key_escaped}'"
-    )
-    
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        key_escaped = key.replace("'", "''")
+        cur.execute(
+            f"SELECT id, key, encrypted_value, category, description, created_at, updated_at FROM secure_settings WHERE key = '{key_escaped}'"
+        )
+        
+        row = cur.fetchone()
+        cur.close()
     
     if not row:
         return None
@@ -113,33 +111,32 @@ def get_setting(key: str) -> Optional[Dict[str, Any]]:
 
 def create_or_update_setting(setting: SecureSetting) -> Dict[str, Any]:
     '''Создает или обновляет настройку'''
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    encrypted = encrypt_value(setting.value)
-    
-    key_escaped = setting.key.replace("'", "''")
-    encrypted_escaped = encrypted.replace("'", "''")
-    category_escaped = setting.category.replace("'", "''")
-    description_escaped = (setting.description or '').replace("'", "''")
-    
-    cur.execute(
-        f"""
-        INSERT INTO secure_settings (key, encrypted_value, category, description, updated_at)
-        VALUES ('{key_escaped}', '{encrypted_escaped}', '{category_escaped}', '{description_escaped}', CURRENT_TIMESTAMP)
-        ON CONFLICT (key) DO UPDATE SET
-            encrypted_value = EXCLUDED.encrypted_value,
-            category = EXCLUDED.category,
-            description = EXCLUDED.description,
-            updated_at = CURRENT_TIMESTAMP
-        RETURNING id, key, category, description, created_at, updated_at
-        """
-    )
-    
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        encrypted = encrypt_value(setting.value)
+        
+        key_escaped = setting.key.replace("'", "''")
+        encrypted_escaped = encrypted.replace("'", "''")
+        category_escaped = setting.category.replace("'", "''")
+        description_escaped = (setting.description or '').replace("'", "''")
+        
+        cur.execute(
+            f"""
+            INSERT INTO secure_settings (key, encrypted_value, category, description, updated_at)
+            VALUES ('{key_escaped}', '{encrypted_escaped}', '{category_escaped}', '{description_escaped}', CURRENT_TIMESTAMP)
+            ON CONFLICT (key) DO UPDATE SET
+                encrypted_value = EXCLUDED.encrypted_value,
+                category = EXCLUDED.category,
+                description = EXCLUDED.description,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING id, key, category, description, created_at, updated_at
+            """
+        )
+        
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
     
     return {
         'id': row['id'],
@@ -153,89 +150,30 @@ def create_or_update_setting(setting: SecureSetting) -> Dict[str, Any]:
 
 def delete_setting(key: str) -> bool:
     '''Удаляет настройку'''
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    key_escaped = key.replace("'", "''")
-    cur.execute(f"DELETE FROM secure_settings WHERE key = '{key_escaped}'")
-    deleted = cur.rowcount > 0
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        key_escaped = key.replace("'", "''")
+        cur.execute(f"DELETE FROM secure_settings WHERE key = '{key_escaped}'")
+        deleted = cur.rowcount > 0
+        
+        conn.commit()
+        cur.close()
     
     return deleted
 
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method = event.get('httpMethod', 'GET')
     
     # CORS OPTIONS
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Admin-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight('GET, POST, PUT, DELETE, OPTIONS', 'Content-Type, X-Admin-Token')
     
     # Проверка токена администратора через bcrypt
-    headers = event.get('headers', {})
-    admin_token = headers.get('x-admin-token') or headers.get('X-Admin-Token')
-    
-    if not admin_token:
-        return {
-            'statusCode': 401,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Unauthorized: No token provided'}),
-            'isBase64Encoded': False
-        }
-    
-    # Проверяем токен через bcrypt (как в auth-admin)
-    import bcrypt
-    admin_password_hash = os.environ.get('ADMIN_PASSWORD_HASH')
-    
-    if not admin_password_hash:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Admin password not configured'}),
-            'isBase64Encoded': False
-        }
-    
-    password_bytes = admin_token.encode('utf-8')
-    hash_str = admin_password_hash.strip()
-    
-    if hash_str.startswith('$2a$'):
-        hash_str = '$2b$' + hash_str[4:]
-    
-    hash_bytes = hash_str.encode('utf-8')
-    
-    is_valid = False
-    try:
-        is_valid = bcrypt.checkpw(password_bytes, hash_bytes)
-    except Exception:
-        pass
-    
-    if not is_valid:
-        return {
-            'statusCode': 401,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Unauthorized: Invalid token'}),
-            'isBase64Encoded': False
-        }
+    denied = check_admin_token(event)
+    if denied is not None:
+        return denied
     
     # GET - получить все настройки или одну по ключу
     if method == 'GET':
@@ -246,33 +184,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if key:
             setting = get_setting(key)
             if not setting:
-                return {
-                    'statusCode': 404,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'Setting not found'})
-                }
+                return error_response(404, 'Setting not found')
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(setting)
-            }
+            return json_response(200, setting)
         else:
             settings = get_all_settings(category)
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'settings': settings})
-            }
+            return json_response(200, {'settings': settings})
     
     # POST/PUT - создать или обновить настройку
     if method in ['POST', 'PUT']:
@@ -286,15 +203,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         )
         
         result = create_or_update_setting(setting)
+        invalidate_secrets()
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps(result)
-        }
+        return json_response(200, result)
     
     # DELETE - удалить настройку
     if method == 'DELETE':
@@ -302,41 +213,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         key = query_params.get('key')
         
         if not key:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Key parameter required'})
-            }
+            return error_response(400, 'Key parameter required')
         
         deleted = delete_setting(key)
+        invalidate_secrets()
         
         if deleted:
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'message': 'Setting deleted'})
-            }
+            return json_response(200, {'message': 'Setting deleted'})
         else:
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Setting not found'})
-            }
+            return error_response(404, 'Setting not found')
     
-    return {
-        'statusCode': 405,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps({'error': 'Method not allowed'})
-    }
\ No newline at end of file
+    return error_response(405, 'Method not allowed')
\ No newline at end of file
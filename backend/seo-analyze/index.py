@@ -1,52 +1,36 @@
 import json
 import os
-from typing import Dict, Any, List
-from pydantic import BaseModel, Field
-import openai
-import psycopg2
-import base64
+from typing import Dict, Any, List, Tuple
 
-_secret_cache = {}
+from _shared.db_secrets import get_secret
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import span, traced
 
-def get_secret(key: str) -> str:
-    '''Reads secret from database with caching'''
-    if key in _secret_cache:
-        return _secret_cache[key]
-    
-    try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor()
-        key_escaped = key.replace("'", "''")
-        cur.execute(f"SELECT encrypted_value FROM secure_settings WHERE key = '{key_escaped}'")
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        if row:
-            value = base64.b64decode(row[0].encode()).decode()
-            _secret_cache[key] = value
-            return value
-    except Exception as e:
-        print(f'DB secret read error for {key}: {str(e)}')
-    
-    env_value = os.environ.get(key, '')
-    _secret_cache[key] = env_value
-    return env_value
+_models = None
 
-class SeoAnalysisRequest(BaseModel):
-    url: str = Field(..., min_length=1)
-    content: str = Field(..., min_length=1)
-    current_title: str = ""
-    current_description: str = ""
-
-class SeoSuggestion(BaseModel):
-    title: str
-    description: str
-    h1_suggestions: List[str]
-    keywords: List[str]
-    improvements: List[str]
+def get_models() -> Tuple[type, type]:
+    '''Defines the pydantic models on first use so preflights skip importing pydantic'''
+    global _models
+    if _models is None:
+        from pydantic import BaseModel, Field
+        
+        class SeoAnalysisRequest(BaseModel):
+            url: str = Field(..., min_length=1)
+            content: str = Field(..., min_length=1)
+            current_title: str = ""
+            current_description: str = ""
+        
+        class SeoSuggestion(BaseModel):
+            title: str
+            description: str
+            h1_suggestions: List[str]
+            keywords: List[str]
+            improvements: List[str]
+        
+        _models = (SeoAnalysisRequest, SeoSuggestion)
+    return _models
 
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Analyzes page content and provides SEO optimization suggestions using AI
@@ -57,33 +41,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight('POST, OPTIONS', 'Content-Type, X-User-Id')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
     
     api_key = get_secret('OPENAI_API_KEY')
     if not api_key:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'OpenAI API key not configured'}),
-            'isBase64Encoded': False
-        }
+        return error_response(500, 'OpenAI API key not configured')
+    
+    import openai
+    SeoAnalysisRequest, SeoSuggestion = get_models()
     
     body_data = json.loads(event.get('body', '{}'))
     request_data = SeoAnalysisRequest(**body_data)
@@ -125,15 +93,16 @@ Respond ONLY with valid JSON in this exact format:
     
     try:
         
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert SEO consultant. Always respond with valid JSON only, no additional text."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
+        with span('http.openai'):
+            response = openai.ChatCompletion.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": "You are an expert SEO consultant. Always respond with valid JSON only, no additional text."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=1000
+            )
         
         ai_response = response['choices'][0]['message']['content'].strip()
         
@@ -148,31 +117,16 @@ Respond ONLY with valid JSON in this exact format:
         suggestions = json.loads(ai_response)
         validated = SeoSuggestion(**suggestions)
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'title': validated.title,
-                'description': validated.description,
-                'h1_suggestions': validated.h1_suggestions,
-                'keywords': validated.keywords,
-                'improvements': validated.improvements,
-                'request_id': context.request_id
-            }),
-            'isBase64Encoded': False
-        }
+        return json_response(200, {
+            'title': validated.title,
+            'description': validated.description,
+            'h1_suggestions': validated.h1_suggestions,
+            'keywords': validated.keywords,
+            'improvements': validated.improvements,
+            'request_id': context.request_id
+        })
     
     except json.JSONDecodeError as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Failed to parse AI response: {str(e)}'}),
-            'isBase64Encoded': False
-        }
+        return error_response(500, f'Failed to parse AI response: {str(e)}')
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+        return error_response(500, str(e))
\ No newline at end of file
@@ -3,12 +3,16 @@ import os
 from typing import Dict, Any
 from pydantic import BaseModel, Field
 
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
 class SeoApplyRequest(BaseModel):
     page_path: str = Field(..., min_length=1)
     title: str = Field(..., min_length=1, max_length=60)
     description: str = Field(..., min_length=1, max_length=160)
     keywords: list[str] = Field(default_factory=list)
 
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Generates updated index.html with applied SEO meta tags
@@ -19,24 +23,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight('POST, OPTIONS', 'Content-Type, X-User-Id')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
     
     body_data = json.loads(event.get('body', '{}'))
     request_data = SeoApplyRequest(**body_data)
@@ -112,15 +102,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 </body>
 </html>'''
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({
-            'html_content': html_template,
-            'applied_title': request_data.title,
-            'applied_description': request_data.description,
-            'applied_keywords': request_data.keywords,
-            'request_id': context.request_id
-        }),
-        'isBase64Encoded': False
-    }
+    return json_response(200, {
+        'html_content': html_template,
+        'applied_title': request_data.title,
+        'applied_description': request_data.description,
+        'applied_keywords': request_data.keywords,
+        'request_id': context.request_id
+    })
@@ -1,9 +1,13 @@
 import json
 import os
 from typing import Dict, Any, List
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from _shared.db_pool import db_connection
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Управление услугами в админке (CRUD операции)
@@ -13,29 +17,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight('GET, POST, PUT, DELETE, OPTIONS')
     
     dsn = os.environ.get('DATABASE_URL')
     if not dsn:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Database not configured'}),
-            'isBase64Encoded': False
-        }
+        return error_response(500, 'Database not configured')
     
     try:
         body_str = event.get('body', '')
@@ -44,215 +30,112 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         else:
             body_data = json.loads(body_str)
         
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        if method == 'GET':
-            category = event.get('queryStringParameters', {}).get('category') if event.get('queryStringParameters') else None
-            
-            if category:
+        with db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            
+            if method == 'GET':
+                category = event.get('queryStringParameters', {}).get('category') if event.get('queryStringParameters') else None
+                
+                if category:
+                    category_escaped = category.replace("'", "''")
+                    cur.execute(
+                        f"SELECT id, service_id, category, title, description, price, is_active, display_order, created_at, updated_at FROM services WHERE category = '{category_escaped}' ORDER BY display_order ASC"
+                    )
+                else:
+                    cur.execute("SELECT id, service_id, category, title, description, price, is_active, display_order, created_at, updated_at FROM services ORDER BY category, display_order ASC")
+                
+                services = cur.fetchall()
+                
+                cur.close()
+                
+                return json_response(200, {'services': services}, event=event)
+            
+            elif method == 'POST':
+                service_id = body_data.get('service_id')
+                category = body_data.get('category')
+                title = body_data.get('title')
+                description = body_data.get('description')
+                price = body_data.get('price', 0)
+                display_order = body_data.get('display_order', 0)
+                
+                if not all([service_id, category, title, description]):
+                    cur.close()
+                    return error_response(400, 'Missing required fields')
+                
+                service_id_escaped = service_id.replace("'", "''")
                 category_escaped = category.replace("'", "''")
+                title_escaped = title.replace("'", "''")
+                description_escaped = description.replace("'", "''")
+                
                 cur.execute(
-                    f"SELECT * FROM services WHERE category = '{category_escaped}' ORDER BY display_order ASC"
+                    f"""INSERT INTO services (service_id, category, title, description, price, display_order)
+                       VALUES ('{service_id_escaped}', '{category_escaped}', '{title_escaped}', '{description_escaped}', {price}, {display_order}) RETURNING id"""
                 )
-            else:
-                cur.execute("SELECT * FROM services ORDER BY category, display_order ASC")
-            
-            services = cur.fetchall()
-            
-            cur.close()
-            conn.close()
-            
-            services_list = []
-            for service in services:
-                services_list.append({
-                    'id': service['id'],
-                    'service_id': service['service_id'],
-                    'category': service['category'],
-                    'title': service['title'],
-                    'description': service['description'],
-                    'price': service['price'],
-                    'is_active': service['is_active'],
-                    'display_order': service['display_order'],
-                    'created_at': str(service['created_at']),
-                    'updated_at': str(service['updated_at'])
-                })
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'services': services_list}),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'POST':
-            service_id = body_data.get('service_id')
-            category = body_data.get('category')
-            title = body_data.get('title')
-            description = body_data.get('description')
-            price = body_data.get('price', 0)
-            display_order = body_data.get('display_order', 0)
-            
-            if not all([service_id, category, title, description]):
+                
+                new_id = cur.fetchone()['id']
+                conn.commit()
                 cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'Missing required fields'}),
-                    'isBase64Encoded': False
-                }
-            
-            service_id_escaped = service_id.replace("'", "''")
-            category_escaped = category.replace("'", "''")
-            title_escaped = title.replace("'", "''")
-            description_escaped = description.replace("'", "''")
-            
-            cur.execute(
-                f"""INSERT INTO services (service_id, category, title, description, price, display_order)
-                   VALUES ('{service_id_escaped}', '{category_escaped}', '{title_escaped}', '{description_escaped}', {price}, {display_order}) RETURNING id"""
-            )
-            
-            new_id = cur.fetchone()['id']
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'message': 'Service created', 'id': new_id}),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'PUT':
-            service_id = body_data.get('service_id')
-            title = body_data.get('title')
-            description = body_data.get('description')
-            price = body_data.get('price')
-            is_active = body_data.get('is_active')
-            display_order = body_data.get('display_order')
-            
-            if not service_id:
+                
+                return json_response(201, {'message': 'Service created', 'id': new_id})
+            
+            elif method == 'PUT':
+                service_id = body_data.get('service_id')
+                title = body_data.get('title')
+                description = body_data.get('description')
+                price = body_data.get('price')
+                is_active = body_data.get('is_active')
+                display_order = body_data.get('display_order')
+                
+                if not service_id:
+                    cur.close()
+                    return error_response(400, 'service_id is required')
+                
+                update_fields = []
+                
+                if title is not None:
+                    title_escaped = title.replace("'", "''")
+                    update_fields.append(f"title = '{title_escaped}'")
+                if description is not None:
+                    description_escaped = description.replace("'", "''")
+                    update_fields.append(f"description = '{description_escaped}'")
+                if price is not None:
+                    update_fields.append(f"price = {price}")
+                if is_active is not None:
+                    update_fields.append(f"is_active = {is_active}")
+                if display_order is not None:
+                    update_fields.append(f"display_order = {display_order}")
+                
+                update_fields.append('updated_at = CURRENT_TIMESTAMP')
+                service_id_escaped = service_id.replace("'", "''")
+                
+                query = f"UPDATE services SET {', '.join(update_fields)} WHERE service_id = '{service_id_escaped}'"
+                cur.execute(query)
+                
+                conn.commit()
                 cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'service_id is required'}),
-                    'isBase64Encoded': False
-                }
-            
-            update_fields = []
-            
-            if title is not None:
-                title_escaped = title.replace("'", "''")
-                update_fields.append(f"title = '{title_escaped}'")
-            if description is not None:
-                description_escaped = description.replace("'", "''")
-                update_fields.append(f"description = '{description_escaped}'")
-            if price is not None:
-                update_fields.append(f"price = {price}")
-            if is_active is not None:
-                update_fields.append(f"is_active = {is_active}")
-            if display_order is not None:
-                update_fields.append(f"display_order = {display_order}")
-            
-            update_fields.append('updated_at = CURRENT_TIMESTAMP')
-            service_id_escaped = service_id.replace("'", "''")
-            
-            query = f"UPDATE services SET {', '.join(update_fields)} WHERE service_id = '{service_id_escaped}'"
-            cur.execute(query)
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'message': 'Service updated'}),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'DELETE':
-            service_id = body_data.get('service_id')
-            
-            if not service_id:
+                
+                return json_response(200, {'message': 'Service updated'})
+            
+            elif method == 'DELETE':
+                service_id = body_data.get('service_id')
+                
+                if not service_id:
+                    cur.close()
+                    return error_response(400, 'service_id is required')
+                
+                service_id_escaped = service_id.replace("'", "''")
+                cur.execute(f"DELETE FROM services WHERE service_id = '{service_id_escaped}'")
+                
+                conn.commit()
                 cur.close()
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'service_id is required'}),
-                    'isBase64Encoded': False
-                }
-            
-            service_id_escaped = service_id.replace("'", "''")
-            cur.execute(f"DELETE FROM services WHERE service_id = '{service_id_escaped}'")
-            
-            conn.commit()
-            cur.close()
-            conn.close()
+                
+                return json_response(200, {'message': 'Service deleted'})
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'message': 'Service deleted'}),
-                'isBase64Encoded': False
-            }
+            else:
+                cur.close()
+                return error_response(405, 'Method not allowed')
         
-        else:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 405,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Method not allowed'}),
-                'isBase64Encoded': False
-            }
-    
     except json.JSONDecodeError:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Invalid JSON in request body'}),
-            'isBase64Encoded': False
-        }
+        return error_response(400, 'Invalid JSON in request body')
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+        return error_response(500, str(e))
\ No newline at end of file
@@ -1,112 +1,223 @@
 import json
-import psycopg2
 import os
+import random
+from collections import Counter
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit
 
+from psycopg2.extras import execute_values
+
+from _shared.db_pool import db_connection
+from _shared.hll import sketch_of, merge
+from _shared.rate_limit import RateLimiter
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+from _shared.user_agent import classify_user_agent
+from _shared.write_behind import WriteBehindBuffer
+
+# With VISIT_WRITE_BEHIND=1 visits are buffered and written in batches after the response
+VISIT_WRITE_BEHIND = os.environ.get('VISIT_WRITE_BEHIND', '0') == '1'
+# Concurrent upserts pick a random (stat_date, shard) row instead of all locking today's single row
+DAILY_STATS_SHARDS = max(1, int(os.environ.get('DAILY_STATS_SHARDS', '16')))
+# Upper bound on page views accepted in one beacon
+VISIT_BATCH_MAX = int(os.environ.get('VISIT_BATCH_MAX', '50'))
+# page_path is part of the visit_dimension_daily and site_visits_rollup keys, whose btree entries are capped at ~2.7 kB;
+# session_id is VARCHAR(100)
+PAGE_PATH_MAX = 500
+SESSION_ID_MAX = 100
+# ip_address is VARCHAR(50); user_agent and referrer are TEXT but client-supplied, so they are capped too
+IP_ADDRESS_MAX = 50
+USER_AGENT_MAX = 1000
+REFERRER_MAX = 2000
+# Event fields that must be strings when present
+TEXT_FIELDS = ('page', 'referrer', 'userAgent', 'sessionId')
+
+
+def clean_text(value: Any, limit: int) -> str:
+    '''Truncated string without NUL characters, which Postgres rejects in text columns'''
+    return str(value or '').replace('\x00', '')[:limit]
+
+
+def referrer_host(referrer: str) -> str:
+    '''Referrer domain without www., '' for direct visits'''
+    try:
+        host = urlsplit(str(referrer or '')).hostname or ''
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def visitor_key(row: Tuple) -> str:
+    '''session_id, or IP and user agent for beacons sent without one'''
+    return row[3] or f'{row[4]}|{row[1]}'
+
+
+def visit_row(visit: Any, ip_address: str, header_user_agent: str) -> Optional[Tuple]:
+    '''
+    site_visits row for one event, None if the event is not an object or has
+    a field of the wrong type. Values are coerced and capped here so that no
+    row can fail a multi-row INSERT or a write-behind batch shared with others
+    '''
+    if not isinstance(visit, dict):
+        return None
+    if any(visit.get(field) is not None and not isinstance(visit[field], str) for field in TEXT_FIELDS):
+        return None
+    user_agent = clean_text(visit.get('userAgent') or header_user_agent, USER_AGENT_MAX)
+    ua = classify_user_agent(user_agent)
+    return (
+        clean_text(visit.get('page') or '/', PAGE_PATH_MAX),
+        user_agent,
+        clean_text(visit.get('referrer'), REFERRER_MAX),
+        clean_text(visit.get('sessionId'), SESSION_ID_MAX),
+        ip_address,
+        ua.device,
+        ua.browser,
+        bool(visit.get('isAdmin', False))
+    )
+
+
+def write_visits(rows: List[Tuple]) -> None:
+    '''
+    Writes visits with one multi-row INSERT, one daily_stats upsert, one
+    visit_dimension_daily upsert and a merge into today's visitor sketch
+    Each row: (page_path, user_agent, referrer, session_id, ip_address, device_type, browser, is_admin)
+    '''
+    counted = [row for row in rows if not row[7]]
+    dimensions = Counter()
+    for row in counted:
+        dimensions['page', row[0] or ''] += 1
+        dimensions['device', row[5] or ''] += 1
+        dimensions['browser', row[6] or ''] += 1
+        dimensions['referrer', referrer_host(row[2])] += 1
+    shard = random.randrange(DAILY_STATS_SHARDS)
+    
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        execute_values(cur, """
+            INSERT INTO site_visits 
+            (visit_date, page_path, user_agent, referrer, session_id, ip_address, device_type, browser, is_admin)
+            VALUES %s
+        """, rows, template='(CURRENT_DATE, %s, %s, %s, %s, %s, %s, %s, %s)', page_size=len(rows))
+        
+        if counted:
+            cur.execute("""
+                INSERT INTO daily_stats (stat_date, shard, total_visits, page_views)
+                VALUES (CURRENT_DATE, %s, %s, %s)
+                ON CONFLICT (stat_date, shard) DO UPDATE
+                SET total_visits = daily_stats.total_visits + EXCLUDED.total_visits,
+                    page_views = daily_stats.page_views + EXCLUDED.page_views,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (shard, len(counted), len(counted)))
+            
+            # Sorted, so concurrent batches lock the same rows in the same order
+            execute_values(cur, """
+                INSERT INTO visit_dimension_daily (stat_date, shard, dimension, value, views)
+                VALUES %s
+                ON CONFLICT (stat_date, dimension, value, shard) DO UPDATE
+                SET views = visit_dimension_daily.views + EXCLUDED.views
+            """, [(dimension, value, views) for (dimension, value), views in sorted(dimensions.items())],
+                template=f'(CURRENT_DATE, {shard}, %s, %s, %s)', page_size=len(dimensions))
+            
+            sketch = sketch_of(visitor_key(row) for row in counted)
+            cur.execute("""
+                INSERT INTO visitor_sketches (stat_date, shard, sketch)
+                VALUES (CURRENT_DATE, %s, %s)
+                ON CONFLICT (stat_date, shard) DO NOTHING
+            """, (shard, sketch))
+            if cur.rowcount == 0:
+                # Registers merge by max, which SQL can't do on bytea; the row lock keeps it atomic
+                cur.execute("""
+                    SELECT sketch FROM visitor_sketches
+                    WHERE stat_date = CURRENT_DATE AND shard = %s
+                    FOR UPDATE
+                """, (shard,))
+                stored = bytes(cur.fetchone()[0])
+                merged = merge(stored, sketch)
+                # Returning sessions usually leave every register as it was
+                if merged != stored:
+                    cur.execute("""
+                        UPDATE visitor_sketches
+                        SET sketch = %s, updated_at = CURRENT_TIMESTAMP
+                        WHERE stat_date = CURRENT_DATE AND shard = %s
+                    """, (merged, shard))
+        
+        conn.commit()
+        cur.close()
+
+
+visit_buffer = WriteBehindBuffer('site_visits', write_visits) if VISIT_WRITE_BEHIND else None
+
+
+# Beacons arrive every 10 s per tab; the burst covers a few tabs and reloads
+limiter = RateLimiter('track-visit', per_minute=120, burst=60)
+
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Отслеживание посещений сайта
     Сохраняет информацию о визите в базу данных
-    Args: event - данные о визите (page, referrer, userAgent и т.д.)
+    Args: event - данные о визите (page, referrer, userAgent и т.д.) или массив
+          таких визитов, накопленных на странице и отправленных одним запросом
     Returns: JSON с результатом записи
     '''
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight('POST, OPTIONS')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
+    
+    limited = limiter.check(event)
+    if limited is not None:
+        return limited
     
     try:
-        body_data = json.loads(event.get('body', '{}'))
+        try:
+            body_data = json.loads(event.get('body') or '{}')
+        except ValueError:
+            return error_response(400, 'Invalid JSON')
         
-        page_path = body_data.get('page', '/')
-        referrer = body_data.get('referrer', '')
-        user_agent = body_data.get('userAgent', '')
-        session_id = body_data.get('sessionId', '')
-        is_admin = body_data.get('isAdmin', False)
+        # Одиночный визит {page, ...}, массив визитов или {"events": [...]} от sendBeacon
+        if isinstance(body_data, list):
+            events = body_data
+        elif not isinstance(body_data, dict):
+            return error_response(400, 'Body must be a visit, a list of visits or {"events": [...]}')
+        elif isinstance(body_data.get('events'), list):
+            events = body_data['events']
+        else:
+            events = [body_data]
         
-        headers = event.get('headers', {})
-        ip_address = headers.get('x-forwarded-for', headers.get('X-Forwarded-For', '')).split(',')[0].strip()
-        
-        device_type = 'desktop'
-        if 'mobile' in user_agent.lower():
-            device_type = 'mobile'
-        elif 'tablet' in user_agent.lower():
-            device_type = 'tablet'
-        
-        browser = 'unknown'
-        if 'chrome' in user_agent.lower():
-            browser = 'Chrome'
-        elif 'firefox' in user_agent.lower():
-            browser = 'Firefox'
-        elif 'safari' in user_agent.lower():
-            browser = 'Safari'
-        elif 'edge' in user_agent.lower():
-            browser = 'Edge'
+        if len(events) > VISIT_BATCH_MAX:
+            return error_response(413, f'Too many events, max {VISIT_BATCH_MAX}')
         
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor()
-        
-        cur.execute("""
-            INSERT INTO site_visits 
-            (visit_date, page_path, user_agent, referrer, session_id, ip_address, device_type, browser, is_admin)
-            VALUES (CURRENT_DATE, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (page_path, user_agent, referrer, session_id, ip_address, device_type, browser, is_admin))
+        headers = event.get('headers', {})
+        ip_address = clean_text(headers.get('x-forwarded-for', headers.get('X-Forwarded-For', '')).split(',')[0].strip(), IP_ADDRESS_MAX)
+        header_user_agent = headers.get('user-agent', headers.get('User-Agent', ''))
         
-        if not is_admin:
-            cur.execute("""
-                INSERT INTO daily_stats (stat_date, total_visits, page_views)
-                VALUES (CURRENT_DATE, 1, 1)
-                ON CONFLICT (stat_date) DO UPDATE
-                SET total_visits = daily_stats.total_visits + 1,
-                    page_views = daily_stats.page_views + 1,
-                    updated_at = CURRENT_TIMESTAMP
-            """)
+        # Дату визита всегда ставит сервер (CURRENT_DATE), время клиента не используется.
+        # События не того формата пропускаются, остальные записываются
+        rows = [row for row in (visit_row(visit, ip_address, header_user_agent) for visit in events) if row is not None]
         
-        conn.commit()
-        cur.close()
-        conn.close()
+        if rows:
+            if visit_buffer is None:
+                write_visits(rows)
+            else:
+                # A full buffer pushes back on the caller: the rest are written synchronously
+                rejected = [row for row in rows if not visit_buffer.submit(row)]
+                if rejected:
+                    write_visits(rejected)
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'success': True, 'message': 'Visit tracked'}),
-            'isBase64Encoded': False
-        }
+        return json_response(200, {
+            'success': True,
+            'message': 'Visit tracked',
+            'tracked': len(rows),
+            'skipped': len(events) - len(rows)
+        })
         
     except Exception as e:
         print(f'Error tracking visit: {str(e)}')
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+        return error_response(500, str(e))
\ No newline at end of file
@@ -1,11 +1,13 @@
 import json
 import os
-import boto3
-from botocore.config import Config
 import base64
 import uuid
 from typing import Dict, Any
 
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import span, traced
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Загрузка изображений в S3 или Data URI
@@ -17,28 +19,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight('POST, OPTIONS')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
     
     try:
         body = json.loads(event.get('body', '{}'))
@@ -48,15 +32,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         folder = body.get('folder', 'images')  # папка в S3 (portfolio, logos, etc)
         
         if not image_base64:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'Image data is required'}),
-                'isBase64Encoded': False
-            }
+            return error_response(400, 'Image data is required')
         
         # Определяем тип файла
         file_ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'png'
@@ -73,18 +49,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         # Data URI режим (для логотипов и встроенных изображений)
         if storage_type == 'data_uri':
             data_uri = f'data:{content_type};base64,{image_base64}'
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'url': data_uri,
-                    'type': 'data_uri'
-                }),
-                'isBase64Encoded': False
-            }
+            return json_response(200, {
+                'url': data_uri,
+                'type': 'data_uri'
+            })
         
         # S3 режим (для портфолио и больших файлов)
         image_data = base64.b64decode(image_base64)
@@ -101,18 +69,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             if not access_key: missing.append('AWS_ACCESS_KEY_ID')
             if not secret_key: missing.append('AWS_SECRET_ACCESS_KEY')
             
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'S3 credentials not configured',
-                    'missing': missing
-                }),
-                'isBase64Encoded': False
-            }
+            return json_response(500, {
+                'error': 'S3 credentials not configured',
+                'missing': missing
+            })
+        
+        # boto3 is only needed for S3 uploads, not for preflights or data URIs
+        import boto3
+        from botocore.config import Config
         
         s3_client = boto3.client(
             's3',
@@ -128,37 +92,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         unique_filename = f"{folder}/{uuid.uuid4()}.{file_ext}"
         
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=unique_filename,
-            Body=image_data,
-            ContentType=content_type,
-            ACL='public-read'
-        )
+        with span('s3.put_object'):
+            s3_client.put_object(
+                Bucket=bucket_name,
+                Key=unique_filename,
+                Body=image_data,
+                ContentType=content_type,
+                ACL='public-read'
+            )
         
         image_url = f"{s3_endpoint}/{bucket_name}/{unique_filename}"
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'url': image_url,
-                'filename': unique_filename,
-                'type': 's3'
-            }),
-            'isBase64Encoded': False
-        }
+        return json_response(200, {
+            'url': image_url,
+            'filename': unique_filename,
+            'type': 's3'
+        })
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        return error_response(500, str(e))
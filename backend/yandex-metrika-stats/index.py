@@ -2,8 +2,14 @@ import json
 import os
 from datetime import datetime, timedelta
 from typing import Dict, Any
-import requests
 
+from _shared.http_client import http_request
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
+METRIKA_API_BASE = os.environ.get('YANDEX_METRIKA_API_BASE', 'https://api-metrika.yandex.net')
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Получение статистики посещений из Яндекс.Метрики
@@ -13,28 +19,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight('POST, OPTIONS')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
     
     try:
         body_str = event.get('body', '')
@@ -46,26 +34,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         oauth_token = body_data.get('token')
         
         if not counter_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'counter_id is required'}),
-                'isBase64Encoded': False
-            }
+            return error_response(400, 'counter_id is required')
         
         if not oauth_token:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'token is required'}),
-                'isBase64Encoded': False
-            }
+            return error_response(400, 'token is required')
         
         end_date = datetime.now()
         start_date = end_date - timedelta(days=13)
@@ -73,7 +45,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         date1 = start_date.strftime('%Y-%m-%d')
         date2 = end_date.strftime('%Y-%m-%d')
         
-        url = f'https://api-metrika.yandex.net/stat/v1/data'
+        url = f'{METRIKA_API_BASE}/stat/v1/data'
         
         params = {
             'id': counter_id,
@@ -89,21 +61,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'Content-Type': 'application/json'
         }
         
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = http_request('GET', url, 'yandex_metrika', params=params, headers=headers)
         
         if response.status_code != 200:
-            return {
-                'statusCode': response.status_code,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Failed to fetch data from Yandex Metrika',
-                    'details': response.text
-                }),
-                'isBase64Encoded': False
-            }
+            return json_response(response.status_code, {
+                'error': 'Failed to fetch data from Yandex Metrika',
+                'details': response.text
+            })
         
         data = response.json()
         
@@ -121,33 +85,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'visits': visit_count
                 })
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'visits': visits}),
-            'isBase64Encoded': False
-        }
+        return json_response(200, {'visits': visits})
         
     except json.JSONDecodeError as e:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Invalid JSON in request body'}),
-            'isBase64Encoded': False
-        }
+        return error_response(400, 'Invalid JSON in request body')
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+        return error_response(500, str(e))
\ No newline at end of file
@@ -1,8 +1,14 @@
 import json
 import os
 from typing import Dict, Any, List
-import requests
 
+from _shared.http_client import http_request
+from _shared.responses import json_response, error_response, preflight
+from _shared.tracing import traced
+
+WEBMASTER_API_BASE = os.environ.get('YANDEX_WEBMASTER_API_BASE', 'https://api.webmaster.yandex.net')
+
+@traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Получение замечаний от Яндекс.Вебмастера
@@ -12,42 +18,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight()
     
     if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return error_response(405, 'Method not allowed')
     
     try:
         oauth_token = os.environ.get('YANDEX_WEBMASTER_TOKEN')
         
         if not oauth_token:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': 'YANDEX_WEBMASTER_TOKEN not configured'}),
-                'isBase64Encoded': False
-            }
+            return error_response(500, 'YANDEX_WEBMASTER_TOKEN not configured')
         
         headers = {
             'Authorization': f'OAuth {oauth_token}',
@@ -58,40 +38,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         user_info: Dict[str, Any] = {}
         
         # Получаем список всех сайтов пользователя
-        hosts_url = 'https://api.webmaster.yandex.net/v4/user/hosts'
+        hosts_url = f'{WEBMASTER_API_BASE}/v4/user/hosts'
         
         try:
-            hosts_response = requests.get(hosts_url, headers=headers, timeout=10)
+            hosts_response = http_request('GET', hosts_url, 'yandex_webmaster', headers=headers)
             
             if hosts_response.status_code != 200:
-                return {
-                    'statusCode': hosts_response.status_code,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'error': 'Failed to connect to Yandex.Webmaster',
-                        'details': hosts_response.text
-                    }),
-                    'isBase64Encoded': False
-                }
+                return json_response(hosts_response.status_code, {
+                    'error': 'Failed to connect to Yandex.Webmaster',
+                    'details': hosts_response.text
+                })
             
             hosts_data = hosts_response.json()
             
             if 'hosts' not in hosts_data or len(hosts_data['hosts']) == 0:
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'issues': [],
-                        'message': 'Нет добавленных сайтов в Яндекс.Вебмастере'
-                    }),
-                    'isBase64Encoded': False
-                }
+                return json_response(200, {
+                    'issues': [],
+                    'message': 'Нет добавленных сайтов в Яндекс.Вебмастере'
+                })
             
             # Берем первый сайт
             first_host = hosts_data['hosts'][0]
@@ -106,21 +70,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
             
         except Exception as e:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'error': f'Failed to get hosts list: {str(e)}'}),
-                'isBase64Encoded': False
-            }
+            return error_response(500, f'Failed to get hosts list: {str(e)}')
         
         # Теперь получаем проблемы для найденного сайта
-        indexing_url = f'https://api.webmaster.yandex.net/v4/user/{user_id}/hosts/{host_id}/summary'
+        indexing_url = f'{WEBMASTER_API_BASE}/v4/user/{user_id}/hosts/{host_id}/summary'
         
         try:
-            indexing_response = requests.get(indexing_url, headers=headers, timeout=10)
+            indexing_response = http_request('GET', indexing_url, 'yandex_webmaster', headers=headers)
             
             if indexing_response.status_code == 200:
                 indexing_data = indexing_response.json()
@@ -136,10 +92,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         except Exception as e:
             print(f"Failed to fetch indexing data: {e}")
         
-        diagnostics_url = f'https://api.webmaster.yandex.net/v4/user/{user_id}/hosts/{host_id}/diagnostics'
+        diagnostics_url = f'{WEBMASTER_API_BASE}/v4/user/{user_id}/hosts/{host_id}/diagnostics'
         
         try:
-            diagnostics_response = requests.get(diagnostics_url, headers=headers, timeout=10)
+            diagnostics_response = http_request('GET', diagnostics_url, 'yandex_webmaster', headers=headers)
             
             if diagnostics_response.status_code == 200:
                 diagnostics_data = diagnostics_response.json()
@@ -158,10 +114,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         except Exception as e:
             print(f"Failed to fetch diagnostics data: {e}")
         
-        sqi_url = f'https://api.webmaster.yandex.net/v4/user/{user_id}/hosts/{host_id}/sqi-history'
+        sqi_url = f'{WEBMASTER_API_BASE}/v4/user/{user_id}/hosts/{host_id}/sqi-history'
         
         try:
-            sqi_response = requests.get(sqi_url, headers=headers, timeout=10)
+            sqi_response = http_request('GET', sqi_url, 'yandex_webmaster', headers=headers)
             
             if sqi_response.status_code == 200:
                 sqi_data = sqi_response.json()
@@ -179,39 +135,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         except Exception as e:
             print(f"Failed to fetch SQI data: {e}")
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'issues': issues,
-                'user_info': user_info
-            }),
-            'isBase64Encoded': False
-        }
+        return json_response(200, {
+            'issues': issues,
+            'user_info': user_info
+        })
         
     except json.JSONDecodeError as e:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Invalid JSON in request body'}),
-            'isBase64Encoded': False
-        }
+        return error_response(400, 'Invalid JSON in request body')
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        return error_response(500, str(e))
 
 def get_problem_title(problem_type: str) -> str:
     '''Преобразует тип проблемы в человекочитаемый заголовок'''
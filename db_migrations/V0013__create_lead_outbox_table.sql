@@ -0,0 +1,24 @@
+-- Очередь исходящих заявок: обработчики форм пишут сюда одной вставкой,
+-- а доставку в Битрикс24 и Telegram выполняет фоновый диспетчер
+CREATE TABLE IF NOT EXISTS lead_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    source VARCHAR(50) NOT NULL,
+    channel VARCHAR(20) NOT NULL,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    delivered_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Диспетчер выбирает только ожидающие записи, у которых подошло время попытки
+CREATE INDEX IF NOT EXISTS idx_lead_outbox_due ON lead_outbox(next_attempt_at) WHERE status = 'pending';
+
+COMMENT ON TABLE lead_outbox IS 'Заявки, ожидающие доставки во внешние системы';
+COMMENT ON COLUMN lead_outbox.source IS 'Функция-источник: contact-form, submit-order, brief-handler';
+COMMENT ON COLUMN lead_outbox.channel IS 'Канал доставки: bitrix24 или telegram';
+COMMENT ON COLUMN lead_outbox.payload IS 'Данные для отправки; токен Telegram и вебхук Битрикс24 из secure_settings подставляются при доставке';
+COMMENT ON COLUMN lead_outbox.status IS 'pending - ждёт доставки, delivered - доставлена, failed - попытки исчерпаны';
+COMMENT ON COLUMN lead_outbox.next_attempt_at IS 'Время следующей попытки; при захвате диспетчером сдвигается на время аренды';
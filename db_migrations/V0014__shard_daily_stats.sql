@@ -0,0 +1,36 @@
+-- Счётчики посещений по дням, разбитые на шарды: каждый визит увеличивает
+-- случайную строку (stat_date, shard), поэтому параллельные запросы не
+-- ждут блокировки одной строки за сегодня. Итог за день - сумма шардов.
+CREATE TABLE IF NOT EXISTS daily_stats (
+    stat_date DATE NOT NULL,
+    total_visits INTEGER NOT NULL DEFAULT 0,
+    unique_visitors INTEGER NOT NULL DEFAULT 0,
+    page_views INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE daily_stats ADD COLUMN IF NOT EXISTS shard SMALLINT NOT NULL DEFAULT 0;
+
+-- Уникальность только по stat_date больше не нужна: существующие строки
+-- становятся шардом 0, новые визиты распределяются по остальным
+DO $$
+DECLARE
+    constraint_name TEXT;
+BEGIN
+    FOR constraint_name IN
+        SELECT c.conname
+        FROM pg_constraint c
+        WHERE c.conrelid = 'daily_stats'::regclass
+          AND c.contype IN ('p', 'u')
+          AND c.conkey = ARRAY[(
+              SELECT attnum FROM pg_attribute
+              WHERE attrelid = 'daily_stats'::regclass AND attname = 'stat_date'
+          )]
+    LOOP
+        EXECUTE format('ALTER TABLE daily_stats DROP CONSTRAINT %I', constraint_name);
+    END LOOP;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_stats_date_shard ON daily_stats(stat_date, shard);
+
+COMMENT ON COLUMN daily_stats.shard IS 'Номер шарда счётчика; значения за день суммируются по всем шардам';
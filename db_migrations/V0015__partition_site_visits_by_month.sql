@@ -0,0 +1,118 @@
+-- Визиты хранятся в помесячных партициях site_visits_YYYY_MM. Запросы
+-- аналитики с фильтром по visit_date читают только нужные месяцы, а старые
+-- месяцы после сворачивания в site_visits_rollup удаляются целиком
+-- (backend/compact_visits.py), поэтому стоимость запросов не растёт с историей.
+
+CREATE OR REPLACE FUNCTION ensure_site_visits_partitions(from_date DATE, months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_date)::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    month_end DATE;
+    part_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        month_end := (month_start + INTERVAL '1 month')::date;
+        part_name := 'site_visits_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE site_visits INCLUDING DEFAULTS)', part_name);
+            -- Визиты, попавшие в партицию по умолчанию, переезжают в свой месяц
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM site_visits_default WHERE visit_date >= %L AND visit_date < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                month_start, month_end, part_name
+            );
+            EXECUTE format(
+                'ALTER TABLE site_visits ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                part_name, month_start, month_end
+            );
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END $$;
+
+DO $$
+DECLARE
+    first_date DATE;
+    col RECORD;
+BEGIN
+    IF to_regclass('site_visits') IS NULL THEN
+        CREATE TABLE site_visits (
+            id BIGSERIAL,
+            visit_date DATE NOT NULL DEFAULT CURRENT_DATE,
+            page_path TEXT,
+            user_agent TEXT,
+            referrer TEXT,
+            session_id VARCHAR(100),
+            ip_address VARCHAR(50),
+            device_type VARCHAR(20),
+            browser VARCHAR(50),
+            is_admin BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, visit_date)
+        ) PARTITION BY RANGE (visit_date);
+        CREATE TABLE site_visits_default PARTITION OF site_visits DEFAULT;
+        PERFORM ensure_site_visits_partitions(CURRENT_DATE);
+        RETURN;
+    END IF;
+
+    IF (SELECT relkind FROM pg_class WHERE oid = 'site_visits'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    -- Существующая таблица: создаём секционированную копию с теми же колонками и переносим данные
+    ALTER TABLE site_visits RENAME TO site_visits_legacy;
+    ALTER TABLE site_visits_legacy ALTER COLUMN visit_date SET NOT NULL;
+    CREATE TABLE site_visits (LIKE site_visits_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (visit_date);
+
+    -- Последовательности id переходят к новой таблице, иначе удалятся вместе со старой
+    FOR col IN
+        SELECT attname, pg_get_serial_sequence('site_visits_legacy', attname) AS seq
+        FROM pg_attribute
+        WHERE attrelid = 'site_visits_legacy'::regclass AND attnum > 0 AND NOT attisdropped
+    LOOP
+        IF col.seq IS NOT NULL THEN
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY site_visits.%I', col.seq, col.attname);
+        END IF;
+    END LOOP;
+
+    IF EXISTS (SELECT 1 FROM pg_attribute WHERE attrelid = 'site_visits'::regclass AND attname = 'id') THEN
+        -- Имя site_visits_pkey пока занято ключом старой таблицы
+        ALTER TABLE site_visits ADD CONSTRAINT site_visits_id_date_pkey PRIMARY KEY (id, visit_date);
+    END IF;
+
+    CREATE TABLE site_visits_default PARTITION OF site_visits DEFAULT;
+    SELECT COALESCE(MIN(visit_date), CURRENT_DATE) INTO first_date FROM site_visits_legacy;
+    PERFORM ensure_site_visits_partitions(first_date);
+
+    INSERT INTO site_visits SELECT * FROM site_visits_legacy;
+    DROP TABLE site_visits_legacy;
+END $$;
+
+-- Свёрнутые визиты старше срока хранения: просмотры по дню, странице, устройству и браузеру
+CREATE TABLE IF NOT EXISTS site_visits_rollup (
+    visit_date DATE NOT NULL,
+    page_path TEXT NOT NULL,
+    device_type TEXT NOT NULL,
+    browser TEXT NOT NULL,
+    views INTEGER NOT NULL,
+    PRIMARY KEY (visit_date, page_path, device_type, browser)
+);
+
+-- Граница свёртки: дни до rolled_up_through включительно читаются из site_visits_rollup
+CREATE TABLE IF NOT EXISTS site_visits_compaction (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    rolled_up_through DATE NOT NULL DEFAULT DATE '1970-01-01',
+    compacted_at TIMESTAMP WITH TIME ZONE
+);
+INSERT INTO site_visits_compaction (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+COMMENT ON TABLE site_visits IS 'Визиты по страницам, секционированы по месяцам visit_date';
+COMMENT ON TABLE site_visits_rollup IS 'Агрегаты визитов (без админов) за дни, сырые строки которых удалены по сроку хранения';
+COMMENT ON TABLE site_visits_compaction IS 'Граница, до которой визиты свёрнуты в site_visits_rollup';
+COMMENT ON FUNCTION ensure_site_visits_partitions(DATE, INTEGER) IS 'Создаёт месячные партиции site_visits от from_date до months_ahead месяцев вперёд';
@@ -0,0 +1,41 @@
+-- Просмотры за день по измерениям: страница, устройство, браузер, источник
+-- перехода. track-visit увеличивает счётчики при каждой записи визитов, а
+-- get-analytics читает O(дни x значения) строк вместо всех визитов за период.
+-- Как и в daily_stats, запись идёт в случайный шард, чтобы популярные
+-- значения не блокировали друг друга; при чтении шарды суммируются.
+CREATE TABLE IF NOT EXISTS visit_dimension_daily (
+    stat_date DATE NOT NULL,
+    dimension VARCHAR(20) NOT NULL,
+    value TEXT NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    views INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, dimension, value, shard)
+);
+
+-- Заполняем историю: сырые визиты после границы свёртки и уже свёрнутые дни
+INSERT INTO visit_dimension_daily (stat_date, dimension, value, views)
+SELECT visit_date, dimension, value, SUM(views)
+FROM (
+    SELECT v.visit_date, d.dimension, d.value, 1 AS views
+    FROM site_visits v
+    CROSS JOIN LATERAL (VALUES
+        ('page', COALESCE(v.page_path, '')),
+        ('device', COALESCE(v.device_type, '')),
+        ('browser', COALESCE(v.browser, '')),
+        -- Как referrer_host() в track-visit: сначала lower(), потом убираем www.
+        ('referrer', COALESCE(regexp_replace(lower(substring(v.referrer FROM '^[a-zA-Z][a-zA-Z0-9+.-]*://([^/?#:]+)')), '^www\.', ''), ''))
+    ) AS d(dimension, value)
+    WHERE v.is_admin = FALSE
+      AND v.visit_date > (SELECT rolled_up_through FROM site_visits_compaction)
+    UNION ALL
+    SELECT r.visit_date, d.dimension, d.value, r.views
+    FROM site_visits_rollup r
+    CROSS JOIN LATERAL (VALUES ('page', r.page_path), ('device', r.device_type), ('browser', r.browser)) AS d(dimension, value)
+    WHERE r.visit_date <= (SELECT rolled_up_through FROM site_visits_compaction)
+) history
+GROUP BY visit_date, dimension, value
+ON CONFLICT (stat_date, dimension, value, shard) DO NOTHING;
+
+COMMENT ON TABLE visit_dimension_daily IS 'Просмотры без админов за день по странице, устройству, браузеру и домену источника';
+COMMENT ON COLUMN visit_dimension_daily.dimension IS 'page, device, browser или referrer';
+COMMENT ON COLUMN visit_dimension_daily.value IS 'Значение измерения; для referrer - домен без www, пустая строка - прямой заход';
@@ -0,0 +1,16 @@
+-- Уникальные посетители за день в виде HyperLogLog-скетча (backend/_shared/hll.py):
+-- 4096 однобайтовых регистров, около 1,6% погрешности. Скетчи за разные дни
+-- объединяются поэлементным максимумом без потери точности, поэтому get-analytics
+-- считает уникальных за 7, 30 или 90 дней, не читая сырые визиты.
+-- track-visit пишет в случайный шард, как и daily_stats; compact_visits.py
+-- сворачивает шарды прошедших дней в шард 0.
+CREATE TABLE IF NOT EXISTS visitor_sketches (
+    stat_date DATE NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    sketch BYTEA NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (stat_date, shard)
+);
+
+COMMENT ON TABLE visitor_sketches IS 'HyperLogLog-скетчи session_id посетителей без админов за день';
+COMMENT ON COLUMN visitor_sketches.sketch IS 'Регистры HLL, precision 12; объединение - поэлементный максимум';
@@ -0,0 +1,10 @@
+-- Постраничный вывод bot-stats и admin-login-logs идёт курсором
+-- WHERE (created_at, id) < (...) ORDER BY created_at DESC, id DESC.
+-- Составной индекс начинает чтение сразу с нужной строки, поэтому
+-- любая страница стоит как первая. Одиночные индексы по created_at он
+-- заменяет полностью, и лишний индекс не замедляет запись логов ботов.
+CREATE INDEX IF NOT EXISTS idx_bot_logs_created_at_id ON bot_logs (created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_bot_logs_created_at;
+
+CREATE INDEX IF NOT EXISTS idx_admin_login_logs_created_at_id ON admin_login_logs (created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_admin_login_logs_created_at;
@@ -0,0 +1,27 @@
+-- Итоги по bot_logs: bot-logger увеличивает счётчики в той же транзакции,
+-- что и вставка пачки логов, а уникальные IP копит в HyperLogLog-скетче
+-- (backend/_shared/hll.py). Как и daily_stats, итоги разбиты на шарды:
+-- каждая запись обновляет случайную строку, поэтому параллельные запросы
+-- не ждут блокировки одной строки. Шапка bot-stats суммирует счётчики и
+-- объединяет скетчи нескольких строк вместо агрегатов по всей таблице.
+CREATE TABLE IF NOT EXISTS bot_log_summary (
+    shard SMALLINT PRIMARY KEY,
+    total_attempts BIGINT NOT NULL DEFAULT 0,
+    blocked_count BIGINT NOT NULL DEFAULT 0,
+    allowed_count BIGINT NOT NULL DEFAULT 0,
+    ip_sketch BYTEA,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Счётчики из истории переносятся в шард 0. Скетч IP по истории SQL не
+-- посчитать, его один раз строит backend/backfill_bot_ips.py
+INSERT INTO bot_log_summary (shard, total_attempts, blocked_count, allowed_count)
+SELECT 0,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE is_blocked = true),
+       COUNT(*) FILTER (WHERE is_blocked = false)
+FROM bot_logs
+ON CONFLICT (shard) DO NOTHING;
+
+COMMENT ON TABLE bot_log_summary IS 'Итоги по bot_logs для шапки bot-stats; значения суммируются по всем шардам';
+COMMENT ON COLUMN bot_log_summary.ip_sketch IS 'HyperLogLog-скетч ip_address; NULL - пока пуст';
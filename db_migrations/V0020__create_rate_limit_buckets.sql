@@ -0,0 +1,15 @@
+-- Общие token bucket'ы ограничителя частоты запросов (backend/_shared/rate_limit.py)
+-- для запуска нескольких экземпляров с RATE_LIMIT_BACKEND=postgres. Состояние
+-- временное и восстанавливается само, поэтому таблица UNLOGGED: записи не
+-- попадают в WAL и не реплицируются, а после сбоя таблица просто пуста.
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    bucket_key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    allowed BOOLEAN NOT NULL DEFAULT TRUE,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_refreshed_at ON rate_limit_buckets (refreshed_at);
+
+COMMENT ON TABLE rate_limit_buckets IS 'Token bucket на пару функция:IP; строки старше часа удаляются при проверках';
+COMMENT ON COLUMN rate_limit_buckets.allowed IS 'Пропущен ли последний запрос';
@@ -1,4 +1,21 @@
+const TRACK_VISIT_URL = 'https://functions.poehali.dev/f4905f63-ce85-4850-9f3a-2677d35f7d16';
+// Накопленные просмотры уходят одним запросом раз в FLUSH_INTERVAL_MS или при уходе со страницы
+const FLUSH_INTERVAL_MS = 10000;
+// Должно совпадать с VISIT_BATCH_MAX в backend/track-visit
+const MAX_BATCH = 50;
+
+interface PageVisit {
+  page: string;
+  referrer: string;
+  userAgent: string;
+  sessionId: string;
+  isAdmin: boolean;
+}
+
 let sessionId: string | null = null;
+const queue: PageVisit[] = [];
+let flushTimer: ReturnType<typeof setTimeout> | null = null;
+let listening = false;
 
 function getSessionId(): string {
   if (!sessionId) {
@@ -11,25 +28,64 @@ function getSessionId(): string {
   return sessionId;
 }
 
+function flushVisits() {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  if (queue.length === 0) {
+    return;
+  }
+
+  const body = JSON.stringify({ events: queue.splice(0, MAX_BATCH) });
+  // sendBeacon переживает закрытие вкладки; text/plain не требует preflight-запроса
+  const sent = typeof navigator.sendBeacon === 'function' && navigator.sendBeacon(TRACK_VISIT_URL, body);
+  if (!sent) {
+    fetch(TRACK_VISIT_URL, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body,
+      keepalive: true
+    }).catch((error) => console.error('Analytics tracking error:', error));
+  }
+
+  if (queue.length > 0) {
+    flushVisits();
+  }
+}
+
+function listenForPageHide() {
+  if (listening) {
+    return;
+  }
+  listening = true;
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+      flushVisits();
+    }
+  });
+  window.addEventListener('pagehide', flushVisits);
+}
+
 export async function trackPageVisit(page: string) {
   try {
     const isAdmin = localStorage.getItem('admin_token') !== null;
-    
-    const data = {
+
+    queue.push({
       page,
       referrer: document.referrer,
       userAgent: navigator.userAgent,
       sessionId: getSessionId(),
       isAdmin
-    };
-
-    await fetch('https://functions.poehali.dev/f4905f63-ce85-4850-9f3a-2677d35f7d16', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(data),
-      keepalive: true
     });
+
+    listenForPageHide();
+    if (queue.length >= MAX_BATCH) {
+      flushVisits();
+    } else if (!flushTimer) {
+      flushTimer = setTimeout(flushVisits, FLUSH_INTERVAL_MS);
+    }
   } catch (error) {
     console.error('Analytics tracking error:', error);
   }
-}
\ No newline at end of file
+}